@@ -1,33 +1,40 @@
-import os
-import mysql.connector
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
 import pytz
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 import json
 from dotenv import load_dotenv
+from event_store import EventStore
+from calendar_outbox import CalendarOutboxWorker, enqueue_calendar_insert
+from calendar_sync import CalendarReconciler
+from google_services import lazy_calendar_service, service_available
+from interval_index import IntervalIndex
+from storage import DB_ERRORS, create_storage, get_storage
+
+# Fields needed from each event to check for conflicts
+PREFETCH_FIELDS = "nextPageToken,items(id,summary,start,end)"
 
 class EventHandler:
-    def __init__(self, llm_interface=None, db_config=None):
+    def __init__(self, llm_interface=None, db_config=None, reminder_scheduler=None):
         load_dotenv()
         self.llm_interface = llm_interface
-
-        # Initialize DB config if not provided
-        if db_config is None:
-            self.db_config = {
-                'host': os.getenv('DB_HOST', 'localhost'),
-                'user': os.getenv('DB_USER', 'root'),
-                'password': os.getenv('DB_PASSWORD', ''),
-                'database': os.getenv('DB_NAME', 'events_db')
-            }
-        else:
-            self.db_config = db_config
-
-        # Google Calendar API setup
-        self.SCOPES = ['https://www.googleapis.com/auth/calendar']
-        self.calendar_service = self._setup_calendar_api()
+        # Speaks reminders for events created in this session without waiting for a reload
+        self.reminder_scheduler = reminder_scheduler
+
+        # Shared storage backend (MySQL or SQLite); a custom MySQL config gets its own
+        self.storage = create_storage('mysql', db_config=db_config) if db_config else get_storage()
+        self.event_store = EventStore(self.storage)
+
+        # Google Calendar API setup (built lazily by the shared service factory)
+        self.calendar_service = lazy_calendar_service()
+        # New events reach Google through the outbox, after the local commit
+        self.calendar_outbox = CalendarOutboxWorker(self.storage, self.calendar_service)
+        self.calendar_outbox.start()
+        # Edits made on either side are reconciled on a schedule
+        self.calendar_reconciler = CalendarReconciler(self.event_store, self.calendar_service)
+        if reminder_scheduler:
+            # Events the reconciler adds, moves or deletes get their reminders updated straight away
+            self.calendar_reconciler.add_listener(reminder_scheduler.on_event_change)
+        self.calendar_reconciler.start()
 
         # Event details tracking
         self.current_event = {
@@ -39,6 +46,13 @@ class EventHandler:
             'reminder': 'No reminder'  # Default value
         }
 
+        # The day's calendar is fetched in the background as soon as the date
+        # is known, so the conflict check is ready by confirmation time
+        self.timezone = pytz.timezone('Europe/London')
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="calendar-prefetch")
+        self.prefetch_date = None
+        self.prefetch_future = None
+
         # Event creation state
         self.is_creating_event = False
         self.is_updating_event = False
@@ -56,61 +70,22 @@ class EventHandler:
             "1 day": 1440
         }
 
-    def _setup_calendar_api(self):
-        """Set up and return Google Calendar API service."""
-        creds = None
-        token_path = 'token.json'
-        credentials_path = 'credentials.json'
-
-        # Check if token file exists
-        if os.path.exists(token_path):
-            creds = Credentials.from_authorized_user_info(
-                json.loads(open(token_path).read()),
-                self.SCOPES
-            )
-
-        # If credentials don't exist or are invalid, get new ones
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                # Only run this if credentials.json exists
-                if os.path.exists(credentials_path):
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        credentials_path, self.SCOPES)
-                    creds = flow.run_local_server(port=0)
-                else:
-                    print("WARNING: credentials.json not found. Calendar integration disabled.")
-                    return None
-
-            # Save credentials for future use
-            with open(token_path, 'w') as token:
-                token.write(creds.to_json())
-
-        try:
-            service = build('calendar', 'v3', credentials=creds)
-            return service
-        except Exception as e:
-            print(f"Failed to build calendar service: {e}")
-            return None
-
-    def connect_to_db(self):
-        """Connect to the MySQL database."""
-        try:
-            conn = mysql.connector.connect(**self.db_config)
-            return conn
-        except mysql.connector.Error as e:
-            print(f"Error connecting to MySQL database: {e}")
-            return None
-
     def save_event_to_db(self, event_data):
-        """Save event to MySQL database."""
-        conn = self.connect_to_db()
-        if not conn:
-            return False, "Database connection error"
+        """
+        Save event to the database, queuing its Google Calendar insert in the same transaction.
 
+        The outbox worker sends the insert after the commit, so the event
+        reaches Google even if the calendar is unavailable right now. A typed
+        copy goes into the events table for local range queries.
+        """
         try:
-            cursor = conn.cursor()
+            try:
+                start = self._event_start(event_data)
+                event_body = self._calendar_event_body(event_data)
+            except ValueError as date_error:
+                # Still saved locally, but there is nothing valid to send to Google
+                print(f"Error parsing date/time, event will not be synced: {date_error}")
+                start = event_body = None
 
             # Convert reminder text to minutes
             reminder_minutes = None
@@ -143,90 +118,91 @@ class EventHandler:
                 f"{reminder_minutes} minutes before" if reminder_minutes else "No reminder"
             )
 
-            cursor.execute(query, values)
-            conn.commit()
-
-            event_id = cursor.lastrowid
+            self.storage.ensure_schema()
+            with self.storage.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(query, values)
+                    event_id = cursor.lastrowid
+                    store_id = None
+                    if start:
+                        store_id = self.event_store.add(
+                            event_data.get('name'), start, tz_name=self.timezone.zone,
+                            location=event_data.get('location'), details=event_data.get('details'),
+                            reminder_minutes=reminder_minutes, legacy_id=event_id, cursor=cursor
+                        )
+                    if event_body:
+                        enqueue_calendar_insert(cursor, event_id, event_body)
+                    conn.commit()
+                finally:
+                    cursor.close()
+            if event_body:
+                self.calendar_outbox.notify()
+            if store_id is not None:
+                self._schedule_reminder(store_id, event_data.get('name'), start, reminder_minutes)
             return True, event_id
 
-        except mysql.connector.Error as e:
+        except DB_ERRORS as e:
             print(f"Database error: {e}")
             return False, str(e)
 
-        finally:
-            if conn.is_connected():
-                cursor.close()
-                conn.close()
+    def _event_start(self, event_data):
+        """Returns the event's local start time. Raises ValueError on a bad date or time."""
+        start = datetime.strptime(f"{event_data.get('date')} {event_data.get('time')}", "%Y-%m-%d %H:%M:%S")
+        return self.timezone.localize(start)
+
+    def _calendar_event_body(self, event_data):
+        """Builds the Google Calendar event resource for an event. Raises ValueError on a bad date or time."""
+        start_datetime = self._event_start(event_data)
+
+        # Assume events last 1 hour by default
+        end_datetime = self.timezone.normalize(start_datetime + timedelta(hours=1))
+
+        event_body = {
+            'summary': event_data.get('name'),
+            'location': event_data.get('location'),
+            'description': event_data.get('details', 'No details provided'),
+            'start': {
+                'dateTime': start_datetime.isoformat(),
+                'timeZone': 'Europe/London',  # Adjust for your timezone
+            },
+            'end': {
+                'dateTime': end_datetime.isoformat(),
+                'timeZone': 'Europe/London',  # Adjust for your timezone
+            }
+        }
+
+        # Add reminder if specified
+        reminder_minutes = self._reminder_minutes(event_data.get('reminder'))
+        if reminder_minutes:
+            event_body['reminders'] = {
+                'useDefault': False,
+                'overrides': [
+                    {'method': 'popup', 'minutes': reminder_minutes}
+                ]
+            }
+        return event_body
 
     def add_to_google_calendar(self, event_data):
-        """Add event to Google Calendar."""
+        """Add event to Google Calendar directly, bypassing the outbox."""
         if not self.calendar_service:
             return False, "Calendar service not available"
 
         try:
-            # Parse date and time
-            date_str = event_data.get('date')
-            time_str = event_data.get('time')
-
             try:
-                # Try to parse the combined date and time
-                start_datetime = datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M:%S")
-
-                # Assume events last 1 hour by default
-                end_datetime = start_datetime + timedelta(hours=1)
-
-                # Convert to RFC3339 format
-                timezone = pytz.timezone('Europe/London')  # Adjust for your timezone
-                start_datetime = timezone.localize(start_datetime)
-                end_datetime = timezone.localize(end_datetime)
-
-                start_time = start_datetime.isoformat()
-                end_time = end_datetime.isoformat()
-
-                # Create event body
-                event_body = {
-                    'summary': event_data.get('name'),
-                    'location': event_data.get('location'),
-                    'description': event_data.get('details', 'No details provided'),
-                    'start': {
-                        'dateTime': start_time,
-                        'timeZone': 'Europe/London',  # Adjust for your timezone
-                    },
-                    'end': {
-                        'dateTime': end_time,
-                        'timeZone': 'Europe/London',  # Adjust for your timezone
-                    }
-                }
-
-                # Add reminder if specified
-                reminder_text = event_data.get('reminder')
-                if reminder_text and reminder_text != 'No reminder':
-                    reminder_minutes = None
-                    for option, minutes in self.reminder_options.items():
-                        if option.lower() in reminder_text.lower():
-                            reminder_minutes = minutes
-                            break
-
-                    if reminder_minutes:
-                        event_body['reminders'] = {
-                            'useDefault': False,
-                            'overrides': [
-                                {'method': 'popup', 'minutes': reminder_minutes}
-                            ]
-                        }
-
-                # Insert the event
-                event = self.calendar_service.events().insert(
-                    calendarId='primary',
-                    body=event_body
-                ).execute()
-
-                return True, event.get('id')
-
+                event_body = self._calendar_event_body(event_data)
             except ValueError as date_error:
                 print(f"Error parsing date/time: {date_error}")
                 return False, f"Invalid date or time format: {date_error}"
 
+            # Insert the event
+            event = self.calendar_service.events().insert(
+                calendarId='primary',
+                body=event_body
+            ).execute()
+
+            return True, event.get('id')
+
         except Exception as e:
             print(f"Google Calendar API error: {e}")
             return False, str(e)
@@ -309,26 +285,136 @@ class EventHandler:
 
         return summary
 
+    def prefetch_day(self, date_str):
+        """Starts fetching the calendar for date_str in the background, unless already done."""
+        if not date_str:
+            return
+        if date_str == self.prefetch_date and not self._prefetch_failed():
+            return
+        try:
+            day = datetime.strptime(date_str, "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            return
+        self.prefetch_date = date_str
+        self.prefetch_future = self.prefetch_executor.submit(self._fetch_day_index, day)
+
+    def _prefetch_failed(self):
+        """True once the current prefetch has finished without an index, so it should be fetched again."""
+        future = self.prefetch_future
+        if not future or not future.done():
+            return False
+        return future.exception() is not None or future.result() is None
+
+    def _fetch_day_index(self, day):
+        """Fetches a local day's events and returns them as an IntervalIndex."""
+        if not service_available(self.calendar_service):
+            return None
+
+        day_start = self.timezone.localize(datetime.combine(day, time(0, 0)))
+        day_end = self.timezone.localize(datetime.combine(day + timedelta(days=1), time(0, 0)))
+        params = {
+            'calendarId': 'primary',
+            'timeMin': day_start.isoformat(),
+            'timeMax': day_end.isoformat(),
+            'singleEvents': True,
+            'orderBy': 'startTime',
+            'fields': PREFETCH_FIELDS,
+        }
+
+        events = []
+        while True:
+            result = self.calendar_service.events().list(**params).execute()
+            events.extend(result.get('items', []))
+            if not result.get('nextPageToken'):
+                break
+            params['pageToken'] = result['nextPageToken']
+        print(f"Prefetched {len(events)} calendar events for {day}")
+        # All-day events (birthdays, holidays) don't block a time slot, as in find_free_slots
+        return IntervalIndex.from_events(events, include_all_day=False, tz=self.timezone)
+
+    def _day_index(self, date_str, timeout=5):
+        """Returns the prefetched index for date_str, fetching it now if it wasn't prefetched."""
+        self.prefetch_day(date_str)
+        if not self.prefetch_future:
+            return None
+        return self.prefetch_future.result(timeout=timeout)
+
     def check_conflicts(self, date_str, start_time_str, end_time_str=None):
-        """Check for scheduling conflicts."""
-        if not end_time_str:
-            # Assume events last 1 hour by default
-            try:
-                start_dt = datetime.strptime(f"{date_str} {start_time_str}", "%Y-%m-%d %H:%M:%S")
+        """
+        Check for scheduling conflicts.
+
+        Returns (conflicts, alternatives): the overlapping calendar events and
+        up to three free one-hour slots on the same day.
+        """
+        try:
+            day = datetime.strptime(date_str, "%Y-%m-%d").date()
+            start_clock = self._parse_clock(start_time_str)
+            start_dt = self.timezone.localize(datetime.combine(day, start_clock))
+            if end_time_str:
+                end_dt = self.timezone.localize(datetime.combine(day, self._parse_clock(end_time_str)))
+            else:
+                # Assume events last 1 hour by default
                 end_dt = start_dt + timedelta(hours=1)
-                end_time_str = end_dt.strftime("%H:%M:%S")
+        except (TypeError, ValueError):
+            print("Could not parse date and time for conflict checking")
+            return [], []
+
+        print(f"Checking conflicts between {start_dt.isoformat()} and {end_dt.isoformat()}")
+        try:
+            index = self._day_index(date_str)
+        except Exception as e:
+            print(f"Error fetching calendar for conflict check: {e}")
+            return [], []
+        if index is None:
+            return [], []
+
+        conflicts = index.overlapping(start_dt, end_dt)
+        alternatives = []
+        if conflicts:
+            day_start = self.timezone.localize(datetime.combine(day, time(0, 0)))
+            alternatives = list(index.free_slots(
+                day_start, day_start + timedelta(days=1),
+                duration=end_dt - start_dt,
+                granularity=timedelta(minutes=30),
+                tz=self.timezone,
+                limit=3
+            ))
+        print(f"Found {len(conflicts)} conflicts" if conflicts else "No conflicts found")
+        return conflicts, alternatives
+
+    def _parse_clock(self, time_str):
+        """Parse an 'HH:MM' or 'HH:MM:SS' time string."""
+        for fmt in ("%H:%M:%S", "%H:%M"):
+            try:
+                return datetime.strptime(time_str.strip(), fmt).time()
             except ValueError:
-                return "Could not parse date and time for conflict checking"
+                continue
+        raise ValueError(f"Unrecognised time: {time_str}")
 
-        conflict_check_msg = (
-            f"Checking conflicts between {date_str}T{start_time_str}+00:00 and "
-            f"{date_str}T{end_time_str}+00:00"
-        )
-        print(conflict_check_msg)
+    def _conflict_warning(self):
+        """Describe conflicts for the current event, or return None if there are none."""
+        if not self.current_event['date'] or not self.current_event['time']:
+            return None
+        conflicts, alternatives = self.check_conflicts(self.current_event['date'], self.current_event['time'])
+        if not conflicts:
+            return None
+
+        names = ", ".join(event.get('summary', 'another event') for event in conflicts)
+        warning = f"Heads up, this clashes with {names}."
+        if alternatives:
+            times = [slot_start.strftime("%I:%M %p").lstrip('0') for slot_start, _ in alternatives]
+            if len(times) > 1:
+                spoken_times = ", ".join(times[:-1]) + " or " + times[-1]
+            else:
+                spoken_times = times[0]
+            warning += f" You're free at {spoken_times}."
+        return warning
 
-        # Here you would implement actual conflict checking with your calendar
-        # For now we'll just return no conflicts
-        return "No conflicts found"
+    def _confirmation_prompt(self):
+        """Show the event summary, preceded by any conflict warning."""
+        warning = self._conflict_warning()
+        summary = self._format_event_summary()
+        return f"{warning}\n{summary}" if warning else summary
 
     def process_query(self, query):
         """Process a user query related to event creation or modification."""
@@ -396,7 +482,7 @@ class EventHandler:
                 # Show updated summary and ask for confirmation
                 self.is_updating_event = False
                 self.awaiting_confirmation = True
-                return self._format_event_summary()
+                return self._confirmation_prompt()
 
             except (json.JSONDecodeError, Exception) as e:
                 print(f"Error processing update: {e}")
@@ -448,6 +534,10 @@ class EventHandler:
 
     def _get_next_question(self):
         """Determine the next question to ask based on missing event details."""
+        # Start loading the day's calendar while the remaining questions are asked
+        if self.current_event['date']:
+            self.prefetch_day(self.current_event['date'])
+
         # Check each required field in order of importance
         if not self.current_event['name']:
             self.current_question = 'name'
@@ -480,34 +570,39 @@ class EventHandler:
         self.current_question = None
         self.awaiting_confirmation = True
 
-        # Check for conflicts if we have date and time
-        if self.current_event['date'] and self.current_event['time']:
-            conflict_message = self.check_conflicts(self.current_event['date'], self.current_event['time'])
-            print(conflict_message)
+        # The conflict check uses the calendar prefetched when the date was given
+        return self._confirmation_prompt()
 
-        return self._format_event_summary()
+    def _reminder_minutes(self, reminder_text):
+        """Converts a spoken reminder choice to minutes, or None for no reminder."""
+        if not reminder_text or reminder_text == 'No reminder':
+            return None
+        for option, minutes in self.reminder_options.items():
+            if option.lower() in reminder_text.lower():
+                return minutes
+        return 10
+
+    def _schedule_reminder(self, store_id, name, start, minutes):
+        """Hands a newly saved event's reminder to the local scheduler, under its event store id."""
+        if not self.reminder_scheduler:
+            return
+        self.reminder_scheduler.on_event_change(store_id, {'title': name, 'start': start,
+                                                           'reminder_minutes': minutes})
 
     def _finalize_event(self):
-        """Finalize the event creation by saving to DB and calendar."""
-        # Save to database
+        """Finalize the event creation by saving to DB; the outbox syncs it to Google Calendar."""
+        # Save to database; the Google Calendar insert is queued in the same transaction
         db_success, db_result = self.save_event_to_db(self.current_event)
 
-        # Add to Google Calendar
-        calendar_success = False
-        calendar_result = "Calendar integration not attempted"
-
-        if db_success and self.calendar_service:
-            calendar_success, calendar_result = self.add_to_google_calendar(self.current_event)
-
         # Prepare result message
         if db_success:
             result = f"Event '{self.current_event['name']}' has been added to your calendar."
-            if calendar_success:
-                result += " It's been synced with Google Calendar as well."
         else:
             result = f"There was a problem adding your event: {db_result}"
 
         # Reset event creation state
+        self.prefetch_date = None
+        self.prefetch_future = None
         self.is_creating_event = False
         self.is_updating_event = False
         self.awaiting_confirmation = False
@@ -0,0 +1,176 @@
+import re
+from datetime import datetime, time, timedelta
+import pytz
+from calendar_mirror import parse_event_time
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+NUMBER_WORDS = {
+    "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "fourteen": 14,
+}
+
+
+def _local_midnight(tz, day):
+    return tz.localize(datetime.combine(day, time(0, 0)))
+
+
+def resolve_range(text, now=None, tz_name="Europe/London"):
+    """
+    Resolves a relative range like "this week" or "next 3 days" into local day bounds.
+
+    Returns (start, end, label) with timezone-aware datetimes covering whole
+    local days, or None if no range was recognised.
+    """
+    tz = pytz.timezone(tz_name)
+    now = now.astimezone(tz) if now else datetime.now(tz)
+    today = now.date()
+    text = text.lower()
+
+    def days(first, count, label):
+        return _local_midnight(tz, first), _local_midnight(tz, first + timedelta(days=count)), label
+
+    match = re.search(r"next\s+(\d+|" + "|".join(NUMBER_WORDS) + r")\s+days", text)
+    if match:
+        value = match.group(1)
+        count = int(value) if value.isdigit() else NUMBER_WORDS[value]
+        return days(today, max(count, 1), f"in the next {count} days")
+
+    if "next weekend" in text:
+        # The weekend of next week, matching how "next week" is read
+        saturday = today + timedelta(days=7 - today.weekday() + 5)
+        return days(saturday, 2, "next weekend")
+    if "next week" in text:
+        next_monday = today + timedelta(days=7 - today.weekday())
+        return days(next_monday, 7, "next week")
+    if "this weekend" in text or "the weekend" in text:
+        saturday = today + timedelta(days=(5 - today.weekday()) % 7)
+        if today.weekday() == 6:
+            saturday = today - timedelta(days=1)
+        first = max(saturday, today)
+        return days(first, (saturday + timedelta(days=2) - first).days, "this weekend")
+    if "this week" in text or "rest of the week" in text:
+        return days(today, 7 - today.weekday(), "this week")
+    if "next month" in text:
+        first = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+        following = (first + timedelta(days=32)).replace(day=1)
+        return days(first, (following - first).days, "next month")
+    if "this month" in text:
+        following = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+        return days(today, (following - today).days, "this month")
+    if "tomorrow" in text:
+        return days(today + timedelta(days=1), 1, "tomorrow")
+    if "today" in text or "tonight" in text:
+        return days(today, 1, "today")
+
+    for index, weekday in enumerate(WEEKDAYS):
+        if weekday in text:
+            ahead = (index - today.weekday()) % 7
+            if ahead == 0 and "next" in text:
+                ahead = 7
+            return days(today + timedelta(days=ahead), 1, f"on {weekday.capitalize()}")
+
+    return None
+
+
+def group_by_day(events, tz_name="Europe/London", range_start=None, range_end=None):
+    """
+    Groups events by their local start date, keeping start-time order within each day.
+
+    With a range, events that don't overlap it are dropped (a list request
+    can return a neighbouring day's all-day event), and ones that began
+    before it are grouped under its first day.
+    """
+    tz = pytz.timezone(tz_name)
+    groups = {}
+    for event in events:
+        start = event.get('start', {})
+        start_value = start.get('dateTime', start.get('date'))
+        if not start_value:
+            continue
+        all_day = 'T' not in start_value
+        start_dt = parse_event_time(start_value, tz).astimezone(tz)
+        end = event.get('end', {})
+        end_value = end.get('dateTime', end.get('date'))
+        end_dt = parse_event_time(end_value, tz) if end_value else start_dt
+        if range_end is not None and start_dt >= range_end:
+            continue
+        if range_start is not None and start_dt < range_start and end_dt <= range_start:
+            continue
+        day = start_dt.date()
+        if range_start is not None and start_dt < range_start:
+            day = range_start.astimezone(tz).date()
+        groups.setdefault(day, []).append((None if all_day else start_dt, event))
+
+    for items in groups.values():
+        # All-day events first, then by start time
+        items.sort(key=lambda item: (item[0] is not None, item[0] or datetime.min.replace(tzinfo=pytz.utc)))
+    return dict(sorted(groups.items()))
+
+
+def _describe(start_local, event):
+    name = event.get('summary', 'Untitled event')
+    if start_local is None:
+        return f"{name} all day"
+    if start_local.minute:
+        spoken_time = start_local.strftime("%I:%M %p").lstrip('0')
+    else:
+        spoken_time = start_local.strftime("%I %p").lstrip('0')
+    return f"{name} at {spoken_time}"
+
+
+def _join(parts):
+    if len(parts) == 1:
+        return parts[0]
+    return ", ".join(parts[:-1]) + " and " + parts[-1]
+
+
+def spoken_summary(groups, label, now=None, tz_name="Europe/London", max_events=8, max_chars=450):
+    """
+    Builds a voice-friendly agenda, naming days and listing events until the budget runs out.
+
+    Stops after `max_events` events or `max_chars` characters and says how
+    many more events there are.
+    """
+    total = sum(len(items) for items in groups.values())
+    if not total:
+        return f"You have nothing scheduled {label}."
+
+    tz = pytz.timezone(tz_name)
+    today = (now.astimezone(tz) if now else datetime.now(tz)).date()
+
+    intro = f"You have {total} event{'s' if total != 1 else ''} {label}."
+    sentences = [intro]
+    length = len(intro)
+    spoken = 0
+
+    for day, items in groups.items():
+        if day == today:
+            day_name = "Today"
+        elif day == today + timedelta(days=1):
+            day_name = "Tomorrow"
+        elif 0 <= (day - today).days < 7:
+            day_name = f"On {day.strftime('%A')}"
+        else:
+            day_name = f"On {day.strftime('%A %d %B').replace(' 0', ' ')}"
+
+        parts = []
+        for start_local, event in items:
+            part = _describe(start_local, event)
+            if spoken >= max_events or length + len(day_name) + len(part) + 4 > max_chars:
+                break
+            parts.append(part)
+            length += len(part) + 2
+            spoken += 1
+        if not parts:
+            break
+        sentence = f"{day_name}: {_join(parts)}."
+        length += len(day_name) + 2
+        sentences.append(sentence)
+        if len(parts) < len(items):
+            break
+
+    remaining = total - spoken
+    if remaining:
+        sentences.append(f"And {remaining} more.")
+    return " ".join(sentences)
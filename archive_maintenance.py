@@ -0,0 +1,246 @@
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from conversation_archive import INSERT_TURN, partition_month, partition_name
+
+# Months of conversation kept in the searchable partitions
+DEFAULT_RETENTION_MONTHS = 6
+
+# Rows read per chunk when compacting, and the share of wall time compaction may use
+COMPACTION_CHUNK = 1000
+DEFAULT_DUTY_CYCLE = 0.2
+
+
+class ArchiveMaintenance:
+    """
+    Retention job for the conversation archive.
+
+    Partitions older than the retention window are streamed into gzip
+    compressed JSONL files (one per month) and then dropped. The job runs on
+    a background thread once a day. It works in small chunks, sleeps so it
+    only uses a fraction of wall time, and waits whenever `is_busy()` says a
+    turn is in progress, so it never competes with the user.
+    """
+
+    def __init__(self, archive, archive_dir="conversation_archive", retention_months=None,
+                 duty_cycle=DEFAULT_DUTY_CYCLE, is_busy=None, interval=24 * 60 * 60):
+        self.archive = archive
+        self.storage = archive.storage
+        self.archive_dir = archive_dir
+        self.retention_months = retention_months or int(
+            os.getenv('CONVERSATION_RETENTION_MONTHS', DEFAULT_RETENTION_MONTHS))
+        self.duty_cycle = duty_cycle
+        self.is_busy = is_busy or (lambda: False)
+        self.interval = interval
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="archive-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Conversation archive maintenance failed: {e}")
+            self._stop.wait(self.interval)
+
+    def expired_partitions(self, now=None):
+        """Partitions entirely older than the retention window, oldest first."""
+        now = now or datetime.now()
+        month_index = now.year * 12 + now.month - 1 - self.retention_months
+        cutoff = datetime(month_index // 12, month_index % 12 + 1, 1)
+        return [table for table in self.archive.partitions() if partition_month(table) < cutoff]
+
+    def run_once(self, now=None):
+        """Compacts every expired partition. Returns the before and after reports."""
+        expired = self.expired_partitions(now)
+        if not expired:
+            return None
+        before = self.report()
+        for table in expired:
+            if self._stop.is_set():
+                break
+            self.compact_partition(table)
+        after = self.report()
+        print(f"Compacted {len(expired)} conversation partitions: "
+              f"{before['rows']} -> {after['rows']} rows, "
+              f"{before['bytes'] / 1e6:.1f} -> {after['bytes'] / 1e6:.1f} MB, insert "
+              f"{before['insert_ms']:.3f} -> {after['insert_ms']:.3f} ms per row")
+        return before, after
+
+    def _throttle(self, worked):
+        """Sleeps so work stays within the duty cycle, and waits out live turns."""
+        pause = worked * (1 / self.duty_cycle - 1)
+        if pause:
+            self._stop.wait(pause)
+        while self.is_busy() and not self._stop.is_set():
+            self._stop.wait(0.5)
+
+    def _archive_files(self, table):
+        """Returns (the month's archive files, oldest first, and the next free name for one)."""
+        paths = []
+        while True:
+            suffix = f".{len(paths)}" if paths else ""
+            path = os.path.join(self.archive_dir, f"{table}{suffix}.jsonl.gz")
+            if not os.path.exists(path):
+                return paths, path
+            paths.append(path)
+
+    def compact_partition(self, table):
+        """
+        Writes a partition to <archive_dir>/<table>.jsonl.gz, then drops it. Returns the row count.
+
+        A month whose partition came back after it was compacted (a legacy
+        import, or a replayed spool) gets a further numbered file, so earlier
+        archives are never overwritten. A marker file names the archive
+        being written until the partition is dropped. After a crash, the
+        next run rewrites that archive, because the partition still holds
+        every row.
+        """
+        os.makedirs(self.archive_dir, exist_ok=True)
+        marker = os.path.join(self.archive_dir, f"{table}.compacting")
+        if os.path.exists(marker):
+            with open(marker, encoding="utf-8") as pending:
+                path = os.path.join(self.archive_dir, pending.read().strip())
+        else:
+            path = self._archive_files(table)[1]
+        partial = path + ".partial"
+
+        written = 0
+        last_key = None
+        with gzip.open(partial, "wt", encoding="utf-8") as out:
+            while not self._stop.is_set():
+                started = time.monotonic()
+                rows = self._read_chunk(table, last_key)
+                for key, user_input, assistant_response, timestamp in rows:
+                    if isinstance(timestamp, str):
+                        timestamp = datetime.fromisoformat(timestamp)
+                    out.write(json.dumps({
+                        'timestamp': timestamp.isoformat(),
+                        'user_input': user_input,
+                        'assistant_response': assistant_response,
+                    }) + "\n")
+                written += len(rows)
+                if len(rows) < COMPACTION_CHUNK:
+                    break
+                last_key = rows[-1][0]
+                self._throttle(time.monotonic() - started)
+
+        if self._stop.is_set():
+            os.remove(partial)
+            return 0
+
+        with open(marker, "w", encoding="utf-8") as pending:
+            pending.write(os.path.basename(path))
+        os.replace(partial, path)
+        self._drop(table)
+        os.remove(marker)
+        return written
+
+    def _read_chunk(self, table, last_key):
+        key = "rowid" if self.storage.name == "sqlite" else "id"
+        sql = f"SELECT {key}, user_input, assistant_response, timestamp FROM {table}"
+        params = ()
+        if last_key is not None:
+            sql += f" WHERE {key} > %s"
+            params = (last_key,)
+        sql += f" ORDER BY {key} LIMIT {COMPACTION_CHUNK}"
+        with self.storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def _drop(self, table):
+        with self.storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.commit()
+            finally:
+                cursor.close()
+        self.archive._forget_partition(table)
+
+    def read_archived(self, month):
+        """Yields the turns compacted for a month (any datetime in it) as dicts."""
+        for path in self._archive_files(partition_name(month))[0]:
+            with gzip.open(path, "rt", encoding="utf-8") as archived:
+                for line in archived:
+                    yield json.loads(line)
+
+    def measure_insert_latency(self, samples=200):
+        """Times inserting rows into the current partition, rolling them back. Returns ms per row."""
+        table = partition_name(datetime.now())
+        with self.storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self.archive._ensure_partition(cursor, table)
+                conn.commit()
+                started = time.perf_counter()
+                for i in range(samples):
+                    cursor.execute(INSERT_TURN.format(table=table),
+                                   (f"latency probe {i}", "latency probe", datetime.now()))
+                elapsed = time.perf_counter() - started
+                conn.rollback()
+            finally:
+                cursor.close()
+        return 1000 * elapsed / samples
+
+    def report(self):
+        """Returns row counts and on-disk sizes for the partitions and archive files, plus insert latency."""
+        partitions = {}
+        with self.storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                for table in self.archive.partitions():
+                    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+                    partitions[table] = {'rows': cursor.fetchone()[0]}
+
+                if self.storage.name == "sqlite":
+                    cursor.execute("PRAGMA page_size")
+                    page_size = cursor.fetchone()[0]
+                    cursor.execute("PRAGMA page_count")
+                    page_count = cursor.fetchone()[0]
+                    cursor.execute("PRAGMA freelist_count")
+                    free_pages = cursor.fetchone()[0]
+                    # The whole file minus pages freed by dropped partitions
+                    total_bytes = (page_count - free_pages) * page_size
+                else:
+                    cursor.execute(
+                        "SELECT table_name, data_length + index_length FROM information_schema.tables "
+                        "WHERE table_schema = DATABASE() AND table_name LIKE %s", ("conversations\\_%",))
+                    sizes = dict(cursor.fetchall())
+                    for table, stats in partitions.items():
+                        stats['bytes'] = int(sizes.get(table) or 0)
+                    total_bytes = sum(stats['bytes'] for stats in partitions.values())
+            finally:
+                cursor.close()
+
+        archived_bytes = 0
+        if os.path.isdir(self.archive_dir):
+            archived_bytes = sum(os.path.getsize(os.path.join(self.archive_dir, name))
+                                 for name in os.listdir(self.archive_dir) if name.endswith(".jsonl.gz"))
+        return {
+            'partitions': partitions,
+            'rows': sum(stats['rows'] for stats in partitions.values()),
+            'bytes': total_bytes,
+            'archived_bytes': archived_bytes,
+            'insert_ms': self.measure_insert_latency(),
+        }
@@ -1,12 +1,7 @@
 import os
-import mysql.connector
+import threading
 from datetime import datetime, timedelta
 import pytz
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
 import json
 from dotenv import load_dotenv
 from speech_handler import SpeechHandler
@@ -14,6 +9,18 @@ from llm_interface import LLMInterface
 from location_handler import LocationHandler
 from weather_handler import WeatherHandler
 from adding_events import EventHandler
+from archive_maintenance import ArchiveMaintenance
+from conversation_archive import ConversationArchive, is_history_query
+from conversation_log import ConversationLogWriter
+from event_store import EventStore
+from google_services import lazy_calendar_service, service_available
+from reminder_scheduler import ReminderScheduler
+from storage import get_storage
+
+# Calendar events this far ahead get their reminders scheduled at each reload
+REMINDER_HORIZON_DAYS = 7
+# Full reloads also drop reminders of events deleted or moved since; changes made here are applied at once
+REMINDER_RELOAD_SECONDS = 15 * 60
 
 class AI_Assistant:
     def __init__(self):
@@ -22,15 +29,18 @@ class AI_Assistant:
         tts_url = "http://localhost:58851/speak"
         lm_studio_url = "http://localhost:1234/v1/chat/completions"
 
-        # Initialize database connection
-        self.db_connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            user=os.getenv('DB_USER', 'root'),
-            password=os.getenv('DB_PASSWORD', ''),
-            database=os.getenv('DB_NAME', 'events_db')
-        )
-        self.db_cursor = self.db_connection.cursor()
-        self.google_calendar_service = self.initialize_google_calendar()
+        # Shared storage backend, MySQL or embedded SQLite (STORAGE_BACKEND)
+        self.storage = get_storage()
+        self.conversation_archive = ConversationArchive(self.storage)
+        self.conversation_log = ConversationLogWriter(self.conversation_archive)
+        # Old months are compacted to files in the background, pausing during turns
+        self.turn_in_progress = False
+        self.archive_maintenance = ArchiveMaintenance(self.conversation_archive,
+                                                      is_busy=lambda: self.turn_in_progress)
+        self.archive_maintenance.start()
+        self.event_store = EventStore(self.storage)
+        # Shared with EventHandler and only built the first time it's used
+        self.google_calendar_service = lazy_calendar_service()
 
         # Initialize LLM interface
         self.llm_interface = LLMInterface()
@@ -44,55 +54,31 @@ class AI_Assistant:
         # Initialize specialized handlers
         self.location_handler = LocationHandler()
         self.weather_handler = WeatherHandler()
-        self.event_handler = EventHandler(llm_interface=self.llm_interface)
+        # Reminders are spoken locally when due; loading them happens in the background
+        self.reminder_scheduler = ReminderScheduler(self.send_to_tts)
+        self.event_handler = EventHandler(llm_interface=self.llm_interface,
+                                          reminder_scheduler=self.reminder_scheduler)
+        self.reminder_scheduler.start()
+        self._reminder_reload = None
+        threading.Thread(target=self.load_reminders, name="reminder-loader", daemon=True).start()
 
         # State tracking
         self.in_event_creation = False
 
     def __del__(self):
-        # Clean up database connection when the object is destroyed
+        # Stop this assistant's workers; the shared storage is closed at exit, since others still use it
         try:
-            if hasattr(self, "db_cursor") and self.db_cursor:
-                self.db_cursor.close()
-            if hasattr(self, "db_connection") and self.db_connection:
-                self.db_connection.close()
+            if hasattr(self, "reminder_scheduler"):
+                self.reminder_scheduler.stop()
+            if getattr(self, "_reminder_reload", None):
+                self._reminder_reload.cancel()
+            if hasattr(self, "archive_maintenance"):
+                self.archive_maintenance.stop()
+            if hasattr(self, "conversation_log"):
+                self.conversation_log.close()
         except Exception as e:
             print(f"Error during cleanup: {e}")
 
-    def initialize_google_calendar(self):
-        """Initializes the Google Calendar API service."""
-        creds = None
-        token_path = 'token.json'
-
-        # Load existing token if available
-        if os.path.exists(token_path):
-            creds = Credentials.from_authorized_user_file(token_path, self.SCOPES)
-
-        # If credentials don't exist or are invalid, get new ones
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                # Only run this if credentials.json exists
-                if os.path.exists("credentials.json"):
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        "credentials.json", self.SCOPES)
-                    creds = flow.run_local_server(port=0)
-                else:
-                    print("WARNING: credentials.json not found. Calendar integration disabled.")
-                    return None
-
-            # Save the credentials for future use
-            with open(token_path, "w") as token:
-                token.write(creds.to_json())
-
-        try:
-            service = build("calendar", "v3", credentials=creds)
-            return service
-        except Exception as e:
-            print(f"Failed to build calendar service: {e}")
-            return None
-
     def start_transcription(self):
         """Start listening for user input."""
         self.speech_handler.start_transcription()
@@ -105,76 +91,99 @@ class AI_Assistant:
         """Send text to text-to-speech service."""
         return self.speech_handler.send_to_tts(text)
 
-    def process_user_input(self, user_input):
-        """Process user input and determine appropriate response."""
+    def load_reminders(self):
+        """Schedules reminders for upcoming events from the event store and Google Calendar."""
+        now = datetime.now(pytz.utc)
+        horizon = now + timedelta(days=REMINDER_HORIZON_DAYS)
         try:
-            print(f"Processing input: {user_input}")
-
-            # Log the conversation in the database
-            self.insert_conversation(user_input)
-
-            # Check if we're in active event creation
-            if self.in_event_creation or self.event_handler.is_creating_event or self.event_handler.is_updating_event or self.event_handler.awaiting_confirmation:
-                # Let the event handler process this input
-                response = self.event_handler.process_query(user_input)
-
-                if response:
-                    # Check if we're still in event creation mode
-                    self.in_event_creation = (
-                        self.event_handler.is_creating_event or
-                        self.event_handler.is_updating_event or
-                        self.event_handler.awaiting_confirmation
-                    )
-                    self.send_to_tts(response)
-                    return
-
-            # Check if this is a new event query
-            event_response = self.event_handler.process_query(user_input)
-            if event_response:
-                self.in_event_creation = True
-                self.send_to_tts(event_response)
-                return
-
-            # Check if it's a weather-related query
-            if self.weather_handler.is_weather_query(user_input):
-                response = self.weather_handler.process_weather_query(user_input)
-                self.send_to_tts(response)
-                return
+            try:
+                self.reminder_scheduler.load_from_store(self.event_store.events_between(now, horizon))
+            except Exception as e:
+                print(f"Error loading reminders from the event store: {e}")
 
-            # Check if it's a location-related query
-            location_keywords = ["where", "location", "nearby", "directions", "how to get", "find", "restaurant", "shop", "store"]
-            if any(keyword in user_input.lower() for keyword in location_keywords):
-                response = self.location_handler.process_location_query(user_input)
-                self.send_to_tts(response)
+            try:
+                if service_available(self.google_calendar_service):
+                    self.reminder_scheduler.load_from_calendar(self._upcoming_calendar_events(now, horizon))
+            except Exception as e:
+                # Includes revoked credentials and connection errors, not just API errors
+                print(f"Error loading reminders from Google Calendar: {e}")
+        finally:
+            # Pick up events that move into the horizon, and any change a listener missed
+            self._reminder_reload = threading.Timer(REMINDER_RELOAD_SECONDS, self.load_reminders)
+            self._reminder_reload.daemon = True
+            self._reminder_reload.start()
+
+    def _upcoming_calendar_events(self, time_min, time_max):
+        page_token = None
+        while True:
+            result = self.google_calendar_service.events().list(
+                calendarId='primary',
+                timeMin=time_min.isoformat(),
+                timeMax=time_max.isoformat(),
+                singleEvents=True,
+                orderBy='startTime',
+                fields="nextPageToken,items(id,status,summary,start,reminders)",
+                pageToken=page_token
+            ).execute()
+            yield from result.get('items', [])
+            page_token = result.get('nextPageToken')
+            if not page_token:
                 return
 
-            # If none of the specialized handlers matched, use the LLM for general queries
-            response = self.llm_interface.query_llm(user_input)
-            self.send_to_tts(response)
-
+    def process_user_input(self, user_input):
+        """Process user input, speak the response and log the completed turn."""
+        turn_started = datetime.now()
+        self.turn_in_progress = True
+        try:
+            print(f"Processing input: {user_input}")
+            response = self.respond(user_input)
         except Exception as e:
             print(f"Error in process_user_input: {e}")
             import traceback
             traceback.print_exc()
-            self.send_to_tts("I'm sorry, I encountered an error. Please try again.")
+            response = "I'm sorry, I encountered an error. Please try again."
 
-    def insert_conversation(self, user_input):
-        """Inserts the conversation into the database."""
         try:
-            # Get the latest assistant response
-            assistant_response = self.speech_handler.get_last_response() if hasattr(self.speech_handler, 'get_last_response') else "No response generated"
-
-            # Insert into conversations table (if it exists)
-            try:
-                query = "INSERT INTO conversations (user_input, assistant_response, timestamp) VALUES (%s, %s, %s)"
-                values = (user_input, assistant_response, datetime.now())
-
-                self.db_cursor.execute(query, values)
-                self.db_connection.commit()
-            except mysql.connector.Error as db_err:
-                # If table doesn't exist, just log the error but don't crash
-                print(f"Database error when logging conversation: {db_err}")
-                self.db_connection.rollback()
-
-        except Exception as e:
-            print(f"Error logging conversation: {e}")
\ No newline at end of file
+            self.send_to_tts(response)
+        finally:
+            self.turn_in_progress = False
+        # Queued for the background writer, so logging adds no latency to the turn
+        self.conversation_log.log(user_input, response, turn_started)
+
+    def respond(self, user_input):
+        """Routes user input to the right handler and returns the response to speak."""
+        # Check if we're in active event creation
+        if self.in_event_creation or self.event_handler.is_creating_event or self.event_handler.is_updating_event or self.event_handler.awaiting_confirmation:
+            # Let the event handler process this input
+            response = self.event_handler.process_query(user_input)
+
+            if response:
+                # Check if we're still in event creation mode
+                self.in_event_creation = (
+                    self.event_handler.is_creating_event or
+                    self.event_handler.is_updating_event or
+                    self.event_handler.awaiting_confirmation
+                )
+                return response
+
+        # Questions about earlier conversations are answered from the archive
+        if is_history_query(user_input):
+            return self.conversation_archive.answer_question(user_input)
+
+        # Check if this is a new event query
+        event_response = self.event_handler.process_query(user_input)
+        if event_response:
+            self.in_event_creation = True
+            return event_response
+
+        # Check if it's a weather-related query
+        if self.weather_handler.is_weather_query(user_input):
+            return self.weather_handler.process_weather_query(user_input)
+
+        # Check if it's a location-related query
+        location_keywords = ["where", "location", "nearby", "directions", "how to get", "find", "restaurant", "shop", "store"]
+        if any(keyword in user_input.lower() for keyword in location_keywords):
+            return self.location_handler.process_location_query(user_input)
+
+        # If none of the specialized handlers matched, use the LLM for general queries
+        return self.llm_interface.query_llm(user_input)
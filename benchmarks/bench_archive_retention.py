@@ -0,0 +1,64 @@
+"""
+Report conversation archive size and insert latency before and after compaction.
+
+Fills a temporary SQLite archive with a year of turns, then compacts every
+month outside a six month retention window into gzip files.
+
+    python benchmarks/bench_archive_retention.py [turns_per_month]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from archive_maintenance import ArchiveMaintenance
+from conversation_archive import ConversationArchive
+from storage import SQLiteStorage
+
+TOPICS = ["weather", "lunch", "train times", "the library", "my essay", "coffee nearby", "the gym", "dinner"]
+
+
+def turns(months, per_month):
+    now = datetime.now()
+    records = []
+    for month in range(months):
+        first = now - timedelta(days=30 * (month + 1))
+        for i in range(per_month):
+            topic = random.choice(TOPICS)
+            records.append((f"what about {topic} today", f"Here is what I found about {topic}.",
+                            first + timedelta(seconds=i * 30 * 86400 / per_month)))
+    return records
+
+
+def show(label, report):
+    print(f"{label:<7} {len(report['partitions']):3d} partitions  {report['rows']:9d} rows  "
+          f"{report['bytes'] / 1e6:8.1f} MB db  {report['archived_bytes'] / 1e6:6.1f} MB archived  "
+          f"{report['insert_ms']:.3f} ms/insert")
+
+
+def main():
+    per_month = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    with tempfile.TemporaryDirectory() as directory:
+        storage = SQLiteStorage(os.path.join(directory, "archive.db"))
+        archive = ConversationArchive(storage)
+        records = turns(12, per_month)
+        for offset in range(0, len(records), 10000):
+            archive.insert_many(records[offset:offset + 10000])
+
+        maintenance = ArchiveMaintenance(archive, archive_dir=os.path.join(directory, "archive"),
+                                         retention_months=6, duty_cycle=1.0)
+        started = time.perf_counter()
+        before, after = maintenance.run_once()
+        elapsed = time.perf_counter() - started
+        show("before", before)
+        show("after", after)
+        print(f"compaction took {elapsed:.1f} s (unthrottled)")
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark batched Calendar writes against the serial path.
+
+Both paths run against the in-memory fake service with a simulated network
+latency per HTTP round trip.
+
+    python benchmarks/bench_calendar_batch.py [num_events] [latency_ms]
+"""
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fake_calendar import FakeCalendarService
+from googlecalendar_handler import GoogleCalendarHandler
+
+
+def timetable(count):
+    first = date(2027, 1, 11)
+    return [
+        {
+            'name': f"Lecture {i}",
+            'date': (first + timedelta(days=i % 70)).isoformat(),
+            'time': f"{9 + i % 8}:00",
+            'location': "Earl Mountbatten Building",
+            'details': "Imported from term timetable",
+            'reminder': "10 minutes before",
+        }
+        for i in range(count)
+    ]
+
+
+def run(label, func, service):
+    service.calls = 0
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms  {service.calls:5d} round trips")
+    return elapsed
+
+
+def main():
+    num_events = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    events = timetable(num_events)
+
+    serial_service = FakeCalendarService(latency=latency)
+    serial = GoogleCalendarHandler(service=serial_service)
+    batch_service = FakeCalendarService(latency=latency)
+    batched = GoogleCalendarHandler(service=batch_service)
+
+    print(f"{num_events} events, {latency * 1000:.0f} ms per round trip")
+    serial_insert = run("serial insert", lambda: [
+        serial.insert_event(e['name'], e['date'], e['time'], e['location'], e['details'], e['reminder'])
+        for e in events], serial_service)
+    batch_insert = run("batched insert", lambda: batched.bulk_insert_events(events), batch_service)
+
+    serial_ids = list(serial_service.events_by_id)
+    batch_ids = list(batch_service.events_by_id)
+    serial_cancel = run("serial cancel", lambda: [serial.cancel_event(event_id) for event_id in serial_ids],
+                        serial_service)
+    batch_cancel = run("batched cancel", lambda: batched.bulk_cancel_events(batch_ids), batch_service)
+
+    # Retry behaviour: a handful of transient failures are retried on their own
+    retry_service = FakeCalendarService(latency=latency)
+    retrying = GoogleCalendarHandler(service=retry_service)
+    retry_service.inject_failures = 5
+    results = []
+    run("batched insert, 5 failures", lambda: results.extend(retrying.bulk_insert_events(events)), retry_service)
+    retried = sum(1 for r in results if r['attempts'] > 1)
+    print(f"  {sum(r['ok'] for r in results)} created, {retried} items retried")
+
+    print(f"speed-up: insert {serial_insert / batch_insert:.1f}x, cancel {serial_cancel / batch_cancel:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Show that calendar reconciliation cost follows the number of changes, not the calendar size.
+
+For each calendar size, runs an initial reconciliation against the fake
+Calendar service, then edits a few events on each side and times the
+incremental pass that follows.
+
+    python benchmarks/bench_calendar_sync.py [changes]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import calendar_sync
+from calendar_sync import CalendarReconciler
+from event_store import EventStore
+from fake_calendar import FakeCalendarService
+from storage import SQLiteStorage
+
+
+def timed_run(reconciler, service):
+    calls = service.calls
+    started = time.perf_counter()
+    stats = reconciler.run_once()
+    return time.perf_counter() - started, service.calls - calls, stats
+
+
+def main():
+    changes = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    # No writes land between passes here, so there's nothing to re-read
+    calendar_sync.WATERMARK_OVERLAP = timedelta(0)
+    print(f"{'events':>7} {'initial s':>10} {'calls':>6}   {'incremental s':>13} {'calls':>6} {'rows read':>9}")
+    for size in (1000, 10000, 50000):
+        with tempfile.TemporaryDirectory() as directory:
+            storage = SQLiteStorage(os.path.join(directory, "sync.db"))
+            store = EventStore(storage, owner="bench")
+            service = FakeCalendarService()
+            start = datetime.now(timezone.utc) + timedelta(days=1)
+            with storage.connection() as conn:
+                cursor = conn.cursor()
+                storage.ensure_schema()
+                store.add_many([{'title': f"Event {i}", 'start': start + timedelta(minutes=5 * i),
+                                 'external_id': f"bench-{i}"} for i in range(size)], cursor)
+                conn.commit()
+                cursor.close()
+
+            reconciler = CalendarReconciler(store, service)
+            initial, initial_calls, _ = timed_run(reconciler, service)
+            # The next pass sees Google echo back everything the initial one pushed
+            reconciler.run_once()
+
+            time.sleep(0.01)
+            with storage.connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany("UPDATE events SET title = %s, updated_at = %s WHERE external_id = %s",
+                                   [(f"Edited {i}", datetime.utcnow(), f"bench-{i}") for i in range(changes)])
+                conn.commit()
+                cursor.close()
+            google_ids = list(service.events_by_id)[-changes:]
+            for google_id in google_ids:
+                service.events().patch(calendarId='primary', eventId=google_id, body={'summary': "Moved"}).execute()
+
+            incremental, incremental_calls, stats = timed_run(reconciler, service)
+            print(f"{size:7d} {initial:10.2f} {initial_calls:6d}   {incremental:13.3f} {incremental_calls:6d} "
+                  f"{stats['local_changes'] + stats['remote_changes']:9d}")
+            storage.close()
+
+
+if __name__ == "__main__":
+    main()
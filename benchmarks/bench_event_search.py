@@ -0,0 +1,73 @@
+"""
+Benchmark the local event search index on a large calendar.
+
+    python benchmarks/bench_event_search.py [num_events]
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from event_search import EventSearchIndex
+
+WORDS = ["dentist", "meeting", "lecture", "lunch", "gym", "review", "project", "standup", "doctor", "haircut",
+         "seminar", "tutorial", "football", "dinner", "coffee", "interview", "deadline", "exam", "lab", "call"]
+PEOPLE = ["sam", "alex", "priya", "jordan", "morgan", "chen", "fatima", "olu", "kirsty", "euan"]
+PLACES = ["leith", "edinburgh", "riccarton", "stockbridge", "portobello", "glasgow", "bruntsfield"]
+
+
+def make_events(count, seed=5):
+    rng = random.Random(seed)
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    events = []
+    for i in range(count):
+        start = base + timedelta(minutes=rng.randrange(365 * 24 * 60))
+        events.append({
+            'id': f"evt{i}",
+            'summary': f"{rng.choice(WORDS)} with {rng.choice(PEOPLE)} {i}",
+            'location': rng.choice(PLACES),
+            'description': " ".join(rng.choice(WORDS) for _ in range(5)),
+            'start': {'dateTime': start.isoformat()},
+            'end': {'dateTime': (start + timedelta(hours=1)).isoformat()},
+        })
+    return events
+
+
+def main():
+    num_events = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    events = make_events(num_events)
+    index = EventSearchIndex()
+
+    started = time.perf_counter()
+    for event in events:
+        index.add(event)
+    build_time = time.perf_counter() - started
+
+    queries = ["the dentist thing", "my meeting with sam", "dentst", "haircut in stockbridge",
+               "interv priya", "lunch with chen 42"]
+    now = datetime(2026, 6, 1, tzinfo=timezone.utc)
+    rounds = 50
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for query in queries:
+            index.search(query, now=now)
+    query_time = (time.perf_counter() - started) / (rounds * len(queries))
+
+    started = time.perf_counter()
+    for event in events[:1000]:
+        index.add(dict(event, summary=event['summary'] + " moved"))
+    update_time = (time.perf_counter() - started) / 1000
+
+    print(f"events: {num_events}, build: {build_time * 1000:.0f} ms")
+    print(f"average query: {query_time * 1000:.3f} ms")
+    print(f"incremental update: {update_time * 1e6:.1f} us per event")
+    for query in queries[:3]:
+        best = index.search(query, now=now, limit=1)
+        print(f"  {query!r} -> {best[0][1]['summary'] if best else None}")
+
+
+if __name__ == "__main__":
+    main()
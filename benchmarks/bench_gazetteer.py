@@ -0,0 +1,132 @@
+"""
+Measure gazetteer build time, file size, open time and per-utterance spotting latency, and compare its
+answers with the regex location extraction on labelled utterances.
+
+A synthetic GeoNames file is generated: random made-up place names plus a
+few real ones with realistic populations (two Perths, York and New York,
+Leith, ...). The regex extractors only return a phrase that still has to
+be geocoded over the network; the gazetteer returns coordinates.
+
+    python benchmarks/bench_gazetteer.py [places]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from gazetteer import Gazetteer, build_gazetteer
+from weather_handler import WeatherHandler
+
+REAL_PLACES = [
+    # name, lat, lng, population, country, alternate names
+    ("Edinburgh", 55.9521, -3.1965, 464990, "GB", "Dun Eideann,Edimbourg"),
+    ("Leith", 55.9800, -3.1700, 50000, "GB", ""),
+    ("Glasgow", 55.8652, -4.2576, 626410, "GB", "Glaschu"),
+    ("Perth", 56.3952, -3.4314, 47430, "GB", ""),
+    ("Perth", -31.9522, 115.8614, 2059484, "AU", ""),
+    ("York", 53.9576, -1.0827, 153717, "GB", ""),
+    ("New York City", 40.7143, -74.0060, 8804190, "US", "New York,NYC"),
+    ("Zürich", 47.3667, 8.5500, 341730, "CH", "Zurich"),
+    ("Stoke-on-Trent", 53.0042, -2.1854, 270726, "GB", ""),
+    ("The Hague", 52.0767, 4.2986, 474292, "NL", "Den Haag"),
+    ("Like", 45.0, 15.0, 120, "HR", ""),  # a real-sounding village that must not match "weather like today"
+    # Sizeable places that are also everyday words
+    ("Nice", 43.7031, 7.2661, 338620, "FR", "Nizza"),
+    ("Reading", 51.4542, -0.9731, 161780, "GB", ""),
+    ("Bath", 51.3751, -2.3618, 94782, "GB", ""),
+]
+
+# utterance -> expected canonical name (None: no place named)
+LABELLED = {
+    "what's the weather like today": None,
+    "what's the weather like in leith today": "Leith",
+    "weather in Perth this weekend": "Perth",
+    "is it going to rain in new york tomorrow": "New York City",
+    "how is the weather in zurich": "Zürich",
+    "temperature in stoke on trent right now": "Stoke-on-Trent",
+    "find a cafe near glasgow": "Glasgow",
+    "nearest pharmacy in the hague": "The Hague",
+    "what's the forecast for york on friday": "York",
+    "will it be sunny tomorrow": None,
+    "will it be nice tomorrow": None,
+    "what's the temperature reading in the kitchen": None,
+    "remind me to take a bath tonight": None,
+    "is it raining in Reading": "Reading",
+    "what's the weather in nice this week": "Nice",
+}
+
+SYLLABLES = ["ab", "ber", "cal", "dun", "ell", "for", "gar", "holm", "ing", "kirk", "lan", "mor", "ness", "ock",
+             "pen", "ross", "stan", "thorp", "wick", "ton", "ley", "by", "ham", "well"]
+
+
+def write_geonames(path, places, seed=1):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as out:
+        row_id = 1
+        for name, lat, lng, population, country, alternates in REAL_PLACES:
+            out.write(f"{row_id}\t{name}\t{name}\t{alternates}\t{lat}\t{lng}\tP\tPPL\t{country}\t\t\t\t\t\t"
+                      f"{population}\t\t\tUTC\t2024-01-01\n")
+            row_id += 1
+        for _ in range(places):
+            name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+            if rng.random() < 0.15:
+                name += " " + rng.choice(["Upon Tyne", "Bridge", "Green", "Mill", "Hill"])
+            population = int(rng.paretovariate(1.2) * 300)
+            out.write(f"{row_id}\t{name}\t{name}\t\t{rng.uniform(50, 59):.4f}\t{rng.uniform(-7, 2):.4f}\tP\tPPL\tGB"
+                      f"\t\t\t\t\t\t{population}\t\t\tEurope/London\t2024-01-01\n")
+            row_id += 1
+
+
+def main():
+    places = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    workdir = tempfile.mkdtemp()
+    source, compiled = os.path.join(workdir, "places.txt"), os.path.join(workdir, "gazetteer.bin")
+    write_geonames(source, places)
+
+    started = time.perf_counter()
+    count, names = build_gazetteer(source, compiled)
+    print(f"build:   {count} places, {names} names in {time.perf_counter() - started:.1f} s, "
+          f"{os.path.getsize(compiled) / 1e6:.1f} MB")
+
+    started = time.perf_counter()
+    gazetteer = Gazetteer(compiled)
+    print(f"open:    {1e6 * (time.perf_counter() - started):.0f} us")
+
+    os.environ['GAZETTEER_PATH'] = os.path.join(workdir, "missing.bin")
+    weather = WeatherHandler()  # regex extraction only
+    rounds = 2000
+    utterances = list(LABELLED)
+    for label, extract in [("regex (weather)", weather.extract_location_from_query), ("gazetteer", gazetteer.resolve)]:
+        started = time.perf_counter()
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        try:
+            for _ in range(rounds):
+                for utterance in utterances:
+                    extract(utterance)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        per_utterance = 1e6 * (time.perf_counter() - started) / (rounds * len(utterances))
+        print(f"{label:<16} {per_utterance:6.1f} us per utterance")
+
+    print()
+    correct = 0
+    for utterance, expected in LABELLED.items():
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        regex = weather.extract_location_from_query(utterance)
+        sys.stdout.close()
+        sys.stdout = stdout
+        place = gazetteer.resolve(utterance)
+        found = place['name'] if place else None
+        correct += found == expected
+        detail = f"{found} ({place['country']}, pop {place['population']})" if place else "-"
+        print(f"{utterance:<46} regex: {regex!s:<24} gazetteer: {detail}")
+    print(f"\ngazetteer correct on {correct}/{len(LABELLED)} labelled utterances")
+    gazetteer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark group availability search across many calendars.
+
+Runs the full path (freebusy query against the fake service, rasterising,
+vectorised window search) and compares the search step with a pure Python
+minute-by-minute scan.
+
+    python benchmarks/bench_group_availability.py [num_calendars] [num_weeks]
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fake_calendar import FakeCalendarService
+from group_availability import (fetch_busy_intervals, find_common_free_windows, find_group_availability,
+                                rasterize_busy, working_minutes_mask)
+
+
+def populate(service, calendar_ids, range_start, days, seed=3):
+    rng = random.Random(seed)
+    for calendar_id in calendar_ids:
+        for day in range(days):
+            for _ in range(rng.randrange(1, 5)):
+                start = range_start + timedelta(days=day, hours=rng.randrange(8, 19), minutes=rng.choice([0, 30]))
+                service.add_busy(calendar_id, start, start + timedelta(minutes=rng.choice([30, 60, 90])))
+
+
+def python_scan(busy, calendar_ids, range_start, total_minutes, duration_minutes):
+    """Minute-by-minute scan over every calendar's intervals."""
+    windows = []
+    run_start = None
+    for minute in range(total_minutes + 1):
+        moment = range_start + timedelta(minutes=minute)
+        local_minute = moment.hour * 60 + moment.minute
+        free = minute < total_minutes and 8 * 60 <= local_minute < 20 * 60 and not any(
+            start <= moment < end for calendar_id in calendar_ids for start, end in busy.get(calendar_id, []))
+        if free and run_start is None:
+            run_start = minute
+        elif not free and run_start is not None:
+            if minute - run_start >= duration_minutes:
+                windows.append(run_start)
+            run_start = None
+    return windows
+
+
+def main():
+    num_calendars = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    num_weeks = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    days = num_weeks * 7
+    range_start = datetime(2026, 11, 2, tzinfo=timezone.utc)
+    range_end = range_start + timedelta(days=days)
+    total_minutes = days * 24 * 60
+    calendar_ids = [f"user{i}@example.com" for i in range(num_calendars)]
+
+    service = FakeCalendarService()
+    populate(service, calendar_ids, range_start, days)
+
+    started = time.perf_counter()
+    windows, _ = find_group_availability(service, calendar_ids, range_start, range_end, duration_minutes=30)
+    end_to_end = time.perf_counter() - started
+
+    busy, _ = fetch_busy_intervals(service, calendar_ids, range_start, range_end)
+    started = time.perf_counter()
+    matrix = rasterize_busy(busy, calendar_ids, range_start, total_minutes)
+    raster_time = time.perf_counter() - started
+    mask = working_minutes_mask(range_start, total_minutes)
+    started = time.perf_counter()
+    vector_windows = find_common_free_windows(matrix, range_start, 30, allowed_mask=mask)
+    search_time = time.perf_counter() - started
+
+    # The scan is slow, so only run it on a shorter range of a few calendars
+    scan_ids = calendar_ids[:5]
+    scan_minutes = 7 * 24 * 60
+    started = time.perf_counter()
+    scanned = python_scan(busy, scan_ids, range_start, scan_minutes, 30)
+    scan_time = time.perf_counter() - started
+    small = find_common_free_windows(rasterize_busy(busy, scan_ids, range_start, scan_minutes), range_start, 30,
+                                     allowed_mask=working_minutes_mask(range_start, scan_minutes))
+    assert [int((start - range_start).total_seconds() // 60) for start, _ in small] == scanned
+
+    print(f"calendars: {num_calendars}, range: {num_weeks} weeks ({total_minutes} minutes)")
+    print(f"end to end (freebusy + raster + search): {end_to_end * 1000:.1f} ms, {len(windows)} windows")
+    print(f"rasterise: {raster_time * 1000:.1f} ms, vectorised search: {search_time * 1000:.2f} ms "
+          f"({len(vector_windows)} windows)")
+    print(f"python scan, 5 calendars x 1 week: {scan_time * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Measure iCalendar import and export throughput in events per second.
+
+Generates an .ics file with the requested number of events (a few of them
+weekly recurring), imports it into a temporary SQLite store, pushes it to
+the fake Calendar service in batches and exports the store back out.
+
+    python benchmarks/bench_ics.py [events]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from event_store import EventStore
+from fake_calendar import FakeCalendarService
+from ics_io import IcsImporter, export_ics, iter_vevents
+from storage import SQLiteStorage
+
+TITLES = ["Lecture", "Lab session", "Dentist", "Team meeting", "Gym", "Supervisor meeting", "Dinner"]
+
+
+def write_ics(path, count, recurring_every=100):
+    """Writes `count` VEVENTs; every `recurring_every`th one repeats weekly for four weeks."""
+    start = datetime(2026, 1, 5, 9, 0)
+    with open(path, "w", encoding="utf-8", newline="") as out:
+        out.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//bench//EN\r\n")
+        for i in range(count):
+            begins = start + timedelta(minutes=30 * i)
+            out.write("BEGIN:VEVENT\r\n"
+                      f"UID:bench-{i}@example.com\r\n"
+                      f"DTSTART;TZID=Europe/London:{begins:%Y%m%dT%H%M%S}\r\n"
+                      f"DTEND;TZID=Europe/London:{begins + timedelta(minutes=45):%Y%m%dT%H%M%S}\r\n"
+                      f"SUMMARY:{random.choice(TITLES)} {i}\r\n"
+                      "LOCATION:Room 2.14\\, Main Building\r\n"
+                      "DESCRIPTION:A description long enough that it has to be folded across more than\r\n"
+                      "  one physical line when it is written out\r\n")
+            if i % recurring_every == 0:
+                out.write("RRULE:FREQ=WEEKLY;COUNT=4\r\n")
+            out.write("BEGIN:VALARM\r\nACTION:DISPLAY\r\nTRIGGER:-PT15M\r\nEND:VALARM\r\nEND:VEVENT\r\n")
+        out.write("END:VCALENDAR\r\n")
+
+
+def rate(count, seconds):
+    return f"{count:7d} events in {seconds:6.2f} s  ({count / seconds:9.0f} events/s)"
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "source.ics")
+        write_ics(source, count)
+        print(f"source file: {os.path.getsize(source) / 1e6:.1f} MB")
+
+        started = time.perf_counter()
+        with open(source, encoding="utf-8", newline="") as lines:
+            parsed = sum(1 for _ in iter_vevents(lines))
+        print(f"parse   {rate(parsed, time.perf_counter() - started)}")
+
+        storage = SQLiteStorage(os.path.join(directory, "events.db"))
+        store = EventStore(storage, owner="bench")
+        importer = IcsImporter(store, now=datetime(2026, 1, 1).astimezone())
+        started = time.perf_counter()
+        imported = importer.import_file(source)
+        print(f"import  {rate(imported, time.perf_counter() - started)}")
+
+        service = FakeCalendarService()
+        pusher = IcsImporter(EventStore(SQLiteStorage(os.path.join(directory, "push.db")), owner="bench"),
+                             calendar_service=service, now=datetime(2026, 1, 1).astimezone())
+        started = time.perf_counter()
+        pusher.import_file(source)
+        print(f"push    {rate(pusher.pushed, time.perf_counter() - started)}  "
+              f"{service.calls} round trips, {pusher.push_failures} failed")
+
+        target = os.path.join(directory, "export.ics")
+        started = time.perf_counter()
+        with open(target, "w", encoding="utf-8", newline="") as out:
+            exported = export_ics(store.iter_events(), out)
+        print(f"export  {rate(exported, time.perf_counter() - started)}")
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark free-slot search and conflict detection on large calendars.
+
+Compares the interval index with the previous approach of re-parsing every
+event's timestamps for every candidate slot.
+
+    python benchmarks/bench_interval_index.py [num_events]
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from interval_index import IntervalIndex
+
+
+def make_events(count, days=90, seed=7):
+    rng = random.Random(seed)
+    base = datetime(2026, 1, 5, tzinfo=timezone.utc)
+    events = []
+    for i in range(count):
+        start = base + timedelta(days=rng.randrange(days), hours=rng.randrange(7, 21), minutes=rng.choice([0, 15, 30, 45]))
+        end = start + timedelta(minutes=rng.choice([15, 30, 45, 60, 90, 120]))
+        events.append({
+            'id': f"evt{i}",
+            'summary': f"Event {i}",
+            'start': {'dateTime': start.isoformat()},
+            'end': {'dateTime': end.isoformat()},
+        })
+    return base, events
+
+
+def naive_free_slots(events, day):
+    """The original per-slot scan: hourly slots, every event re-parsed per slot."""
+    available = []
+    for hour in range(8, 19):
+        slot_start = datetime.combine(day, datetime.strptime(f"{hour}:00", "%H:%M").time()).replace(tzinfo=timezone.utc)
+        slot_end = slot_start + timedelta(hours=1)
+        conflict = False
+        for event in events:
+            event_start = datetime.fromisoformat(event['start']['dateTime'])
+            event_end = datetime.fromisoformat(event['end']['dateTime'])
+            if event_start < slot_end and event_end > slot_start:
+                conflict = True
+                break
+        if not conflict:
+            available.append(slot_start)
+    return available
+
+
+def main():
+    num_events = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    base, events = make_events(num_events)
+    days = [(base + timedelta(days=i)).date() for i in range(90)]
+
+    started = time.perf_counter()
+    index = IntervalIndex.from_events(events)
+    build_time = time.perf_counter() - started
+
+    # Sanity check: both approaches agree on hourly slots
+    for day in days[:10]:
+        day_start = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+        fast = [start for start, _ in index.free_slots(day_start, day_start + timedelta(days=1))]
+        assert fast == naive_free_slots(events, day)
+
+    started = time.perf_counter()
+    for day in days:
+        naive_free_slots(events, day)
+    naive_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for day in days:
+        day_start = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+        list(index.free_slots(day_start, day_start + timedelta(days=1)))
+    index_time = time.perf_counter() - started
+
+    rng = random.Random(11)
+    probes = [base + timedelta(minutes=rng.randrange(90 * 24 * 60)) for _ in range(10000)]
+    started = time.perf_counter()
+    for probe in probes:
+        index.overlapping(probe, probe + timedelta(hours=1))
+    conflict_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    slots = list(index.free_slots(base, base + timedelta(days=90), duration=timedelta(minutes=45),
+                                  granularity=timedelta(minutes=15)))
+    range_time = time.perf_counter() - started
+
+    print(f"events: {num_events}")
+    print(f"index build: {build_time * 1000:.1f} ms")
+    print(f"free slots, 90 single days: naive {naive_time * 1000:.1f} ms, index {index_time * 1000:.1f} ms "
+          f"({naive_time / index_time:.0f}x)")
+    print(f"conflict queries: {conflict_time / len(probes) * 1e6:.1f} us per query")
+    print(f"45-minute slots on a 15-minute grid over 90 days: {len(slots)} slots in {range_time * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
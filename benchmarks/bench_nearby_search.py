@@ -0,0 +1,117 @@
+"""
+Compare nearby search latency: serial radius expansion vs the distance-ranked / concurrent search.
+
+The Places API is replaced by an in-process fake that answers after a fixed
+round-trip delay, with places scattered at chosen distances from the
+default location. The serial baseline is the old strategy: 2, 5, 10 and
+20 km one after another, then a text search.
+
+    python benchmarks/bench_nearby_search.py [latency_ms]
+"""
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+os.environ['GEOCODE_CACHE_PATH'] = os.path.join(tempfile.mkdtemp(), "geocode_cache.db")
+os.environ.setdefault('GOOGLE_PLACES_API_KEY', "benchmark")
+
+import location_handler
+from geo import haversine_km
+from location_handler import NEARBY_RADII, LocationHandler
+
+LAT, LNG = 55.9086, -3.3203
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        pass
+
+
+class FakePlaces:
+    """Answers Nearby and Text Search requests from a fixed set of places after `latency` seconds."""
+
+    def __init__(self, distances_km, latency):
+        self.latency = latency
+        self.calls = 0
+        self.places = []
+        for i, distance in enumerate(distances_km):
+            bearing = random.uniform(0, 2 * math.pi)
+            self.places.append({
+                'name': f"Place {i}",
+                'vicinity': "Somewhere",
+                'geometry': {'location': {'lat': LAT + distance / 111.2 * math.cos(bearing),
+                                          'lng': LNG + distance / 62.3 * math.sin(bearing)}},
+            })
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        if url.endswith("textsearch/json"):
+            return FakeResponse({'status': 'OK', 'results': self.places[:20]})
+        lat, lng = (float(value) for value in params['location'].split(","))
+        distances = haversine_km(lat, lng, [p['geometry']['location']['lat'] for p in self.places],
+                                 [p['geometry']['location']['lng'] for p in self.places])
+        if params.get('rankby') == 'distance':
+            found = [self.places[i] for i in distances.argsort() if distances[i] <= 50][:20]
+        else:
+            found = [place for place, distance in zip(self.places, distances) if distance <= params['radius'] / 1000]
+            random.shuffle(found)  # prominence order, not distance
+            found = found[:20]
+        return FakeResponse({'status': 'OK' if found else 'ZERO_RESULTS', 'results': found})
+
+
+def serial_search(handler, base_params, place_type, location_name):
+    for radius in NEARBY_RADII:
+        results = handler._nearby_request(dict(base_params, radius=radius))
+        if results:
+            return results
+    data = location_handler.requests.get(handler.places_url, params={'query': f"{place_type} near {location_name}"}).json()
+    return data.get('results', [])
+
+
+def main():
+    latency = (float(sys.argv[1]) if len(sys.argv) > 1 else 150) / 1000
+    scenarios = [
+        ("dense, typed", [0.4, 0.9, 1.5, 3, 6], "cafe"),
+        ("sparse, typed", [12, 14, 30], "cafe"),
+        ("none in 20 km", [35, 40], "cafe"),
+        ("sparse, untyped", [12, 14, 30], None),
+    ]
+    print(f"{'scenario':<17} {'serial ms':>9} {'calls':>5}   {'new ms':>7} {'calls':>5}   nearest found")
+    for label, distances, place_type in scenarios:
+        fake = FakePlaces(distances, latency)
+        location_handler.requests.get = fake.get
+        handler = LocationHandler()
+        base_params = {'key': "benchmark", 'location': f"{LAT},{LNG}", 'language': 'en'}
+        if place_type:
+            base_params['type'] = place_type
+
+        fake.calls = 0
+        started = time.perf_counter()
+        serial_search(handler, base_params, place_type, "here")
+        serial_ms, serial_calls = 1000 * (time.perf_counter() - started), fake.calls
+
+        fake.calls = 0
+        started = time.perf_counter()
+        results = handler._search_nearby(base_params, place_type or "places", "here", LAT, LNG)
+        new_ms, new_calls = 1000 * (time.perf_counter() - started), fake.calls
+        nearest = f"{results[0]['distance_km']:.1f} km" if results else "-"
+        print(f"{label:<17} {serial_ms:9.0f} {serial_calls:5d}   {new_ms:7.0f} {new_calls:5d}   {nearest}")
+        handler.search_executor.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Measure offline POI ingestion throughput and nearest-k / within-radius query latency.
+
+A synthetic OSM extract is generated around Edinburgh: untagged geometry
+nodes, tagged POI nodes of every mapped type, and closed ways (buildings
+and parks) tagged as POIs. It is ingested into a fresh SQLite store and
+then queried from random points in the area.
+
+    python benchmarks/bench_osm_pois.py [poi_nodes] [queries]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from xml.sax.saxutils import quoteattr
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+from osm_pois import OSM_TYPE_MAP, OsmPoiIndex
+
+LAT, LNG = 55.95, -3.25
+SPREAD = 0.4  # degrees either side, roughly 45 km by 25 km
+GEOMETRY_NODES_PER_POI = 8
+WAY_FRACTION = 0.1
+
+
+def write_extract(path, poi_nodes, seed=1):
+    rng = random.Random(seed)
+    tags = list(OSM_TYPE_MAP)
+    node_id = 0
+    way_nodes = []
+    with open(path, "w", encoding="utf-8") as out:
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6" generator="bench">\n')
+        for i in range(poi_nodes):
+            for _ in range(GEOMETRY_NODES_PER_POI):
+                node_id += 1
+                lat, lng = LAT + rng.uniform(-SPREAD, SPREAD), LNG + rng.uniform(-SPREAD, SPREAD)
+                out.write(f'  <node id="{node_id}" lat="{lat:.7f}" lon="{lng:.7f}" version="1"/>\n')
+                if len(way_nodes) < poi_nodes * WAY_FRACTION * 4:
+                    way_nodes.append(node_id)
+            node_id += 1
+            key, value = rng.choice(tags)
+            lat, lng = LAT + rng.uniform(-SPREAD, SPREAD), LNG + rng.uniform(-SPREAD, SPREAD)
+            out.write(f'  <node id="{node_id}" lat="{lat:.7f}" lon="{lng:.7f}" version="1">\n'
+                      f'    <tag k="{key}" v="{value}"/>\n'
+                      f'    <tag k="name" v={quoteattr(f"{value.title()} {i}")}/>\n'
+                      f'    <tag k="addr:street" v="High Street"/>\n'
+                      f'  </node>\n')
+        for way_id in range(len(way_nodes) // 4):
+            key, value = rng.choice(tags)
+            refs = way_nodes[way_id * 4:way_id * 4 + 4] + [way_nodes[way_id * 4]]
+            out.write(f'  <way id="{way_id + 1}" version="1">\n')
+            for ref in refs:
+                out.write(f'    <nd ref="{ref}"/>\n')
+            out.write(f'    <tag k="building" v="yes"/>\n    <tag k="{key}" v="{value}"/>\n  </way>\n')
+        out.write('</osm>\n')
+    return node_id + len(way_nodes) // 4
+
+
+def percentiles(samples):
+    samples = np.array(samples) * 1000
+    return f"p50 {np.percentile(samples, 50):6.3f} ms  p95 {np.percentile(samples, 95):6.3f} ms"
+
+
+def main():
+    poi_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    workdir = tempfile.mkdtemp()
+    extract = os.path.join(workdir, "region.osm")
+
+    started = time.perf_counter()
+    elements = write_extract(extract, poi_nodes)
+    size_mb = os.path.getsize(extract) / 1e6
+    print(f"extract: {elements} elements, {size_mb:.0f} MB, generated in {time.perf_counter() - started:.1f} s")
+
+    index = OsmPoiIndex(os.path.join(workdir, "osm_pois.db"))
+    started = time.perf_counter()
+    read, written = index.ingest(extract)
+    elapsed = time.perf_counter() - started
+    print(f"ingest:  {read} elements, {written} places in {elapsed:.1f} s "
+          f"({read / elapsed:,.0f} elements/s, {size_mb / elapsed:.1f} MB/s)")
+
+    rng = random.Random(2)
+    points = [(LAT + rng.uniform(-SPREAD, SPREAD), LNG + rng.uniform(-SPREAD, SPREAD)) for _ in range(queries)]
+    types = sorted(set(OSM_TYPE_MAP.values()))
+    cases = [
+        ("nearest 3, typed", lambda lat, lng, t: index.nearest(lat, lng, k=3, place_type=t)),
+        ("nearest 20, typed", lambda lat, lng, t: index.nearest(lat, lng, k=20, place_type=t)),
+        ("nearest 3, keyword", lambda lat, lng, t: index.nearest(lat, lng, k=3, keyword="Cafe 1")),
+        ("within 2 km, typed", lambda lat, lng, t: index.within_radius(lat, lng, 2000, place_type=t)),
+        ("within 1 km, any", lambda lat, lng, t: index.within_radius(lat, lng, 1000)),
+    ]
+    for label, query in cases:
+        samples = []
+        found = 0
+        for i, (lat, lng) in enumerate(points):
+            started = time.perf_counter()
+            found += len(query(lat, lng, types[i % len(types)]))
+            samples.append(time.perf_counter() - started)
+        print(f"{label:<20} {percentiles(samples)}  avg results {found / len(points):.1f}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
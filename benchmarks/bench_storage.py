@@ -0,0 +1,104 @@
+"""
+Benchmark event inserts and date-range reads on the storage backends.
+
+SQLite always runs against a temporary file. MySQL runs too when the DB_*
+environment variables point at a reachable server; its tables are created
+if missing, and the rows it inserts are deleted afterwards.
+
+    python benchmarks/bench_storage.py [num_events]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from storage import DB_ERRORS, MySQLStorage, SQLiteStorage
+
+INSERT_EVENT = """
+INSERT INTO my_table (event_name, event_date, event_time, location, details, reminder)
+VALUES (%s, %s, %s, %s, %s, %s)
+"""
+RANGE_QUERY = "SELECT id, event_name, event_time FROM my_table WHERE event_date >= %s AND event_date < %s"
+MARKER = "bench_storage"
+
+
+def rows(count):
+    first = date(2027, 1, 1)
+    return [
+        (f"Event {i}", (first + timedelta(days=i % 365)).isoformat(), f"{9 + i % 9:02d}:00:00",
+         "Edinburgh", MARKER, "10 minutes before")
+        for i in range(count)
+    ]
+
+
+def timed(label, func, count):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<30} {elapsed * 1000:9.1f} ms  {count / elapsed:10.0f} ops/s")
+
+
+def bench(storage, count):
+    print(f"{storage.name}:")
+    storage.ensure_schema()
+    data = rows(count)
+    single = data[:min(count, 500)]
+
+    def insert_one_by_one():
+        with storage.connection() as conn:
+            cursor = conn.cursor()
+            for values in single:
+                cursor.execute(INSERT_EVENT, values)
+                conn.commit()
+            cursor.close()
+
+    def insert_batched():
+        with storage.connection() as conn:
+            cursor = conn.cursor()
+            for offset in range(0, len(data), 1000):
+                cursor.executemany(INSERT_EVENT, data[offset:offset + 1000])
+            conn.commit()
+            cursor.close()
+
+    def range_reads():
+        with storage.connection() as conn:
+            cursor = conn.cursor()
+            first = date(2027, 1, 1)
+            for i in range(1000):
+                start = first + timedelta(days=i % 358)
+                cursor.execute(RANGE_QUERY, (start.isoformat(), (start + timedelta(days=7)).isoformat()))
+                cursor.fetchall()
+            cursor.close()
+
+    timed(f"insert + commit each ({len(single)})", insert_one_by_one, len(single))
+    timed(f"executemany, one commit ({count})", insert_batched, count)
+    timed("week range read (1000)", range_reads, 1000)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    with tempfile.TemporaryDirectory() as directory:
+        sqlite = SQLiteStorage(os.path.join(directory, "bench.db"))
+        bench(sqlite, count)
+        sqlite.close()
+
+    mysql_storage = MySQLStorage()
+    try:
+        bench(mysql_storage, count)
+    except DB_ERRORS as e:
+        print(f"mysql: skipped ({e})")
+        return
+    with mysql_storage.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM my_table WHERE details = %s", (MARKER,))
+        conn.commit()
+        cursor.close()
+    mysql_storage.close()
+
+
+if __name__ == "__main__":
+    main()
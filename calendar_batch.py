@@ -0,0 +1,89 @@
+import json
+import time
+from googleapiclient.errors import HttpError
+
+# Google Calendar accepts at most 50 calls in a single batch request
+CALENDAR_BATCH_LIMIT = 50
+
+# Statuses worth retrying: rate limits and transient server errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# A 403 is only a rate limit for these reasons; anything else (forbidden, no access) won't change on retry
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+
+def _error_reason(error):
+    """The first reason in an HttpError's JSON body, or None."""
+    try:
+        content = error.content.decode("utf-8") if isinstance(error.content, bytes) else error.content
+        return json.loads(content)['error']['errors'][0].get('reason')
+    except (AttributeError, TypeError, ValueError, KeyError, IndexError):
+        return None
+
+
+def _is_retryable(error):
+    if isinstance(error, HttpError):
+        if error.resp.status == 403:
+            return _error_reason(error) in RATE_LIMIT_REASONS
+        return error.resp.status in RETRYABLE_STATUSES
+    # Connection problems surface as plain exceptions
+    return True
+
+
+def execute_in_batches(service, request_factories, batch_size=CALENDAR_BATCH_LIMIT, max_retries=3,
+                       backoff=0.5, ok_statuses=()):
+    """
+    Executes many Calendar API calls using batch HTTP requests.
+
+    `request_factories` is a list of zero-argument callables that each build a
+    fresh request (e.g. ``lambda: service.events().delete(...)``), so failed
+    items can be rebuilt and resent. Calls are chunked to the batch limit and
+    only the items that failed with a retryable error are retried, with
+    exponential backoff between rounds. Errors whose status is in
+    `ok_statuses` count as success.
+
+    Returns one result per item, in input order, as a dict with 'ok',
+    'result', 'error' and 'attempts' keys.
+    """
+    results = [{'ok': False, 'result': None, 'error': None, 'attempts': 0} for _ in request_factories]
+    pending = list(range(len(request_factories)))
+
+    for attempt in range(max_retries + 1):
+        if not pending:
+            break
+        if attempt:
+            time.sleep(backoff * (2 ** (attempt - 1)))
+
+        failed = []
+        for offset in range(0, len(pending), batch_size):
+            chunk = pending[offset:offset + batch_size]
+
+            def callback(request_id, response, exception):
+                index = int(request_id)
+                result = results[index]
+                result['attempts'] += 1
+                if exception is None:
+                    result.update(ok=True, result=response, error=None)
+                elif isinstance(exception, HttpError) and exception.resp.status in ok_statuses:
+                    result.update(ok=True, result=None, error=None)
+                else:
+                    result['error'] = str(exception)
+                    if _is_retryable(exception):
+                        failed.append(index)
+
+            batch = service.new_batch_http_request(callback=callback)
+            for index in chunk:
+                batch.add(request_factories[index](), request_id=str(index))
+            try:
+                batch.execute()
+            except Exception as e:
+                # The whole batch request failed, so every item in it is retried
+                print(f"Batch request failed: {e}")
+                for index in chunk:
+                    if not results[index]['ok'] and index not in failed:
+                        results[index]['attempts'] += 1
+                        results[index]['error'] = str(e)
+                        failed.append(index)
+
+        pending = sorted(failed)
+
+    return results
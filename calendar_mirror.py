@@ -0,0 +1,182 @@
+import threading
+import time
+from datetime import datetime, timezone
+import pytz
+from googleapiclient.errors import HttpError
+
+# All-day events carry only a date, which is read as midnight in this zone unless the caller passes another
+DEFAULT_TIMEZONE = "Europe/London"
+
+# Partial response mask for sync pages: only the parts of each event the assistant reads
+SYNC_FIELDS = ("nextPageToken,nextSyncToken,"
+               "items(id,status,etag,updated,summary,location,description,start,end,reminders)")
+
+
+def parse_event_time(value, tz=None):
+    """
+    Parses a Calendar API dateTime/date string into a timezone-aware datetime.
+
+    An all-day `date` is local midnight in `tz` (default Europe/London), not
+    UTC midnight, so it stays on the right day on either side of GMT.
+    """
+    if 'T' not in value:
+        midnight = datetime.fromisoformat(value)
+        tz = tz or pytz.timezone(DEFAULT_TIMEZONE)
+        return tz.localize(midnight) if hasattr(tz, 'localize') else midnight.replace(tzinfo=tz)
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+class CalendarMirror:
+    """
+    Local copy of a calendar kept current with the Calendar API's incremental sync.
+
+    The first sync pages through the whole calendar and stores the returned
+    `nextSyncToken`; later syncs only fetch what changed since that token. A 410
+    response means the token has expired, so the mirror is dropped and rebuilt.
+    Reads are served locally as long as the last sync is younger than
+    `max_staleness` seconds.
+    """
+
+    def __init__(self, service, calendar_id='primary', max_staleness=60):
+        self.service = service
+        self.calendar_id = calendar_id
+        self.max_staleness = max_staleness
+
+        self.events = {}  # event id -> (start_dt, end_dt, event)
+        self.sync_token = None
+        self.last_sync = None
+        self.version = 0  # bumped whenever the mirrored events change
+        self.listeners = []  # callables notified with (event_id, event or None)
+        self.lock = threading.RLock()
+
+        self.stats = {
+            'reads': 0,
+            'syncs': 0,
+            'full_syncs': 0,
+            'api_calls': 0,
+            'calls_avoided': 0,
+        }
+
+    def add_listener(self, listener):
+        """Registers a callable notified as listener(event_id, event) on every change; event is None on removal."""
+        self.listeners.append(listener)
+        with self.lock:
+            for event_id, (_, _, event) in self.events.items():
+                listener(event_id, event)
+
+    def _notify(self, event_id, event):
+        for listener in self.listeners:
+            listener(event_id, event)
+
+    def is_stale(self):
+        """Returns True if the mirror needs a sync before it can answer a read."""
+        if self.sync_token is None or self.last_sync is None:
+            return True
+        return time.monotonic() - self.last_sync > self.max_staleness
+
+    def sync(self):
+        """Brings the mirror up to date, falling back to a full resync if the token expired."""
+        with self.lock:
+            if self.sync_token is None:
+                self._full_sync()
+                return
+            try:
+                self._fetch_changes(sync_token=self.sync_token)
+            except HttpError as error:
+                if error.resp.status != 410:
+                    raise
+                print("Calendar sync token expired, performing a full resync")
+                self._full_sync()
+
+    def _full_sync(self):
+        for event_id in self.events:
+            self._notify(event_id, None)
+        self.events = {}
+        self.version += 1
+        self.sync_token = None
+        self.stats['full_syncs'] += 1
+        self._fetch_changes()
+
+    def _fetch_changes(self, sync_token=None):
+        page_token = None
+        while True:
+            params = {
+                'calendarId': self.calendar_id,
+                'singleEvents': True,
+                'maxResults': 250,
+                'fields': SYNC_FIELDS,
+            }
+            if sync_token:
+                params['syncToken'] = sync_token
+            if page_token:
+                params['pageToken'] = page_token
+
+            result = self.service.events().list(**params).execute()
+            self.stats['api_calls'] += 1
+
+            for event in result.get('items', []):
+                self.apply(event)
+
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                self.sync_token = result.get('nextSyncToken')
+                break
+
+        self.last_sync = time.monotonic()
+        self.stats['syncs'] += 1
+
+    def apply(self, event):
+        """Applies a single event resource (including cancellations) to the mirror."""
+        with self.lock:
+            event_id = event.get('id')
+            if not event_id:
+                return
+            self.version += 1
+            if event.get('status') == 'cancelled':
+                if self.events.pop(event_id, None):
+                    self._notify(event_id, None)
+                return
+            start = event.get('start', {})
+            end = event.get('end', {})
+            start_value = start.get('dateTime', start.get('date'))
+            end_value = end.get('dateTime', end.get('date'))
+            if not start_value or not end_value:
+                return
+            self.events[event_id] = (parse_event_time(start_value), parse_event_time(end_value), event)
+            self._notify(event_id, event)
+
+    def remove(self, event_id):
+        """Drops an event that was deleted through this client."""
+        with self.lock:
+            self.version += 1
+            if self.events.pop(event_id, None):
+                self._notify(event_id, None)
+
+    def ensure_fresh(self):
+        """Syncs only when the staleness bound has been exceeded."""
+        with self.lock:
+            self.stats['reads'] += 1
+            if self.is_stale():
+                self.sync()
+            else:
+                self.stats['calls_avoided'] += 1
+
+    def all_events(self):
+        """Returns every mirrored event resource after making sure the mirror is fresh."""
+        self.ensure_fresh()
+        with self.lock:
+            return [event for _, _, event in self.events.values()]
+
+    def events_between(self, start, end):
+        """Returns mirrored events overlapping [start, end), ordered by start time."""
+        self.ensure_fresh()
+        with self.lock:
+            matches = [
+                (start_dt, event) for start_dt, end_dt, event in self.events.values()
+                if start_dt < end and end_dt > start
+            ]
+        matches.sort(key=lambda item: item[0])
+        return [event for _, event in matches]
@@ -0,0 +1,183 @@
+import base64
+import hashlib
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta
+from calendar_batch import execute_in_batches
+from google_services import service_available
+
+# Give up on an entry after this many rounds; it stays in the table marked 'failed'
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_MAX_BACKOFF = timedelta(hours=1)
+# Seconds the worker waits after an error, doubling on each further one up to its idle wait
+OUTBOX_ERROR_WAIT = 30
+
+# Prefix that keeps our deterministic ids apart from ids Google generates
+EVENT_ID_NAMESPACE = "fyp3-event"
+
+
+def idempotent_event_id(key):
+    """
+    Derives a Google Calendar event id from a key that names the same event everywhere (an ICS UID).
+
+    Calendar ids must use base32hex characters (a-v, 0-9), so the id is the
+    base32hex encoding of a hash of the key. Resending the same insert
+    then gets a 409 instead of creating a duplicate event. Don't use it
+    with database row ids: those are reused when the database is recreated
+    or another install shares the calendar.
+    """
+    digest = hashlib.sha1(f"{EVENT_ID_NAMESPACE}:{key}".encode()).digest()
+    return base64.b32hexencode(digest).decode().rstrip("=").lower()
+
+
+def new_event_id():
+    """A random Calendar event id (hex is valid base32hex), fixed before the first attempt so retries reuse it."""
+    return uuid.uuid4().hex
+
+
+def enqueue_calendar_insert(cursor, event_row_id, event_body):
+    """
+    Adds a Calendar insert for a local event to the outbox using the caller's cursor.
+
+    Call it inside the transaction that saved the event, so the event and
+    its outbox entry are committed (or rolled back) together.
+    """
+    # Random, and kept on the row, so retries reuse it and a 409 can only be our own earlier attempt
+    google_event_id = new_event_id()
+    now = datetime.now()
+    cursor.execute(
+        "INSERT INTO calendar_outbox (event_row_id, google_event_id, payload, next_attempt_at, created_at) "
+        "VALUES (%s, %s, %s, %s, %s)",
+        (event_row_id, google_event_id, json.dumps(dict(event_body, id=google_event_id)), now, now)
+    )
+    return google_event_id
+
+
+class CalendarOutboxWorker:
+    """
+    Background worker that pushes outbox entries to Google Calendar.
+
+    Due entries are sent in batch HTTP requests. Each insert carries the
+    random event id chosen when it was queued, so a 409 means an earlier
+    attempt already created the event and counts as success. Failed entries are retried
+    with exponential backoff, across restarts too, until they reach
+    OUTBOX_MAX_ATTEMPTS. The worker sleeps until it is notified of a new
+    entry or the next retry is due.
+    """
+
+    def __init__(self, storage, calendar_service, batch_size=50, idle_wait=300):
+        self.storage = storage
+        self.calendar_service = calendar_service
+        self.batch_size = batch_size
+        self.idle_wait = idle_wait
+
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.synced = 0
+        self.failed = 0
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="calendar-outbox", daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """Wakes the worker after an entry has been committed."""
+        self._wakeup.set()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _run(self):
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                self.storage.ensure_schema()
+                if not service_available(self.calendar_service):
+                    # Entries wait in the outbox until the calendar is authorised
+                    wait = self.idle_wait
+                else:
+                    processed = self.drain_once()
+                    wait = 0 if processed >= self.batch_size else self._seconds_until_next_due()
+                failures = 0
+            except Exception as e:
+                # Revoked credentials, connection and database errors all just delay the next attempt
+                print(f"Calendar outbox error: {e}")
+                wait = min(OUTBOX_ERROR_WAIT * 2 ** failures, self.idle_wait)
+                failures += 1
+            if wait:
+                self._wakeup.wait(timeout=wait)
+                self._wakeup.clear()
+
+    def _seconds_until_next_due(self):
+        with self.storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT next_attempt_at FROM calendar_outbox WHERE status = 'pending' "
+                               "ORDER BY next_attempt_at LIMIT 1")
+                row = cursor.fetchone()
+                next_due = row[0] if row else None
+            finally:
+                cursor.close()
+        if next_due is None:
+            return self.idle_wait
+        return min(max((next_due - datetime.now()).total_seconds(), 0.1), self.idle_wait)
+
+    def drain_once(self):
+        """Sends every due entry (up to one batch). Returns how many were processed."""
+        with self.storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    "SELECT id, payload, attempts FROM calendar_outbox "
+                    "WHERE status = 'pending' AND next_attempt_at <= %s ORDER BY id LIMIT %s",
+                    (datetime.now(), self.batch_size)
+                )
+                entries = cursor.fetchall()
+            finally:
+                cursor.close()
+        if not entries:
+            return 0
+
+        events = self.calendar_service.events()
+        results = execute_in_batches(self.calendar_service, [
+            lambda body=json.loads(payload): events.insert(calendarId='primary', body=body)
+            for _, payload, _ in entries
+        ], batch_size=self.batch_size, max_retries=1, ok_statuses=(409,))
+
+        now = datetime.now()
+        done, retry = [], []
+        for (entry_id, _, attempts), result in zip(entries, results):
+            if result['ok']:
+                done.append((now, entry_id))
+                continue
+            attempts += 1
+            status = 'failed' if attempts >= OUTBOX_MAX_ATTEMPTS else 'pending'
+            delay = min(timedelta(seconds=30 * 2 ** (attempts - 1)), OUTBOX_MAX_BACKOFF)
+            retry.append((status, attempts, now + delay, result['error'], entry_id))
+            if status == 'failed':
+                self.failed += 1
+                print(f"Giving up syncing outbox entry {entry_id} to Google Calendar: {result['error']}")
+
+        with self.storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if done:
+                    cursor.executemany(
+                        "UPDATE calendar_outbox SET status = 'done', next_attempt_at = %s WHERE id = %s", done)
+                if retry:
+                    cursor.executemany(
+                        "UPDATE calendar_outbox SET status = %s, attempts = %s, next_attempt_at = %s, "
+                        "last_error = %s WHERE id = %s", retry)
+                conn.commit()
+            finally:
+                cursor.close()
+        self.synced += len(done)
+        return len(entries)
@@ -0,0 +1,536 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+import pytz
+from googleapiclient.errors import HttpError
+from calendar_batch import execute_in_batches
+from calendar_mirror import parse_event_time
+from calendar_outbox import idempotent_event_id
+from event_store import EVENT_COLUMNS, EventStore, _to_utc, is_all_day
+from google_services import lazy_calendar_service, service_available
+
+DEFAULT_TIMEZONE = "Europe/London"
+
+# Only events overlapping this window around now are reconciled
+SYNC_WINDOW_PAST = timedelta(days=30)
+SYNC_WINDOW_FUTURE = timedelta(days=365)
+
+DEFAULT_SYNC_INTERVAL = 15 * 60
+
+# Local rows are re-read from a little before the last run, since MySQL
+# DATETIME columns round off the fraction of a second; re-reading a row is harmless
+WATERMARK_OVERLAP = timedelta(seconds=2)
+
+# Keys looked up per IN (...) query
+LOOKUP_CHUNK = 500
+
+SYNC_FIELDS = ("nextPageToken,nextSyncToken,"
+               "items(id,status,updated,summary,location,description,start,end,reminders)")
+
+# Local events created from Google events get this external_id prefix
+GOOGLE_PREFIX = "google:"
+
+
+def content_hash(title, start, end, location, details, reminder_minutes, all_day=False):
+    """Hash of the fields both sides share, so an event only counts as changed when they do."""
+    fields = [title or "", _to_utc(start).isoformat(), _to_utc(end).isoformat(),
+              location or "", details or "", reminder_minutes]
+    if all_day:
+        # Only added when set, so hashes stored for timed events stay valid
+        fields.append("all-day")
+    canonical = json.dumps(fields)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def local_hash(event):
+    return content_hash(event['title'], event['start'], event['end'], event['location'],
+                        event['details'], event['reminder_minutes'], is_all_day(event))
+
+
+def remote_fields(google_event):
+    """
+    Converts a Calendar event resource to the event store's fields.
+
+    An all-day event's dates become local midnights in its timezone, and
+    'all_day' is set so the event goes back to Google with dates again.
+    """
+    start = google_event.get('start', {})
+    end = google_event.get('end', {})
+    tz_name = start.get('timeZone') or DEFAULT_TIMEZONE
+    try:
+        tz = pytz.timezone(tz_name)
+    except pytz.UnknownTimeZoneError:
+        tz_name, tz = DEFAULT_TIMEZONE, pytz.timezone(DEFAULT_TIMEZONE)
+
+    reminder_minutes = None
+    reminders = google_event.get('reminders') or {}
+    if not reminders.get('useDefault', True):
+        for override in reminders.get('overrides') or []:
+            if override.get('method') == 'popup':
+                reminder_minutes = override.get('minutes')
+                break
+
+    return {
+        'title': google_event.get('summary') or "Untitled event",
+        'start': parse_event_time(start.get('dateTime', start.get('date')), tz).astimezone(tz),
+        'end': parse_event_time(end.get('dateTime', end.get('date')), tz).astimezone(tz),
+        'timezone': tz_name,
+        'location': google_event.get('location'),
+        'details': google_event.get('description'),
+        'reminder_minutes': reminder_minutes,
+        'all_day': 'dateTime' not in start,
+    }
+
+
+def remote_hash(google_event):
+    return local_hash(remote_fields(google_event))
+
+
+def google_event_id(event, outbox_ids=None, salt=""):
+    """
+    The Google event id a local event is (or will be) stored under.
+
+    Matches the ids the outbox (`outbox_ids`, by legacy row id) and the ICS
+    importer already use, so events they pushed are recognised instead of
+    being created a second time. Other events hash their row id with the
+    install's `salt`, since row ids repeat across databases.
+    """
+    external_id = event.get('external_id')
+    if external_id and external_id.startswith(GOOGLE_PREFIX):
+        return external_id[len(GOOGLE_PREFIX):]
+    if outbox_ids and event.get('legacy_id') in outbox_ids:
+        return outbox_ids[event['legacy_id']]
+    if external_id:
+        return idempotent_event_id(f"ics:{external_id}")
+    return idempotent_event_id(f"event:{salt}:{event['id']}")
+
+
+def calendar_body(event):
+    """Builds the Calendar event resource for a local event; all-day events are sent as dates."""
+    if is_all_day(event):
+        start = {'date': event['start'].date().isoformat()}
+        end = {'date': event['end'].date().isoformat()}
+    else:
+        start = {'dateTime': event['start'].isoformat(), 'timeZone': event['timezone']}
+        end = {'dateTime': event['end'].isoformat(), 'timeZone': event['timezone']}
+    body = {
+        'summary': event['title'],
+        'location': event['location'],
+        'description': event['details'],
+        'start': start,
+        'end': end,
+    }
+    if event['reminder_minutes'] is not None:
+        body['reminders'] = {'useDefault': False,
+                             'overrides': [{'method': 'popup', 'minutes': event['reminder_minutes']}]}
+    else:
+        body['reminders'] = {'useDefault': True}
+    return body
+
+
+def _chunks(items, size=LOOKUP_CHUNK):
+    items = list(items)
+    for offset in range(0, len(items), size):
+        yield items[offset:offset + size]
+
+
+class CalendarReconciler:
+    """
+    Keeps the local event tables and Google Calendar in step, in both directions.
+
+    Each side is read incrementally: Google through a persisted sync token,
+    so only events changed since the last run come back, and the events
+    table through its updated_at column. A content hash of every synced
+    event is kept for both sides in calendar_sync, so echoes of our own
+    writes and no-op edits are recognised without comparing fields. Only
+    keys that actually changed are diffed, and the resulting inserts,
+    patches and deletes are sent in batch requests (remote) or executemany
+    calls (local). When both sides changed the newer edit wins, except that
+    a deletion on either side always wins. Changes to events outside the
+    sync window are left alone.
+    """
+
+    def __init__(self, event_store=None, calendar_service=None, interval=None,
+                 window_past=SYNC_WINDOW_PAST, window_future=SYNC_WINDOW_FUTURE):
+        self.event_store = event_store or EventStore()
+        self.storage = self.event_store.storage
+        self.calendar_service = calendar_service
+        self.interval = interval or int(os.getenv('CALENDAR_SYNC_INTERVAL', DEFAULT_SYNC_INTERVAL))
+        self.window_past = window_past
+        self.window_future = window_future
+
+        self._stop = threading.Event()
+        self._thread = None
+        self.listeners = []  # callables notified with (event_id, event store dict or None)
+
+    def add_listener(self, listener):
+        """
+        Registers a callable notified as listener(event_id, event) after each pass.
+
+        It hears about every local event the pass saw edited or changed
+        itself, with the event store dict, or None for a deleted event.
+        """
+        self.listeners.append(listener)
+
+    def _notify(self, changes):
+        for event_id, event in changes.items():
+            for listener in self.listeners:
+                try:
+                    listener(event_id, event)
+                except Exception as e:
+                    print(f"Calendar sync listener failed: {e}")
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="calendar-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            if service_available(self.calendar_service):
+                try:
+                    self.run_once()
+                except Exception as e:
+                    # Keep syncing on later passes whatever went wrong with this one
+                    print(f"Calendar reconciliation failed: {e}")
+            self._stop.wait(self.interval)
+
+    def _get_state(self, cursor, name):
+        cursor.execute("SELECT value FROM sync_state WHERE name = %s", (name,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, cursor, name, value):
+        cursor.execute("DELETE FROM sync_state WHERE name = %s", (name,))
+        cursor.execute("INSERT INTO sync_state (name, value) VALUES (%s, %s)", (name, value))
+
+    def _install_salt(self, cursor):
+        """A random value kept in sync_state that makes this install's event ids its own."""
+        salt = self._get_state(cursor, "event_id_salt")
+        if salt is None:
+            salt = uuid.uuid4().hex
+            self._set_state(cursor, "event_id_salt", salt)
+        return salt
+
+    def _remote_changes(self, sync_token):
+        """Returns ({event id: event}, next sync token) for events changed since the token."""
+        changes = {}
+        page_token = None
+        while True:
+            params = {'calendarId': 'primary', 'singleEvents': True, 'maxResults': 250, 'fields': SYNC_FIELDS}
+            if sync_token:
+                params['syncToken'] = sync_token
+            if page_token:
+                params['pageToken'] = page_token
+            try:
+                result = self.calendar_service.events().list(**params).execute()
+            except HttpError as error:
+                if error.resp.status != 410 or not sync_token:
+                    raise
+                # The token expired; start over with a full listing, hashes keep it cheap locally
+                print("Calendar sync token expired, reconciling the whole calendar")
+                return self._remote_changes(None)
+            for event in result.get('items', []):
+                changes[event['id']] = event
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                return changes, result.get('nextSyncToken')
+
+    def _local_changes(self, cursor, since, window_start, window_end):
+        sql = (f"SELECT {EVENT_COLUMNS}, updated_at FROM events "
+               "WHERE owner = %s AND end_at > %s AND start_at < %s")
+        params = [self.event_store.owner, _to_utc(window_start), _to_utc(window_end)]
+        if since:
+            sql += " AND updated_at > %s"
+            params.append(since - WATERMARK_OVERLAP)
+        cursor.execute(sql, tuple(params))
+        changes = {}
+        for row in cursor.fetchall():
+            event = EventStore._row_to_event(row[:-1])
+            event['updated_at'] = row[-1]
+            changes[event['id']] = event
+        return changes
+
+    def _load_outbox_ids(self, cursor, legacy_ids):
+        """Returns {legacy row id: google event id} for events the outbox queued."""
+        outbox_ids = {}
+        for chunk in _chunks(legacy_ids):
+            cursor.execute("SELECT event_row_id, google_event_id FROM calendar_outbox "
+                           f"WHERE event_row_id IN ({', '.join(['%s'] * len(chunk))})", tuple(chunk))
+            outbox_ids.update(cursor.fetchall())
+        return outbox_ids
+
+    def _load_mappings(self, cursor, event_ids, google_ids):
+        """Returns {event_id: (google_id, local_hash, remote_hash)} for the given keys on either side."""
+        mappings = {}
+        for column, keys in (("event_id", event_ids), ("google_event_id", google_ids)):
+            for chunk in _chunks(keys):
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cursor.execute("SELECT event_id, google_event_id, local_hash, remote_hash FROM calendar_sync "
+                               f"WHERE {column} IN ({placeholders})", tuple(chunk))
+                for event_id, google_id, local, remote in cursor.fetchall():
+                    mappings[event_id] = (google_id, local, remote)
+        return mappings
+
+    @staticmethod
+    def _remote_is_newer(google_event, event):
+        remote_updated = parse_event_time(google_event['updated']) if google_event.get('updated') else None
+        return bool(remote_updated) and _to_utc(remote_updated) > event['updated_at']
+
+    def run_once(self, now=None):
+        """Runs one reconciliation pass. Returns counts of what changed on each side."""
+        now = now or datetime.now(timezone.utc)
+        run_started = _to_utc(now)
+        window_start, window_end = now - self.window_past, now + self.window_future
+        stats = dict.fromkeys(("remote_changes", "local_changes", "remote_inserts", "remote_patches",
+                               "remote_deletes", "local_inserts", "local_updates", "local_deletes",
+                               "conflicts", "failures"), 0)
+
+        self.storage.ensure_schema()
+        with self.storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                salt = self._install_salt(cursor)
+                sync_token = self._get_state(cursor, "calendar_sync_token")
+                watermark = self._get_state(cursor, "events_watermark")
+                local = self._local_changes(cursor, watermark and datetime.fromisoformat(watermark),
+                                            window_start, window_end)
+                cursor.execute("SELECT s.event_id, s.google_event_id FROM calendar_sync s "
+                               "LEFT JOIN events e ON e.id = s.event_id WHERE e.id IS NULL")
+                deleted_locally = cursor.fetchall()
+                conn.commit()
+            finally:
+                cursor.close()
+
+        remote, next_token = self._remote_changes(sync_token)
+        stats['remote_changes'] = len(remote)
+        stats['local_changes'] = len(local) + len(deleted_locally)
+
+        with self.storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                mappings = self._load_mappings(cursor, local, remote)
+                outbox_ids = self._load_outbox_ids(cursor, [event['legacy_id'] for event_id, event in local.items()
+                                                            if event_id not in mappings and
+                                                            event['legacy_id'] is not None])
+            finally:
+                cursor.close()
+        by_google = {google_id: event_id for event_id, (google_id, _, _) in mappings.items()}
+
+        remote_inserts, remote_patches, remote_deletes = [], [], []
+        local_updates, local_inserts, local_deletes = [], [], []
+        links = {}  # event_id -> (google_id, local_hash, remote_hash) to store
+        unlinks = set()
+        handled = set()
+
+        for event_id, event in local.items():
+            digest = local_hash(event)
+            mapping = mappings.get(event_id)
+            if mapping is None:
+                google_id = google_event_id(event, outbox_ids, salt)
+                handled.add(google_id)
+                existing = remote.get(google_id)
+                if existing and existing.get('status') == 'cancelled':
+                    # Pushed earlier, then deleted in Google before it was ever reconciled
+                    local_deletes.append(event_id)
+                elif existing and remote_hash(existing) == digest:
+                    # Already pushed (by the outbox or an ICS import); just start tracking it
+                    links[event_id] = (google_id, digest, remote_hash(existing))
+                elif existing:
+                    # Pushed, then edited on one side before it was ever reconciled; the newer edit wins
+                    stats['conflicts'] += 1
+                    if self._remote_is_newer(existing, event):
+                        fields = remote_fields(existing)
+                        local_updates.append((event_id, fields))
+                        links[event_id] = (google_id, local_hash(fields), remote_hash(existing))
+                    else:
+                        remote_patches.append((event_id, google_id, digest, calendar_body(event)))
+                else:
+                    remote_inserts.append((event_id, google_id, digest, dict(calendar_body(event), id=google_id)))
+                continue
+
+            google_id, last_local, last_remote = mapping
+            if digest == last_local:
+                # Unchanged here; any change on Google's side is picked up below
+                continue
+            handled.add(google_id)
+            changed = remote.get(google_id)
+            if changed and changed.get('status') == 'cancelled':
+                stats['conflicts'] += 1
+                local_deletes.append(event_id)
+                unlinks.add(event_id)
+                continue
+            if changed and remote_hash(changed) != last_remote:
+                stats['conflicts'] += 1
+                if self._remote_is_newer(changed, event):
+                    fields = remote_fields(changed)
+                    local_updates.append((event_id, fields))
+                    links[event_id] = (google_id, local_hash(fields), remote_hash(changed))
+                    continue
+            remote_patches.append((event_id, google_id, digest, calendar_body(event)))
+
+        for google_id, event in remote.items():
+            if google_id in handled:
+                continue
+            event_id = by_google.get(google_id)
+            if event.get('status') == 'cancelled':
+                if event_id is not None:
+                    local_deletes.append(event_id)
+                    unlinks.add(event_id)
+                continue
+            digest = remote_hash(event)
+            if event_id is not None:
+                if digest != mappings[event_id][2]:
+                    fields = remote_fields(event)
+                    local_updates.append((event_id, fields))
+                    links[event_id] = (google_id, local_hash(fields), digest)
+                continue
+            fields = remote_fields(event)
+            if fields['end'] > window_start and fields['start'] < window_end:
+                local_inserts.append((google_id, digest, dict(fields, external_id=GOOGLE_PREFIX + google_id)))
+
+        for event_id, google_id in deleted_locally:
+            remote_deletes.append((event_id, google_id))
+
+        retry = self._push(remote_inserts, remote_patches, remote_deletes, links, unlinks, stats)
+
+        with self.storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                applied = self._apply_local(cursor, local_updates, local_inserts, local_deletes, links, stats)
+                if retry:
+                    # Bump failed rows so the next pass picks them up again
+                    cursor.executemany("UPDATE events SET updated_at = %s WHERE id = %s",
+                                       [(datetime.utcnow(), event_id) for event_id in retry])
+                for chunk in _chunks(unlinks):
+                    cursor.execute(f"DELETE FROM calendar_sync WHERE event_id IN ({', '.join(['%s'] * len(chunk))})",
+                                   tuple(chunk))
+                if links:
+                    rows = [(event_id, google_id, local, remote_digest, run_started)
+                            for event_id, (google_id, local, remote_digest) in links.items()]
+                    cursor.executemany("DELETE FROM calendar_sync WHERE event_id = %s OR google_event_id = %s",
+                                       [(row[0], row[1]) for row in rows])
+                    cursor.executemany("INSERT INTO calendar_sync (event_id, google_event_id, local_hash, "
+                                       "remote_hash, synced_at) VALUES (%s, %s, %s, %s, %s)", rows)
+                if next_token:
+                    self._set_state(cursor, "calendar_sync_token", next_token)
+                self._set_state(cursor, "events_watermark", run_started.isoformat())
+                conn.commit()
+            finally:
+                cursor.close()
+
+        changes = dict(local)
+        changes.update((event_id, None) for event_id, _ in deleted_locally)
+        changes.update(applied)
+        self._notify(changes)
+
+        if any(stats[key] for key in stats if key not in ("remote_changes", "local_changes")):
+            print("Calendar reconciled: " + ", ".join(f"{key.replace('_', ' ')} {value}"
+                                                      for key, value in stats.items() if value))
+        return stats
+
+    def _push(self, inserts, patches, deletes, links, unlinks, stats):
+        """Sends remote writes in batches. Returns local event ids whose writes failed."""
+        events = self.calendar_service.events()
+        retry = []
+
+        if inserts:
+            results = execute_in_batches(self.calendar_service, [
+                lambda body=body: events.insert(calendarId='primary', body=body)
+                for _, _, _, body in inserts
+            ], ok_statuses=(409,))
+            for (event_id, google_id, digest, body), result in zip(inserts, results):
+                if not result['ok']:
+                    retry.append(event_id)
+                elif result['result'] is None:
+                    # 409: it exists already, so make sure it has this content
+                    patches.append((event_id, google_id, digest, {k: v for k, v in body.items() if k != 'id'}))
+                else:
+                    links[event_id] = (google_id, digest, remote_hash(result['result']))
+                    stats['remote_inserts'] += 1
+
+        if patches:
+            results = execute_in_batches(self.calendar_service, [
+                lambda google_id=google_id, body=body: events.patch(
+                    calendarId='primary', eventId=google_id, body=body)
+                for _, google_id, _, body in patches
+            ])
+            for (event_id, google_id, digest, _), result in zip(patches, results):
+                if result['ok']:
+                    links[event_id] = (google_id, digest, remote_hash(result['result']))
+                    stats['remote_patches'] += 1
+                else:
+                    retry.append(event_id)
+
+        if deletes:
+            results = execute_in_batches(self.calendar_service, [
+                lambda google_id=google_id: events.delete(calendarId='primary', eventId=google_id)
+                for _, google_id in deletes
+            ], ok_statuses=(404, 410))
+            for (event_id, _), result in zip(deletes, results):
+                # Failed deletes stay mapped, so the next pass tries again
+                if result['ok']:
+                    unlinks.add(event_id)
+                    stats['remote_deletes'] += 1
+
+        stats['failures'] += len(retry)
+        return retry
+
+    def _apply_local(self, cursor, updates, inserts, deletes, links, stats):
+        """Writes Google's changes to the events tables. Returns {event_id: new fields, or None if deleted}."""
+        now = datetime.utcnow()
+        applied = dict(updates)
+        if updates:
+            cursor.executemany(
+                "UPDATE events SET title = %s, start_at = %s, end_at = %s, timezone = %s, location = %s, "
+                "details = %s, reminder_minutes = %s, updated_at = %s WHERE id = %s",
+                [(f['title'], _to_utc(f['start']), _to_utc(f['end']), f['timezone'], f['location'],
+                  f['details'], f['reminder_minutes'], now, event_id) for event_id, f in updates])
+            # Keep the legacy table readable for code that still uses it
+            cursor.executemany(
+                "UPDATE my_table SET event_name = %s, event_date = %s, event_time = %s, location = %s, "
+                "details = %s, reminder = %s WHERE id = (SELECT legacy_id FROM events WHERE id = %s)",
+                [(f['title'], f"{f['start']:%Y-%m-%d}", f"{f['start']:%H:%M:%S}", f['location'], f['details'],
+                  f"{f['reminder_minutes']} minutes before" if f['reminder_minutes'] else "No reminder", event_id)
+                 for event_id, f in updates])
+            stats['local_updates'] += len(updates)
+
+        if inserts:
+            self.event_store.add_many([fields for _, _, fields in inserts], cursor)
+            by_external = {fields['external_id']: (google_id, digest, local_hash(fields))
+                           for google_id, digest, fields in inserts}
+            fields_by_external = {fields['external_id']: fields for _, _, fields in inserts}
+            for chunk in _chunks(by_external):
+                cursor.execute(f"SELECT id, external_id FROM events WHERE external_id IN "
+                               f"({', '.join(['%s'] * len(chunk))})", tuple(chunk))
+                for event_id, external_id in cursor.fetchall():
+                    google_id, remote_digest, local_digest = by_external[external_id]
+                    links[event_id] = (google_id, local_digest, remote_digest)
+                    applied[event_id] = fields_by_external[external_id]
+            stats['local_inserts'] += len(inserts)
+
+        if deletes:
+            cursor.executemany("DELETE FROM my_table WHERE id = (SELECT legacy_id FROM events WHERE id = %s)",
+                               [(event_id,) for event_id in deletes])
+            cursor.executemany("DELETE FROM events WHERE id = %s", [(event_id,) for event_id in deletes])
+            stats['local_deletes'] += len(deletes)
+            applied.update((event_id, None) for event_id in deletes)
+        return applied
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["run"]:
+        print("Usage: python calendar_sync.py run")
+        sys.exit(1)
+    print(CalendarReconciler(calendar_service=lazy_calendar_service()).run_once())
@@ -0,0 +1,303 @@
+import re
+import sys
+import threading
+from datetime import datetime, timedelta
+from event_search import normalize_tokens
+from storage import get_storage
+
+PARTITION_PREFIX = "conversations_"
+PARTITION_PATTERN = re.compile(r"^conversations_(\d{4})(\d{2})$")
+
+# Full-text indexes live in the partition tables: FULLTEXT isn't allowed on a
+# natively partitioned InnoDB table, so MySQL gets one table per month as well
+MYSQL_PARTITION = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    user_input TEXT,
+    assistant_response TEXT,
+    timestamp DATETIME NOT NULL,
+    INDEX idx_{table}_timestamp (timestamp),
+    FULLTEXT INDEX ft_{table} (user_input, assistant_response)
+) ENGINE=InnoDB
+"""
+
+SQLITE_PARTITION = """
+CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+    user_input, assistant_response, timestamp UNINDEXED, tokenize='porter unicode61'
+)
+"""
+
+INSERT_TURN = "INSERT INTO {table} (user_input, assistant_response, timestamp) VALUES (%s, %s, %s)"
+
+HISTORY_PATTERNS = [
+    r"\b(what|when) did i (ask|say|tell you|mention)\b",
+    r"\bdid i (ask|mention|say)\b",
+    r"\bwhat did you (say|tell me)\b",
+    r"\b(conversation|chat) history\b",
+]
+
+# Words in a history question that say when or how, not what about
+HISTORY_FILLER = re.compile(
+    r"\b(what|when|did|i|ask|asked|say|said|tell|told|you|me|mention|mentioned|about|search|my|"
+    r"conversation|chat|history|yesterday|today|earlier|last|this|week|month)\b"
+)
+
+
+def partition_name(moment):
+    return f"{PARTITION_PREFIX}{moment.year:04d}{moment.month:02d}"
+
+
+def partition_month(table):
+    """Returns the first day of the month a partition table covers, or None if it isn't one."""
+    match = PARTITION_PATTERN.match(table)
+    if not match:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1)
+
+
+def _next_month(first_day):
+    return (first_day + timedelta(days=32)).replace(day=1)
+
+
+def is_history_query(text):
+    """True if the user is asking about something said in an earlier conversation."""
+    text = text.lower()
+    return any(re.search(pattern, text) for pattern in HISTORY_PATTERNS)
+
+
+def resolve_past_range(text, now=None):
+    """
+    Finds a spoken time range in a history question, like "yesterday" or "last week".
+
+    Returns (start, end, label) as naive local datetimes, or None when the
+    question doesn't mention one.
+    """
+    now = now or datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    text = text.lower()
+    if "yesterday" in text:
+        return today - timedelta(days=1), today, "yesterday"
+    if "today" in text or "earlier" in text:
+        return today, now + timedelta(seconds=1), "today"
+    if "last week" in text:
+        monday = today - timedelta(days=today.weekday())
+        return monday - timedelta(days=7), monday, "last week"
+    if "this week" in text:
+        return today - timedelta(days=today.weekday()), now + timedelta(seconds=1), "this week"
+    if "last month" in text:
+        first = today.replace(day=1)
+        return (first - timedelta(days=1)).replace(day=1), first, "last month"
+    if "this month" in text:
+        return today.replace(day=1), now + timedelta(seconds=1), "this month"
+    return None
+
+
+class ConversationArchive:
+    """
+    Conversation history split into one full-text indexed table per month.
+
+    Turns are appended to the partition for their month, created on first
+    use. Searches only touch the partitions overlapping the requested time
+    range, so they stay fast however long the history grows. SQLite uses
+    FTS5 tables ranked by bm25; MySQL uses InnoDB FULLTEXT indexes.
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage or get_storage()
+        self._partitions = None
+        self._lock = threading.Lock()
+
+    def partitions(self):
+        """Returns the existing partition table names, oldest first."""
+        with self._lock:
+            if self._partitions is None:
+                self._partitions = set(self._discover())
+            return sorted(self._partitions)
+
+    def _discover(self):
+        with self.storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if self.storage.name == "sqlite":
+                    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE %s",
+                                   (PARTITION_PREFIX + "%",))
+                else:
+                    cursor.execute("SELECT table_name FROM information_schema.tables "
+                                   "WHERE table_schema = DATABASE() AND table_name LIKE %s",
+                                   (PARTITION_PREFIX + "%",))
+                names = [row[0] for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+        # FTS5 keeps its data in shadow tables such as conversations_202601_data
+        return [name for name in names if PARTITION_PATTERN.match(name)]
+
+    def _ensure_partition(self, cursor, table):
+        if table in self.partitions():
+            return
+        template = SQLITE_PARTITION if self.storage.name == "sqlite" else MYSQL_PARTITION
+        cursor.execute(template.format(table=table))
+        with self._lock:
+            self._partitions.add(table)
+
+    def _forget_partition(self, table):
+        with self._lock:
+            if self._partitions is not None:
+                self._partitions.discard(table)
+
+    def insert_many(self, records):
+        """Appends (user_input, assistant_response, timestamp) turns to their monthly partitions."""
+        by_table = {}
+        for record in records:
+            by_table.setdefault(partition_name(record[2]), []).append(record)
+
+        with self.storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                for table, rows in by_table.items():
+                    self._ensure_partition(cursor, table)
+                    cursor.executemany(INSERT_TURN.format(table=table), rows)
+                conn.commit()
+            finally:
+                cursor.close()
+
+    def _partitions_between(self, start, end):
+        """Partitions overlapping [start, end), newest first."""
+        selected = []
+        for table in self.partitions():
+            first = partition_month(table)
+            if (end is None or first < end) and (start is None or _next_month(first) > start):
+                selected.append(table)
+        return selected[::-1]
+
+    def _match_query(self, tokens):
+        if self.storage.name == "sqlite":
+            # Every word must appear; the trailing * also matches longer forms
+            return " AND ".join(f'"{token}"*' for token in tokens)
+        return " ".join(f"+{token}*" for token in tokens)
+
+    def _search_partition(self, cursor, table, match, start, end, order, limit):
+        if self.storage.name == "sqlite":
+            sql = (f"SELECT user_input, assistant_response, timestamp, -bm25({table}) AS score "
+                   f"FROM {table} WHERE {table} MATCH %s")
+        else:
+            sql = (f"SELECT user_input, assistant_response, timestamp, "
+                   f"MATCH (user_input, assistant_response) AGAINST (%s IN BOOLEAN MODE) AS score "
+                   f"FROM {table} WHERE MATCH (user_input, assistant_response) AGAINST (%s IN BOOLEAN MODE)")
+        params = [match] if self.storage.name == "sqlite" else [match, match]
+        if start:
+            sql += " AND timestamp >= %s"
+            params.append(start)
+        if end:
+            sql += " AND timestamp < %s"
+            params.append(end)
+        sql += " ORDER BY timestamp DESC" if order == "recent" else " ORDER BY score DESC"
+        sql += " LIMIT %s"
+        params.append(limit)
+
+        cursor.execute(sql, tuple(params))
+        results = []
+        for user_input, assistant_response, timestamp, score in cursor.fetchall():
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp)
+            results.append({
+                'timestamp': timestamp,
+                'user_input': user_input,
+                'assistant_response': assistant_response,
+                'score': float(score),
+            })
+        return results
+
+    def search(self, query_text, start=None, end=None, limit=10, order="recent"):
+        """
+        Full-text search over turns in [start, end), either bound optional.
+
+        `order` is "recent" (newest first, stopping once `limit` turns are
+        found) or "relevance" (best matches across every partition in range).
+        Returns dicts with timestamp, user_input, assistant_response and score.
+        """
+        tokens = normalize_tokens(query_text)
+        if not tokens:
+            return []
+        match = self._match_query(tokens)
+
+        results = []
+        with self.storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                for table in self._partitions_between(start, end):
+                    remaining = limit - len(results) if order == "recent" else limit
+                    results.extend(self._search_partition(cursor, table, match, start, end, order, remaining))
+                    if order == "recent" and len(results) >= limit:
+                        break
+            finally:
+                cursor.close()
+
+        if order == "relevance":
+            results.sort(key=lambda turn: turn['score'], reverse=True)
+        return results[:limit]
+
+    def answer_question(self, question, now=None, max_turns=2):
+        """Answers a spoken history question like "what did I ask about the weather yesterday"."""
+        past_range = resolve_past_range(question, now)
+        start, end, label = past_range if past_range else (None, None, "")
+        topic = HISTORY_FILLER.sub(" ", question.lower())
+        if not normalize_tokens(topic):
+            return "What topic should I look for in our conversations?"
+        turns = self.search(topic, start=start, end=end, limit=max_turns)
+
+        when = f" {label}" if label else ""
+        if not turns:
+            return f"I couldn't find anything we discussed about that{when}."
+
+        today = (now or datetime.now()).date()
+        sentences = []
+        for turn in turns:
+            day = turn['timestamp'].date()
+            if day == today:
+                day_name = "Today"
+            elif day == today - timedelta(days=1):
+                day_name = "Yesterday"
+            else:
+                day_name = f"On {turn['timestamp'].strftime('%A %d %B').replace(' 0', ' ')}"
+            spoken_time = turn['timestamp'].strftime("%I:%M %p").lstrip('0')
+            sentences.append(f"{day_name} at {spoken_time} you asked: \"{turn['user_input']}\", "
+                             f"and I said: \"{turn['assistant_response']}\"")
+        return " ".join(sentences)
+
+    def import_legacy(self, batch_size=1000):
+        """
+        Copies turns from the old single conversations table into the partitions.
+
+        A one-off migration: running it twice copies the turns twice. Returns the count.
+        """
+        self.storage.ensure_schema()
+        copied = 0
+        last_id = 0
+        while True:
+            with self.storage.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(
+                        "SELECT id, user_input, assistant_response, timestamp FROM conversations "
+                        "WHERE id > %s ORDER BY id LIMIT %s", (last_id, batch_size))
+                    rows = cursor.fetchall()
+                finally:
+                    cursor.close()
+            if not rows:
+                return copied
+            last_id = rows[-1][0]
+            self.insert_many([(user_input, response, timestamp or datetime.now())
+                              for _, user_input, response, timestamp in rows])
+            copied += len(rows)
+
+
+if __name__ == "__main__":
+    archive = ConversationArchive()
+    if sys.argv[1:2] == ["import"]:
+        print(f"Imported {archive.import_legacy()} turns")
+    elif sys.argv[1:2] == ["search"] and len(sys.argv) > 2:
+        for turn in archive.search(" ".join(sys.argv[2:])):
+            print(f"{turn['timestamp']:%Y-%m-%d %H:%M}  {turn['user_input']}  ->  {turn['assistant_response']}")
+    else:
+        print("Usage: python conversation_archive.py import | search <words>")
+        sys.exit(1)
@@ -0,0 +1,179 @@
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+
+class ConversationLogWriter:
+    """
+    Background writer that logs conversation turns to the archive in batches.
+
+    `log()` only puts the turn on a bounded in-memory queue, so it adds
+    almost no latency to a turn. A worker thread writes the queued turns,
+    one `executemany` per monthly partition, as soon as `batch_size` turns
+    are waiting or `flush_interval` seconds have passed. If a write fails,
+    the batch is appended to a local JSONL spool file and replayed once a
+    later flush succeeds. A replay file left behind by a crash is merged back into the
+    spool, and file errors are logged without stopping the writer.
+    """
+
+    def __init__(self, archive, batch_size=50, flush_interval=2.0, max_queue=1000,
+                 spool_path="conversation_spool.jsonl"):
+        self.archive = archive
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._spool_lock = threading.Lock()
+        self.written = 0
+        self.spooled = 0
+        self.lost = 0
+        self.batches = 0
+
+        self._thread = threading.Thread(target=self._run, name="conversation-log", daemon=True)
+        self._thread.start()
+
+    def log(self, user_input, assistant_response, timestamp=None):
+        """Queues one complete turn for writing. Never blocks."""
+        record = (user_input, assistant_response, timestamp or datetime.now())
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            # The writer has fallen far behind; keep the turn on disk instead
+            self._spool([record])
+
+    def _run(self):
+        try:
+            with self._spool_lock:
+                self._merge_replay()
+        except OSError as e:
+            print(f"Could not recover conversation log replay file: {e}")
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+        # Drain whatever is left on shutdown
+        batch = self._drain()
+        if batch:
+            self._flush(batch)
+
+    def _collect(self):
+        """Waits for the first turn, then gathers more until the batch is full or the interval ends."""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _write(self, records):
+        self.archive.insert_many(records)
+
+    def _flush(self, batch):
+        try:
+            self._write(batch)
+        except Exception as e:
+            # Any failure, not just a database one, must leave the writer running
+            print(f"Could not write conversation log, spooling {len(batch)} turns: {e}")
+            self._spool(batch)
+            return
+        self.written += len(batch)
+        self.batches += 1
+        try:
+            self._replay_spool()
+        except Exception as e:
+            print(f"Could not replay spooled conversation log: {e}")
+
+    def _spool(self, records):
+        """Appends turns to the spool file. Returns False (and counts them as lost) if it can't be written."""
+        with self._spool_lock:
+            try:
+                with open(self.spool_path, "a", encoding="utf-8") as spool:
+                    for user_input, assistant_response, timestamp in records:
+                        spool.write(json.dumps({
+                            'user_input': user_input,
+                            'assistant_response': assistant_response,
+                            'timestamp': timestamp.isoformat(),
+                        }) + "\n")
+            except OSError as e:
+                print(f"Could not spool {len(records)} conversation turns, dropping them: {e}")
+                self.lost += len(records)
+                return False
+            self.spooled += len(records)
+            return True
+
+    def _merge_replay(self):
+        """Appends a replay file left by an interrupted replay back onto the spool. Call with the spool lock."""
+        replay_path = self.spool_path + ".replay"
+        if not os.path.exists(replay_path):
+            return
+        with open(replay_path, encoding="utf-8") as replay, open(self.spool_path, "a", encoding="utf-8") as spool:
+            for line in replay:
+                if line.endswith("\n"):
+                    spool.write(line)
+        os.remove(replay_path)
+
+    def _replay_spool(self):
+        """Writes spooled turns back to the database now that it is reachable again."""
+        with self._spool_lock:
+            self._merge_replay()
+            if not os.path.exists(self.spool_path):
+                return
+            replay_path = self.spool_path + ".replay"
+            os.replace(self.spool_path, replay_path)
+
+        records = []
+        with open(replay_path, encoding="utf-8") as spool:
+            for line in spool:
+                try:
+                    item = json.loads(line)
+                    records.append((item['user_input'], item['assistant_response'],
+                                    datetime.fromisoformat(item['timestamp'])))
+                except (ValueError, KeyError):
+                    continue  # A partially written line from a crash
+
+        try:
+            for i in range(0, len(records), self.batch_size):
+                self._write(records[i:i + self.batch_size])
+                self.written += len(records[i:i + self.batch_size])
+        except Exception as e:
+            print(f"Replaying spooled conversation log failed: {e}")
+            if not self._spool(records[i:]):
+                # Keep just the unwritten turns in the replay file; it is merged back on the next replay or start
+                self.lost -= len(records[i:])
+                try:
+                    with open(replay_path, "w", encoding="utf-8") as replay:
+                        for user_input, assistant_response, timestamp in records[i:]:
+                            replay.write(json.dumps({'user_input': user_input,
+                                                     'assistant_response': assistant_response,
+                                                     'timestamp': timestamp.isoformat()}) + "\n")
+                except OSError:
+                    pass
+                return
+            self.spooled -= len(records[i:])
+        os.remove(replay_path)
+
+    def close(self, timeout=5):
+        """Stops the writer after flushing everything still queued."""
+        self._stop.set()
+        self._thread.join(timeout=timeout)
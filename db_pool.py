@@ -0,0 +1,209 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+import mysql.connector
+from dotenv import load_dotenv
+
+# Connections idle for longer than this are pinged before being handed out
+HEALTH_CHECK_IDLE_SECONDS = 30
+
+
+def db_config_from_env():
+    """Returns the MySQL connection settings from the environment."""
+    load_dotenv()
+    return {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'user': os.getenv('DB_USER', 'root'),
+        'password': os.getenv('DB_PASSWORD', ''),
+        'database': os.getenv('DB_NAME', 'events_db')
+    }
+
+
+class PoolExhaustedError(mysql.connector.Error):
+    """Raised when no connection becomes free before the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of MySQL connections shared across the assistant.
+
+    Connections are opened on demand up to `size` and returned to a LIFO
+    queue after use, so the warmest connection is reused first. A connection
+    that has sat idle is pinged (and reconnected if the server went away)
+    before it is handed out, which lets the assistant survive MySQL restarts.
+    Checkout wait times and utilisation are tracked in `stats()`.
+    """
+
+    def __init__(self, db_config=None, size=None, timeout=10.0):
+        self.db_config = db_config or db_config_from_env()
+        self.size = size or int(os.getenv('DB_POOL_SIZE', '5'))
+        self.timeout = timeout
+
+        self._idle = queue.LifoQueue()  # (connection, returned_at)
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._in_use = 0
+        self._busy_since = None
+        self._busy_time = 0.0
+        self._created_at = time.monotonic()
+
+        self.checkouts = 0
+        self.reconnects = 0
+        self.failed_checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.peak_in_use = 0
+
+    def _connect(self):
+        return mysql.connector.connect(**self.db_config)
+
+    def _healthy(self, conn, returned_at):
+        """Reconnects a connection that has gone stale while idle. False if the server is unreachable."""
+        if time.monotonic() - returned_at < HEALTH_CHECK_IDLE_SECONDS and conn.is_connected():
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            pass
+        try:
+            conn.reconnect(attempts=2, delay=0.2)
+        except mysql.connector.Error:
+            return False
+        with self._lock:
+            self.reconnects += 1
+        return True
+
+    def acquire(self):
+        """Checks out a healthy connection, waiting up to the pool timeout for one to free up."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        conn = None
+        while conn is None:
+            try:
+                conn, returned_at = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._opened < self.size
+                    if can_open:
+                        self._opened += 1
+                if can_open:
+                    try:
+                        conn = self._connect()
+                    except mysql.connector.Error:
+                        with self._lock:
+                            self._opened -= 1
+                        self.failed_checkouts += 1
+                        raise
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.failed_checkouts += 1
+                    raise PoolExhaustedError(msg=f"No database connection free after {self.timeout}s")
+                try:
+                    conn, returned_at = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+
+            if not self._healthy(conn, returned_at):
+                self._discard(conn)
+                conn = None
+                # The server is down; fail fast instead of trying every idle connection
+                self.failed_checkouts += 1
+                raise mysql.connector.errors.InterfaceError(msg="Database server is unreachable")
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            if self._in_use == 0:
+                self._busy_since = time.monotonic()
+            self._in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self._in_use)
+        return conn
+
+    def release(self, conn):
+        """Returns a connection to the pool, rolling back anything left uncommitted."""
+        with self._lock:
+            self._in_use -= 1
+            if self._in_use == 0 and self._busy_since is not None:
+                self._busy_time += time.monotonic() - self._busy_since
+                self._busy_since = None
+        try:
+            if conn.is_connected():
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put((conn, time.monotonic()))
+                return
+        except mysql.connector.Error:
+            pass
+        self._discard(conn)
+
+    def _discard(self, conn):
+        with self._lock:
+            self._opened -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and always returns it."""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except mysql.connector.Error:
+                pass
+            raise
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """Returns pool metrics: checkouts, wait times and how busy the pool has been."""
+        with self._lock:
+            busy_time = self._busy_time
+            if self._busy_since is not None:
+                busy_time += time.monotonic() - self._busy_since
+            uptime = time.monotonic() - self._created_at
+            return {
+                'size': self.size,
+                'open': self._opened,
+                'in_use': self._in_use,
+                'peak_in_use': self.peak_in_use,
+                'utilisation': self._in_use / self.size,
+                'busy_fraction': busy_time / uptime if uptime else 0.0,
+                'checkouts': self.checkouts,
+                'failed_checkouts': self.failed_checkouts,
+                'reconnects': self.reconnects,
+                'avg_wait_ms': 1000 * self.total_wait / self.checkouts if self.checkouts else 0.0,
+                'max_wait_ms': 1000 * self.max_wait,
+            }
+
+    def close(self):
+        """Closes every idle connection."""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_db_pool():
+    """Returns the process-wide connection pool, creating it on first use."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ConnectionPool()
+        return _default_pool
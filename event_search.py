@@ -0,0 +1,275 @@
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+import numpy as np
+from calendar_mirror import parse_event_time
+
+# Words that carry no meaning in spoken event references ("the dentist thing")
+STOPWORDS = {
+    "a", "an", "and", "at", "for", "i", "in", "is", "me", "my", "of", "on", "the",
+    "thing", "to", "with", "stuff", "event", "appointment",
+}
+
+# How much a match in each field counts towards the score
+FIELD_WEIGHTS = {"summary": 3.0, "location": 2.0, "description": 1.0}
+
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.8
+FUZZY_MATCH = 0.6
+MAX_PREFIX_EXPANSIONS = 50
+
+
+def normalize_tokens(text):
+    """Splits text into lowercase, accent-free, singular tokens without stopwords."""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", text):
+        if token in STOPWORDS:
+            continue
+        # Cheap plural folding: "meetings" -> "meeting", "classes" -> "class"
+        if len(token) > 4 and token.endswith("es") and token[-3] in "sxz":
+            token = token[:-2]
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _deletions(token):
+    """Returns the token plus every variant with one character removed."""
+    return {token} | {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _within_one_edit(a, b):
+    """True if a and b differ by at most one insertion, deletion or substitution."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = j = edits = 0
+    while i < len(a) and j < len(b):
+        if a[i] != b[j]:
+            edits += 1
+            if edits > 1:
+                return False
+            if len(a) == len(b):
+                i += 1
+            j += 1
+        else:
+            i += 1
+            j += 1
+    return edits + (len(b) - j) + (len(a) - i) <= 1
+
+
+class EventSearchIndex:
+    """
+    In-memory inverted index over event summaries, locations and descriptions.
+
+    Query tokens match indexed tokens exactly, as a prefix ("dent" ->
+    "dentist") or within one edit ("dentst" -> "dentist"). Fuzzy candidates
+    come from a deletion-variant table, so no vocabulary scan is needed.
+    Results are ranked by a TF-IDF style text score scaled by how close
+    the event is to the reference time. The index is updated one event at a
+    time as events change.
+
+    Each event occupies a dense slot, and each token's postings are cached
+    as NumPy arrays of slots and weights. Scoring is then a few vectorised
+    operations, however common the query words are.
+
+    The mirror updates the index from its sync thread while queries run on
+    others, so every read and write holds the index lock.
+    """
+
+    def __init__(self, proximity_days=7, initial_capacity=1024):
+        self.proximity_days = proximity_days
+        self.postings = {}  # token -> {slot: field weight}
+        self.vocabulary = []  # sorted tokens, for prefix lookups
+        self.deletes = {}  # deletion variant -> set of tokens, for fuzzy lookups
+        self._posting_arrays = {}  # token -> (slots, weights), rebuilt after the token changes
+
+        self.slots = {}  # event id -> slot
+        self.slot_events = []  # slot -> event resource, or None if free
+        self.slot_tokens = []  # slot -> set of tokens
+        self.free_slots = []
+        self.start_ts = np.full(initial_capacity, np.nan)  # slot -> start as a POSIX timestamp
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.slots)
+
+    def on_change(self, event_id, event):
+        """Mirror listener: indexes a changed event, or removes it when event is None."""
+        with self._lock:
+            if event is None:
+                self.remove(event_id)
+            else:
+                self.add(event)
+
+    def _allocate_slot(self):
+        if self.free_slots:
+            return self.free_slots.pop()
+        slot = len(self.slot_events)
+        self.slot_events.append(None)
+        self.slot_tokens.append(set())
+        if slot >= len(self.start_ts):
+            grown = np.full(len(self.start_ts) * 2, np.nan)
+            grown[:len(self.start_ts)] = self.start_ts
+            self.start_ts = grown
+        return slot
+
+    def add(self, event):
+        """Indexes an event, replacing any previous version of it."""
+        with self._lock:
+            self._add(event)
+
+    def _add(self, event):
+        event_id = event.get('id')
+        if not event_id:
+            return
+        self._remove(event_id)
+
+        weights = {}
+        for field, field_weight in FIELD_WEIGHTS.items():
+            for token in normalize_tokens(event.get(field)):
+                weights[token] = weights.get(token, 0.0) + field_weight
+        if not weights:
+            return
+
+        slot = self._allocate_slot()
+        for token, weight in weights.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                insort(self.vocabulary, token)
+                for variant in _deletions(token):
+                    self.deletes.setdefault(variant, set()).add(token)
+            postings[slot] = weight
+            self._posting_arrays.pop(token, None)
+
+        self.slots[event_id] = slot
+        self.slot_events[slot] = event
+        self.slot_tokens[slot] = set(weights)
+        start = event.get('start', {})
+        start_value = start.get('dateTime', start.get('date'))
+        self.start_ts[slot] = parse_event_time(start_value).timestamp() if start_value else np.nan
+
+    def remove(self, event_id):
+        """Removes an event from the index if present."""
+        with self._lock:
+            self._remove(event_id)
+
+    def _remove(self, event_id):
+        slot = self.slots.pop(event_id, None)
+        if slot is None:
+            return
+        for token in self.slot_tokens[slot]:
+            postings = self.postings[token]
+            postings.pop(slot, None)
+            self._posting_arrays.pop(token, None)
+            if not postings:
+                del self.postings[token]
+                del self.vocabulary[bisect_left(self.vocabulary, token)]
+                for variant in _deletions(token):
+                    variants = self.deletes.get(variant)
+                    if variants:
+                        variants.discard(token)
+                        if not variants:
+                            del self.deletes[variant]
+        self.slot_events[slot] = None
+        self.slot_tokens[slot] = set()
+        self.start_ts[slot] = np.nan
+        self.free_slots.append(slot)
+
+    def _arrays(self, token):
+        arrays = self._posting_arrays.get(token)
+        if arrays is None:
+            postings = self.postings[token]
+            arrays = (np.fromiter(postings.keys(), dtype=np.intp, count=len(postings)),
+                      np.fromiter(postings.values(), dtype=np.float64, count=len(postings)))
+            self._posting_arrays[token] = arrays
+        return arrays
+
+    def _expand(self, query_token):
+        """Returns {indexed token: match weight} for one query token."""
+        matches = {}
+        if query_token in self.postings:
+            matches[query_token] = EXACT_MATCH
+
+        if len(query_token) >= 3:
+            position = bisect_left(self.vocabulary, query_token)
+            expansions = 0
+            while position < len(self.vocabulary) and expansions < MAX_PREFIX_EXPANSIONS:
+                token = self.vocabulary[position]
+                if not token.startswith(query_token):
+                    break
+                matches.setdefault(token, PREFIX_MATCH)
+                position += 1
+                expansions += 1
+
+        if len(query_token) >= 4:
+            candidates = set()
+            for variant in _deletions(query_token):
+                candidates |= self.deletes.get(variant, set())
+            for token in candidates:
+                if token not in matches and _within_one_edit(query_token, token):
+                    matches[token] = FUZZY_MATCH
+        return matches
+
+    def search(self, query_text, now=None, limit=5, start=None, end=None):
+        """
+        Returns up to `limit` (score, event) pairs for a spoken query, best first.
+
+        Only events starting in [start, end) are considered when bounds are given.
+        """
+        with self._lock:
+            return self._search(query_text, now, limit, start, end)
+
+    def _search(self, query_text, now, limit, start, end):
+        query_tokens = list(dict.fromkeys(normalize_tokens(query_text)))
+        if not query_tokens or not self.slots:
+            return []
+        now = now or datetime.now(timezone.utc)
+        total = len(self.slots)
+        size = len(self.slot_events)
+
+        scores = np.zeros(size)
+        matched_terms = np.zeros(size)
+        for query_token in query_tokens:
+            # A query word scores each event once, through its best matching token
+            best = np.zeros(size)
+            for token, match_weight in self._expand(query_token).items():
+                slots, weights = self._arrays(token)
+                idf = math.log(1 + total / len(slots))
+                # Slots are unique within a token, so plain fancy indexing is safe
+                best[slots] = np.maximum(best[slots], weights * (match_weight * idf))
+            scores += best
+            matched_terms += best > 0
+
+        starts = self.start_ts[:size]
+        candidates = scores > 0
+        if start:
+            candidates &= starts >= start.timestamp()
+        if end:
+            candidates &= starts < end.timestamp()
+        candidate_slots = np.flatnonzero(candidates)
+        if not len(candidate_slots):
+            return []
+
+        # Favour events that match more of the query, then events nearer in time
+        coverage = matched_terms[candidate_slots] / len(query_tokens)
+        days_away = np.abs(starts[candidate_slots] - now.timestamp()) / 86400
+        proximity = np.nan_to_num(1 / (1 + days_away / self.proximity_days))
+        final = scores[candidate_slots] * coverage * (0.5 + 0.5 * proximity)
+
+        if len(final) > limit:
+            top = np.argpartition(-final, limit)[:limit]
+        else:
+            top = np.arange(len(final))
+        top = top[np.argsort(-final[top], kind='stable')]
+        return [(float(final[i]), self.slot_events[candidate_slots[i]]) for i in top]
@@ -0,0 +1,259 @@
+import os
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+import pytz
+from dateparser import parse
+from storage import get_storage
+
+# Overlap queries only scan events starting this long before the range, so
+# they stay on the start_at index; longer events are not expected from voice input
+MAX_EVENT_SPAN = timedelta(days=14)
+
+DEFAULT_DURATION = timedelta(hours=1)
+
+EVENT_COLUMNS = "id, legacy_id, external_id, title, start_at, end_at, timezone, location, details, reminder_minutes"
+
+EVENT_INSERT_COLUMNS = """events
+(legacy_id, external_id, owner, title, start_at, end_at, timezone, location, details, reminder_minutes,
+ created_at, updated_at)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+INSERT_EVENT = "INSERT INTO " + EVENT_INSERT_COLUMNS
+
+REMINDER_UNITS = {"minute": 1, "min": 1, "hour": 60, "hr": 60, "day": 1440, "week": 10080}
+
+
+def _to_utc(value):
+    """Converts an aware datetime to the naive UTC value stored in the DATETIME columns."""
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def is_all_day(event):
+    """
+    True for an event flagged all-day, or one stored as whole days from local midnight to midnight.
+
+    The events table has no all-day column, so all-day events (from ICS
+    files or Google) are kept as midnight-to-midnight spans in their timezone.
+    """
+    if 'all_day' in event:
+        return event['all_day']
+    start, end = event['start'], event['end']
+    return start.time() == datetime.min.time() and end.time() == datetime.min.time() and end > start
+
+
+def parse_reminder_minutes(text):
+    """Parses reminder text like "10 minutes before" or "1 hour" into minutes. None for no reminder."""
+    if text is None:
+        return None
+    if isinstance(text, int):
+        return text
+    text = str(text).lower()
+    if not text.strip() or "no reminder" in text:
+        return None
+    match = re.search(r"(\d+)\s*(minute|min|hour|hr|day|week)?", text)
+    if not match:
+        return None
+    return int(match.group(1)) * REMINDER_UNITS[match.group(2) or "minute"]
+
+
+def parse_legacy_start(event_date, event_time, tz):
+    """
+    Combines the loosely typed my_table date and time columns into an aware datetime.
+
+    The exact formats the assistant writes are tried first; anything else
+    goes through dateparser. Returns None if nothing sensible comes out.
+    """
+    if isinstance(event_time, timedelta):
+        # MySQL TIME columns come back as timedelta
+        event_time = (datetime.min + event_time).time().strftime("%H:%M:%S")
+    text = f"{str(event_date).strip()} {str(event_time or '').strip()}".strip()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return tz.localize(datetime.strptime(text, fmt))
+        except ValueError:
+            continue
+    parsed = parse(text, settings={'PREFER_DATES_FROM': 'future'})
+    if not parsed:
+        return None
+    return tz.localize(parsed) if parsed.tzinfo is None else parsed
+
+
+class EventStore:
+    """
+    Typed event table with UTC start and end times, a timezone and reminder minutes.
+
+    Range and next-event reads are answered from the (owner, start_at)
+    index. Events are returned as dicts with aware `start` and `end`
+    datetimes in the event's own timezone.
+    """
+
+    def __init__(self, storage=None, owner=None):
+        self.storage = storage or get_storage()
+        self.owner = owner or os.getenv('ASSISTANT_OWNER', 'default')
+
+    def add(self, title, start, end=None, tz_name="Europe/London", location=None, details=None,
+            reminder_minutes=None, legacy_id=None, external_id=None, cursor=None):
+        """
+        Stores an event and returns its id. `start` and `end` must be timezone-aware.
+
+        Pass a cursor to write inside the caller's transaction; the caller then commits.
+        """
+        now = datetime.utcnow()
+        values = (legacy_id, external_id, self.owner, title or "Untitled event", _to_utc(start),
+                  _to_utc(end or start + DEFAULT_DURATION), tz_name, location, details,
+                  reminder_minutes, now, now)
+        if cursor is not None:
+            cursor.execute(INSERT_EVENT, values)
+            return cursor.lastrowid
+
+        self.storage.ensure_schema()
+        with self.storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(INSERT_EVENT, values)
+                conn.commit()
+                return cursor.lastrowid
+            finally:
+                cursor.close()
+
+    def _query(self, sql, params):
+        self.storage.ensure_schema()
+        with self.storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                return [self._row_to_event(row) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+
+    @staticmethod
+    def _row_to_event(row):
+        event_id, legacy_id, external_id, title, start_at, end_at, tz_name, location, details, reminder_minutes = row
+        tz = pytz.timezone(tz_name)
+        return {
+            'id': event_id,
+            'legacy_id': legacy_id,
+            'external_id': external_id,
+            'title': title,
+            'start': start_at.replace(tzinfo=timezone.utc).astimezone(tz),
+            'end': end_at.replace(tzinfo=timezone.utc).astimezone(tz),
+            'timezone': tz_name,
+            'location': location,
+            'details': details,
+            'reminder_minutes': reminder_minutes,
+        }
+
+    def events_between(self, start, end, limit=None):
+        """Returns the owner's events overlapping [start, end), ordered by start."""
+        sql = (f"SELECT {EVENT_COLUMNS} FROM events "
+               "WHERE owner = %s AND start_at >= %s AND start_at < %s AND end_at > %s ORDER BY start_at")
+        params = [self.owner, _to_utc(start - MAX_EVENT_SPAN), _to_utc(end), _to_utc(start)]
+        if limit:
+            sql += " LIMIT %s"
+            params.append(limit)
+        return self._query(sql, tuple(params))
+
+    def next_event(self, after=None):
+        """Returns the owner's first event starting at or after `after` (default now), or None."""
+        after = after or datetime.now(timezone.utc)
+        events = self._query(
+            f"SELECT {EVENT_COLUMNS} FROM events WHERE owner = %s AND start_at >= %s ORDER BY start_at LIMIT 1",
+            (self.owner, _to_utc(after))
+        )
+        return events[0] if events else None
+
+    def add_many(self, events, cursor):
+        """
+        Bulk-inserts events with one executemany, skipping any whose external_id is already stored.
+
+        Each event is a dict with title, start, end, timezone, location,
+        details, reminder_minutes and external_id. Runs in the caller's
+        transaction. Returns the number of events actually inserted.
+        """
+        now = datetime.utcnow()
+        rows = [(None, event.get('external_id'), self.owner, event.get('title') or "Untitled event",
+                 _to_utc(event['start']), _to_utc(event.get('end') or event['start'] + DEFAULT_DURATION),
+                 event.get('timezone', "Europe/London"), event.get('location'), event.get('details'),
+                 event.get('reminder_minutes'), now, now)
+                for event in events]
+        cursor.executemany(f"{self.storage.insert_ignore} INTO {EVENT_INSERT_COLUMNS}", rows)
+        # Rows skipped as duplicates don't count towards rowcount
+        return max(cursor.rowcount, 0)
+
+    def iter_events(self, start=None, end=None, chunk_size=1000):
+        """Yields the owner's events starting in [start, end) in start order, reading in chunks."""
+        last = None
+        while True:
+            sql = f"SELECT {EVENT_COLUMNS} FROM events WHERE owner = %s"
+            params = [self.owner]
+            if start:
+                sql += " AND start_at >= %s"
+                params.append(_to_utc(start))
+            if end:
+                sql += " AND start_at < %s"
+                params.append(_to_utc(end))
+            if last:
+                # Keyset pagination on (start_at, id) stays on the index however deep it goes
+                sql += " AND (start_at > %s OR (start_at = %s AND id > %s))"
+                params.extend([last[0], last[0], last[1]])
+            sql += " ORDER BY start_at, id LIMIT %s"
+            params.append(chunk_size)
+
+            events = self._query(sql, tuple(params))
+            yield from events
+            if len(events) < chunk_size:
+                return
+            last = (_to_utc(events[-1]['start']), events[-1]['id'])
+
+    def backfill_legacy(self, tz_name="Europe/London", batch_size=500):
+        """
+        Copies my_table rows that have no typed event yet into the events table.
+
+        Safe to run more than once: rows already copied are skipped by
+        legacy_id. Returns (migrated, skipped) counts, where skipped rows
+        had a date or time that could not be parsed.
+        """
+        tz = pytz.timezone(tz_name)
+        self.storage.ensure_schema()
+        migrated = skipped = 0
+        with self.storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    "SELECT m.id, m.event_name, m.event_date, m.event_time, m.location, m.details, m.reminder "
+                    "FROM my_table m LEFT JOIN events e ON e.legacy_id = m.id WHERE e.id IS NULL ORDER BY m.id"
+                )
+                rows = cursor.fetchall()
+
+                batch = []
+                now = datetime.utcnow()
+                for legacy_id, name, event_date, event_time, location, details, reminder in rows:
+                    start = parse_legacy_start(event_date, event_time, tz)
+                    if start is None:
+                        print(f"Skipping event {legacy_id}: can't parse '{event_date} {event_time}'")
+                        skipped += 1
+                        continue
+                    batch.append((legacy_id, None, self.owner, name or "Untitled event", _to_utc(start),
+                                  _to_utc(start + DEFAULT_DURATION), tz_name, location, details,
+                                  parse_reminder_minutes(reminder), now, now))
+                    if len(batch) >= batch_size:
+                        cursor.executemany(INSERT_EVENT, batch)
+                        migrated += len(batch)
+                        batch = []
+                if batch:
+                    cursor.executemany(INSERT_EVENT, batch)
+                    migrated += len(batch)
+                conn.commit()
+            finally:
+                cursor.close()
+        return migrated, skipped
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["backfill"]:
+        print("Usage: python event_store.py backfill")
+        sys.exit(1)
+    migrated, skipped = EventStore().backfill_legacy()
+    print(f"Backfilled {migrated} events, skipped {skipped}")
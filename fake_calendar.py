@@ -0,0 +1,263 @@
+import copy
+import itertools
+import json
+import time
+from datetime import datetime, timezone
+from googleapiclient.errors import HttpError
+
+
+class _FakeResponse(dict):
+    """Minimal stand-in for the httplib2 response attached to an HttpError."""
+
+    def __init__(self, status, reason):
+        super().__init__(status=str(status))
+        self.status = status
+        self.reason = reason
+
+
+def _http_error(status, reason):
+    content = json.dumps({'error': {'code': status, 'message': reason}}).encode()
+    return HttpError(_FakeResponse(status, reason), content)
+
+
+def _parse_rfc3339(value):
+    if 'T' not in value:
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+class FakeRequest:
+    """A deferred call, executed the same way as a googleapiclient HttpRequest."""
+
+    def __init__(self, service, func):
+        self.service = service
+        self.func = func
+        self.headers = {}
+
+    def execute(self):
+        self.service.calls += 1
+        if self.service.latency:
+            time.sleep(self.service.latency)
+        return self.run()
+
+    def run(self):
+        if self.service.inject_failures > 0:
+            self.service.inject_failures -= 1
+            raise _http_error(503, 'Backend Error')
+        return self.func(self.headers)
+
+
+class FakeBatchRequest:
+    """Batch of requests sent in one round trip, mirroring BatchHttpRequest's callback contract."""
+
+    def __init__(self, service, callback=None):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if request_id is None:
+            request_id = str(len(self.requests) + 1)
+        self.requests.append((request_id, request, callback or self.callback))
+
+    def execute(self):
+        self.service.calls += 1
+        if self.service.latency:
+            time.sleep(self.service.latency)
+        for request_id, request, callback in self.requests:
+            try:
+                response, exception = request.run(), None
+            except HttpError as error:
+                response, exception = None, error
+            if callback:
+                callback(request_id, response, exception)
+
+
+class FakeEventsResource:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, calendarId='primary', **kwargs):
+        return FakeRequest(self.service, lambda headers: self.service._list(kwargs))
+
+    def get(self, calendarId='primary', eventId=None, **kwargs):
+        return FakeRequest(self.service, lambda headers: self.service._get(eventId))
+
+    def insert(self, calendarId='primary', body=None, **kwargs):
+        return FakeRequest(self.service, lambda headers: self.service._insert(body))
+
+    def update(self, calendarId='primary', eventId=None, body=None, **kwargs):
+        return FakeRequest(self.service, lambda headers: self.service._update(eventId, body, headers, replace=True))
+
+    def patch(self, calendarId='primary', eventId=None, body=None, **kwargs):
+        return FakeRequest(self.service, lambda headers: self.service._update(eventId, body, headers, replace=False))
+
+    def delete(self, calendarId='primary', eventId=None, **kwargs):
+        return FakeRequest(self.service, lambda headers: self.service._delete(eventId))
+
+
+class FakeFreeBusyResource:
+    def __init__(self, service):
+        self.service = service
+
+    def query(self, body=None):
+        return FakeRequest(self.service, lambda headers: self.service._freebusy(body))
+
+
+class FakeCalendarService:
+    """
+    In-memory fake of the Calendar v3 service used for local testing and benchmarks.
+
+    Supports events list/get/insert/update/patch/delete with pagination and
+    incremental sync tokens, freebusy queries over the primary calendar plus
+    any busy blocks registered with `add_busy`, and batch requests. Every
+    executed request or batch counts as one round trip in `calls` and sleeps
+    for `latency` seconds to mimic network cost. Setting `inject_failures`
+    makes that many upcoming calls fail with a 503.
+    """
+
+    def __init__(self, latency=0.0, page_size=250):
+        self.latency = latency
+        self.page_size = page_size
+        self.calls = 0
+        self.events_by_id = {}
+        self._ids = itertools.count(1)
+        self._sequence = 0
+        self._changes = {}  # event id -> sequence number of its last change
+        self._min_valid_token = 0
+        self.busy_by_calendar = {}  # calendar id -> list of (start, end) datetimes
+        self.inject_failures = 0  # number of upcoming requests that fail with a 503
+
+    def events(self):
+        return FakeEventsResource(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatchRequest(self, callback=callback)
+
+    def freebusy(self):
+        return FakeFreeBusyResource(self)
+
+    def add_busy(self, calendar_id, start, end):
+        """Registers a busy block on another user's calendar for freebusy queries."""
+        self.busy_by_calendar.setdefault(calendar_id, []).append((start, end))
+
+    def invalidate_sync_tokens(self):
+        """Make every outstanding sync token expire, forcing clients into a 410 full resync."""
+        self._min_valid_token = self._sequence + 1
+
+    def _touch(self, event):
+        self._sequence += 1
+        event['etag'] = f'"{self._sequence}"'
+        event['updated'] = datetime.now(timezone.utc).isoformat()
+        self._changes[event['id']] = self._sequence
+
+    def _list(self, params):
+        sync_token = params.get('syncToken')
+        page_token = params.get('pageToken')
+        max_results = params.get('maxResults') or self.page_size
+
+        if sync_token is not None:
+            since = int(sync_token)
+            if since < self._min_valid_token:
+                raise _http_error(410, 'Sync token is no longer valid, a full sync is required.')
+            items = [self.events_by_id[event_id] for event_id, seq in self._changes.items() if seq > since]
+        else:
+            items = [event for event in self.events_by_id.values()
+                     if event.get('status') != 'cancelled' or params.get('showDeleted')]
+            time_min = params.get('timeMin')
+            time_max = params.get('timeMax')
+            if time_min:
+                lower = _parse_rfc3339(time_min)
+                items = [e for e in items if self._bound(e, 'end') > lower]
+            if time_max:
+                upper = _parse_rfc3339(time_max)
+                items = [e for e in items if self._bound(e, 'start') < upper]
+            query = params.get('q')
+            if query:
+                needle = query.lower()
+                items = [e for e in items
+                         if any(needle in (e.get(key) or '').lower() for key in ('summary', 'location', 'description'))]
+            items.sort(key=lambda e: self._bound(e, 'start'))
+
+        offset = int(page_token) if page_token else 0
+        page = items[offset:offset + max_results]
+        result = {'items': copy.deepcopy(page)}
+        if offset + max_results < len(items):
+            result['nextPageToken'] = str(offset + max_results)
+        else:
+            result['nextSyncToken'] = str(self._sequence)
+        return result
+
+    def _freebusy(self, body):
+        lower = _parse_rfc3339(body['timeMin'])
+        upper = _parse_rfc3339(body['timeMax'])
+        calendars = {}
+        for item in body.get('items', []):
+            calendar_id = item['id']
+            if calendar_id == 'primary':
+                blocks = [(self._bound(e, 'start'), self._bound(e, 'end')) for e in self.events_by_id.values()
+                          if e.get('status') != 'cancelled']
+            elif calendar_id in self.busy_by_calendar:
+                blocks = self.busy_by_calendar[calendar_id]
+            else:
+                calendars[calendar_id] = {'busy': [], 'errors': [{'domain': 'global', 'reason': 'notFound'}]}
+                continue
+            busy = [{'start': max(start, lower).isoformat(), 'end': min(end, upper).isoformat()}
+                    for start, end in sorted(blocks) if start < upper and end > lower]
+            calendars[calendar_id] = {'busy': busy}
+        return {'kind': 'calendar#freeBusy', 'timeMin': body['timeMin'], 'timeMax': body['timeMax'],
+                'calendars': calendars}
+
+    @staticmethod
+    def _bound(event, key):
+        value = event[key].get('dateTime', event[key].get('date'))
+        return _parse_rfc3339(value)
+
+    def _get(self, event_id):
+        event = self.events_by_id.get(event_id)
+        if not event or event.get('status') == 'cancelled':
+            raise _http_error(404, 'Not Found')
+        return copy.deepcopy(event)
+
+    def _insert(self, body):
+        event = copy.deepcopy(body)
+        event_id = event.get('id') or f"evt{next(self._ids)}"
+        existing = self.events_by_id.get(event_id)
+        if existing and existing.get('status') != 'cancelled':
+            raise _http_error(409, 'The requested identifier already exists.')
+        event['id'] = event_id
+        event.setdefault('status', 'confirmed')
+        event['htmlLink'] = f"https://calendar.example/event?eid={event_id}"
+        self.events_by_id[event_id] = event
+        self._touch(event)
+        return copy.deepcopy(event)
+
+    def _update(self, event_id, body, headers, replace):
+        event = self.events_by_id.get(event_id)
+        if not event or event.get('status') == 'cancelled':
+            raise _http_error(404, 'Not Found')
+        if_match = headers.get('If-Match')
+        if if_match and if_match != event['etag']:
+            raise _http_error(412, 'Precondition Failed')
+        if replace:
+            event.clear()
+            event.update(copy.deepcopy(body))
+            event['id'] = event_id
+            event.setdefault('status', 'confirmed')
+        else:
+            event.update(copy.deepcopy(body))
+        self._touch(event)
+        return copy.deepcopy(event)
+
+    def _delete(self, event_id):
+        event = self.events_by_id.get(event_id)
+        if not event or event.get('status') == 'cancelled':
+            raise _http_error(410, 'Resource has been deleted')
+        # Keep a tombstone so incremental syncs report the deletion
+        self.events_by_id[event_id] = {'id': event_id, 'status': 'cancelled',
+                                       'start': event['start'], 'end': event['end']}
+        self._touch(self.events_by_id[event_id])
+        return ''
@@ -0,0 +1,346 @@
+import bisect
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from collections import deque
+
+MAGIC = b"GAZT"
+VERSION = 1
+HEADER = struct.Struct("<4sIcxxxIIIII")  # magic, version, byte order, nodes, edges, values, records, name bytes
+
+# GeoNames feature classes/codes kept: populated places, plus countries and their first two admin levels
+ADMIN_CODES = {'PCLI', 'ADM1', 'ADM2'}
+
+# Words that never start a place name match, even though some are (tiny) places somewhere
+STOPWORDS = {
+    'a', 'an', 'the', 'in', 'at', 'near', 'around', 'for', 'to', 'from', 'of', 'on', 'and', 'or', 'by', 'with',
+    'is', 'are', 'was', 'were', 'be', 'am', 'will', 'it', 'its', 'what', 'whats', 'how', 'hows', 'which', 'where',
+    'me', 'my', 'i', 'you', 'your', 'we', 'us', 'this', 'that', 'there', 'here', 'can', 'could', 'please', 'find',
+    'show', 'tell', 'get', 'give', 'going', 'like', 'any', 'some', 'best', 'good', 'open', 'nearest', 'nearby',
+    'closest', 'today', 'tomorrow', 'tonight', 'now', 'later', 'soon', 'current', 'currently', 'next', 'last',
+    'morning', 'afternoon', 'evening', 'night', 'day', 'weekend', 'week', 'month', 'year', 'monday', 'tuesday',
+    'wednesday', 'thursday', 'friday', 'saturday', 'sunday', 'weather', 'forecast', 'temperature', 'rain',
+    'raining', 'snow', 'sunny', 'cloudy', 'wind', 'windy', 'hot', 'cold', 'warm', 'storm', 'degrees', 'city',
+    'centre', 'center', 'town', 'area', 'place', 'location', 'home', 'work', 'station', 'street', 'road',
+}
+# Words that introduce a place ("weather in Leith", "cafes near Perth")
+CUE_WORDS = {'in', 'at', 'near', 'around', 'for', 'to', 'from'}
+# A place named without a cue word must be at least this big to be taken as one
+UNCUED_MIN_POPULATION = 15000
+# Sizeable places that are also everyday words ("will it be nice tomorrow", "take a bath"). Without a cue
+# word they only count when capitalised mid-sentence
+COMMON_WORDS = {
+    'nice', 'reading', 'bath', 'split', 'mobile', 'orange', 'march', 'sale', 'deal', 'hope', 'bury', 'rugby',
+    'normal', 'surprise', 'enterprise', 'independence', 'liberty', 'paradise', 'temple', 'commerce', 'spring',
+    'union', 'mesa', 'sandy', 'bend', 'cork', 'male', 'police', 'goes', 'born', 'ware', 'leek', 'barking',
+    'eagle', 'victoria', 'florence',
+}
+
+
+def _tokens(text):
+    """The ASCII words of a text with accents stripped, keeping their case."""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return re.findall(r"[A-Za-z0-9]+", text.replace("'", ""))
+
+
+def normalize_name(text):
+    """Lower-cases, strips accents and reduces a name to space-separated ASCII words."""
+    return " ".join(_tokens(text)).lower()
+
+
+def _encode(words):
+    return [[bytes((c,)) for c in word.encode("ascii")] for word in words]
+
+
+def _latin(name):
+    return all(ord(ch) < 0x250 for ch in name)
+
+
+def _alternate_names(field):
+    """Alternate names worth matching: Latin-script words, not codes, postcodes or links."""
+    for alt in field.split(","):
+        if len(alt) < 3 or not _latin(alt) or any(ch.isdigit() for ch in alt) or alt.startswith("http"):
+            continue
+        if alt.isupper() and len(alt) <= 4:
+            continue  # airport and other codes
+        yield alt
+
+
+def _section(values, typecode):
+    data = array(typecode, values).tobytes()
+    return data + b"\0" * (-len(data) % 8)
+
+
+def build_gazetteer(source_path, out_path, include_alternates=True, min_population=0):
+    """
+    Compiles a GeoNames dump (cities500.txt, cities15000.txt, GB.txt, ...) into a gazetteer file.
+
+    Returns (places, names). The file holds a byte-level trie over the
+    normalised names in flat arrays, so it is used straight from a memory
+    map without being parsed.
+    """
+    records = []  # (lat, lng, population, country, name)
+    names = {}  # normalised name -> set of record ids
+    with open(source_path, encoding="utf-8") as source:
+        for line in source:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 15:
+                continue
+            feature_class, feature_code = fields[6], fields[7]
+            if feature_class != 'P' and feature_code not in ADMIN_CODES:
+                continue
+            population = int(fields[14] or 0)
+            if population < min_population:
+                continue
+            record_id = len(records)
+            records.append((float(fields[4]), float(fields[5]), population, fields[8][:2], fields[1]))
+            spellings = [fields[1], fields[2]]
+            if include_alternates:
+                spellings.extend(_alternate_names(fields[3]))
+            for spelling in spellings:
+                key = normalize_name(spelling)
+                if key.startswith("the "):
+                    key = key[4:]  # "The Hague" is spotted as "hague", after the stopword
+                if key and key.split(" ", 1)[0] not in STOPWORDS:
+                    names.setdefault(key.encode("ascii"), set()).add(record_id)
+
+    keys = sorted(names)
+    edge_first, edge_labels, edge_child = [], bytearray(), []
+    value_first, values = [], []
+    queue = deque([(0, 0, len(keys), 0)])
+    node_count = 1
+    # Breadth-first, so each node's edges (and its values) are contiguous and in node order
+    while queue:
+        node, lo, hi, depth = queue.popleft()
+        edge_first.append(len(edge_child))
+        value_first.append(len(values))
+        if lo < hi and len(keys[lo]) == depth:
+            values.extend(sorted(names[keys[lo]], key=lambda r: -records[r][2]))
+            lo += 1
+        while lo < hi:
+            label = keys[lo][depth]
+            end = bisect.bisect_left(keys, keys[lo][:depth] + bytes([label + 1]), lo, hi)
+            edge_labels.append(label)
+            edge_child.append(node_count)
+            queue.append((node_count, lo, end, depth + 1))
+            node_count += 1
+            lo = end
+    edge_first.append(len(edge_child))
+    value_first.append(len(values))
+
+    name_first, name_blob = [0], bytearray()
+    for record in records:
+        name_blob += record[4].encode("utf-8")
+        name_first.append(len(name_blob))
+
+    sections = [
+        _section(edge_first, 'I'),
+        _section(edge_child, 'I'),
+        _section(value_first, 'I'),
+        _section(values, 'I'),
+        _section([r[0] for r in records], 'd'),
+        _section([r[1] for r in records], 'd'),
+        _section([min(r[2], 0xFFFFFFFF) for r in records], 'I'),
+        _section(name_first, 'I'),
+        bytes(edge_labels) + b"\0" * (-len(edge_labels) % 8),
+        "".join(r[3].ljust(2) for r in records).encode("ascii", "replace"),
+    ]
+    sections[-1] += b"\0" * (-len(sections[-1]) % 8)
+    header = HEADER.pack(MAGIC, VERSION, b"L" if sys.byteorder == "little" else b"B",
+                         node_count, len(edge_child), len(values), len(records), len(name_blob))
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as out:
+        out.write(header + b"\0" * (-len(header) % 8))
+        for section in sections:
+            out.write(section)
+        out.write(bytes(name_blob))
+    os.replace(tmp_path, out_path)
+    return len(records), len(keys)
+
+
+class Gazetteer:
+    """
+    Offline place-name spotting and resolution from a compiled gazetteer file.
+
+    The file is memory-mapped and read in place, so opening it is instant
+    and its pages are shared between processes. `spot` walks the trie from
+    each word of the utterance and keeps the longest name that ends on a
+    word boundary, so "new york" wins over "york". `resolve` picks the
+    best of those: names introduced by "in", "near" and similar first,
+    then longer names; among places sharing a name the most populous one
+    wins. A name without a cue word only counts for towns of 15,000 or
+    more, which keeps ordinary words that happen to be villages out.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('GAZETTEER_PATH', "gazetteer.bin")
+        self._file = open(self.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, byte_order, nodes, edges, value_count, records, name_bytes = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a gazetteer file (version {VERSION})")
+        if byte_order != (b"L" if sys.byteorder == "little" else b"B"):
+            raise ValueError(f"{self.path} was built on a machine with a different byte order; rebuild it")
+        self.size = records
+
+        view = memoryview(self._map)
+        offset = HEADER.size + (-HEADER.size % 8)
+
+        def take(length, typecode=None):
+            nonlocal offset
+            section = view[offset:offset + length]
+            offset += length + (-length % 8)
+            return section.cast(typecode) if typecode else section
+
+        self._edge_first = take(4 * (nodes + 1), 'I')
+        self._edge_child = take(4 * edges, 'I')
+        self._value_first = take(4 * (nodes + 1), 'I')
+        self._values = take(4 * value_count, 'I')
+        self._lat = take(8 * records, 'd')
+        self._lng = take(8 * records, 'd')
+        self._population = take(4 * records, 'I')
+        self._name_first = take(4 * (records + 1), 'I')
+        self._labels_offset = offset
+        take(edges)
+        self._countries = take(2 * records)
+        self._names = take(name_bytes)
+
+    def _step(self, node, label):
+        start = self._edge_first[node]
+        index = self._map.find(label, self._labels_offset + start, self._labels_offset + self._edge_first[node + 1])
+        return self._edge_child[index - self._labels_offset] if index >= 0 else -1
+
+    def _longest(self, words, start):
+        """Longest name starting at words[start] (encoded by _encode); returns (end word, trie node) or None."""
+        node, best = 0, None
+        for end in range(start, len(words)):
+            if end > start:
+                node = self._step(node, b" ")
+                if node < 0:
+                    break
+            for char in words[end]:
+                node = self._step(node, char)
+                if node < 0:
+                    return best
+            if self._value_first[node] != self._value_first[node + 1]:
+                best = (end + 1, node)
+        return best
+
+    def place(self, record_id):
+        return {
+            'name': bytes(self._names[self._name_first[record_id]:self._name_first[record_id + 1]]).decode("utf-8"),
+            'lat': self._lat[record_id],
+            'lng': self._lng[record_id],
+            'population': self._population[record_id],
+            'country': bytes(self._countries[2 * record_id:2 * record_id + 2]).decode("ascii").strip(),
+        }
+
+    def lookup(self, name):
+        """Every place called `name`, most populous first."""
+        words = normalize_name(name).split()
+        found = self._longest(_encode(words), 0) if words else None
+        if not found or found[0] != len(words):
+            return []
+        node = found[1]
+        return [self.place(self._values[i]) for i in range(self._value_first[node], self._value_first[node + 1])]
+
+    def spot(self, text):
+        """
+        Finds place names in an utterance, left to right without overlaps.
+
+        Returns (matched words, cued, capitalised, record ids most populous first)
+        for each, where capitalised means the match starts with a capital
+        letter somewhere other than the start of a mixed-case text.
+        """
+        tokens = _tokens(text)
+        words = [token.lower() for token in tokens]
+        # All-lower or all-upper transcripts say nothing about proper nouns
+        has_case = text != text.lower() and text != text.upper()
+        encoded = _encode(words)
+        matches = []
+        i = 0
+        while i < len(words):
+            found = None if words[i] in STOPWORDS else self._longest(encoded, i)
+            if not found:
+                i += 1
+                continue
+            end, node = found
+            previous = i - 1
+            if previous >= 0 and words[previous] in ('the', 'a'):
+                previous -= 1
+            cued = previous >= 0 and words[previous] in CUE_WORDS
+            record_ids = [self._values[k] for k in range(self._value_first[node], self._value_first[node + 1])]
+            capitalised = has_case and i > 0 and tokens[i][0].isupper()
+            matches.append((" ".join(words[i:end]), cued, capitalised, record_ids))
+            i = end
+        return matches
+
+    def resolve(self, text):
+        """
+        The place an utterance is most likely about, or None.
+
+        A place named without a cue word must be sizeable, and if its name
+        is also a common word it must be capitalised as well. Returns a dict
+        with the canonical name, lat, lng, population, country and the
+        words that matched.
+        """
+        best = None
+        for matched, cued, capitalised, record_ids in self.spot(text):
+            population = self._population[record_ids[0]]
+            if not cued and population < UNCUED_MIN_POPULATION:
+                continue
+            if not cued and not capitalised and matched in COMMON_WORDS:
+                continue
+            rank = (cued, len(matched), population)
+            if best is None or rank > best[0]:
+                best = (rank, matched, record_ids[0])
+        if best is None:
+            return None
+        return dict(self.place(best[2]), matched=best[1])
+
+    def close(self):
+        for section in (self._edge_first, self._edge_child, self._value_first, self._values, self._lat, self._lng,
+                        self._population, self._name_first, self._countries, self._names):
+            section.release()
+        self._map.close()
+        self._file.close()
+
+
+_default_gazetteer = None
+_default_gazetteer_checked = False
+_default_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """Returns the process-wide gazetteer, or None if no gazetteer file has been built."""
+    global _default_gazetteer, _default_gazetteer_checked
+    with _default_gazetteer_lock:
+        if not _default_gazetteer_checked:
+            _default_gazetteer_checked = True
+            path = os.getenv('GAZETTEER_PATH', "gazetteer.bin")
+            if os.path.exists(path):
+                try:
+                    _default_gazetteer = Gazetteer(path)
+                except (OSError, ValueError) as e:
+                    print(f"Could not open gazetteer {path}: {e}")
+        return _default_gazetteer
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "build":
+        started = time.perf_counter()
+        out_path = sys.argv[3] if len(sys.argv) > 3 else os.getenv('GAZETTEER_PATH', "gazetteer.bin")
+        places, names = build_gazetteer(sys.argv[2], out_path)
+        print(f"Compiled {places} places under {names} names into {out_path} "
+              f"({os.path.getsize(out_path) / 1e6:.1f} MB) in {time.perf_counter() - started:.1f} s")
+    elif len(sys.argv) >= 3 and sys.argv[1] == "resolve":
+        print(Gazetteer().resolve(" ".join(sys.argv[2:])))
+    else:
+        print("Usage: python gazetteer.py build <geonames.txt> [out] | resolve <utterance>")
+        sys.exit(1)
@@ -0,0 +1,79 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Great-circle distances in km from one point to arrays of points, computed in one vectorised pass."""
+    lat1, lng1 = np.radians(lat), np.radians(lng)
+    lat2, lng2 = np.radians(np.asarray(lats, dtype=float)), np.radians(np.asarray(lngs, dtype=float))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def place_distances_km(lat, lng, places):
+    """Distances in km to Places API results; results without a location get infinity."""
+    coords = np.full((len(places), 2), np.nan)
+    for i, place in enumerate(places):
+        location = place.get('geometry', {}).get('location')
+        if location:
+            coords[i] = (location['lat'], location['lng'])
+    distances = haversine_km(lat, lng, coords[:, 0], coords[:, 1])
+    return np.where(np.isnan(distances), np.inf, distances)
+
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat, lng, precision=6):
+    """Encodes a point as a geohash; precision 6 cells are about 1.2 km by 0.6 km."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        target, bounds = (lng, lng_range) if even else (lat, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if target >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def geohash_bounds(cell):
+    """Returns (min_lat, min_lng, max_lat, max_lng) of a geohash cell."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            bounds = lng_range if even else lat_range
+            middle = (bounds[0] + bounds[1]) / 2
+            if value >> shift & 1:
+                bounds[0] = middle
+            else:
+                bounds[1] = middle
+            even = not even
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+def geohash_neighbours(cell):
+    """The cell itself and the eight cells around it."""
+    min_lat, min_lng, max_lat, max_lng = geohash_bounds(cell)
+    height, width = max_lat - min_lat, max_lng - min_lng
+    centre_lat, centre_lng = (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+    cells = []
+    for d_lat in (-1, 0, 1):
+        for d_lng in (-1, 0, 1):
+            lat = max(-89.999999, min(89.999999, centre_lat + d_lat * height))
+            lng = (centre_lng + d_lng * width + 180) % 360 - 180
+            cell_id = geohash_encode(lat, lng, len(cell))
+            if cell_id not in cells:
+                cells.append(cell_id)
+    return cells
@@ -0,0 +1,155 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Resolved places rarely move; names that failed are retried sooner
+GEOCODE_TTL = 30 * 24 * 60 * 60
+NEGATIVE_TTL = 24 * 60 * 60
+DEFAULT_MEMORY_SIZE = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocodes (
+    name TEXT PRIMARY KEY,
+    lat REAL,
+    lng REAL,
+    expires_at REAL NOT NULL
+)
+"""
+
+
+def normalize_place_name(name):
+    """Normalises a spoken place name so "Leith", "leith." and "the  Leith" share an entry."""
+    name = re.sub(r"[^\w\s-]", " ", name.lower())
+    name = re.sub(r"\s+", " ", name).strip()
+    return re.sub(r"^the ", "", name)
+
+
+class GeocodeCache:
+    """
+    Two-level cache of geocoding results keyed on the normalised place name.
+
+    A small in-memory LRU answers repeated names without I/O; behind it an
+    SQLite file keeps results across restarts. Entries expire after a TTL.
+    Names that geocoding couldn't resolve are cached too (with a shorter
+    TTL), so asking about them again skips the round trip as well. Lookup
+    errors are never cached.
+    """
+
+    def __init__(self, path=None, memory_size=DEFAULT_MEMORY_SIZE, ttl=GEOCODE_TTL, negative_ttl=NEGATIVE_TTL,
+                 clock=time.time):
+        self.path = path or os.getenv('GEOCODE_CACHE_PATH', "geocode_cache.db")
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+
+        self._memory = OrderedDict()  # name -> (location or None, expires_at)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+
+        self.stats = {
+            'lookups': 0,
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'negative_hits': 0,
+            'misses': 0,
+            'expired': 0,
+        }
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, name):
+        """
+        Returns (found, location) for a cached name, or None on a miss.
+
+        `location` is a dict with lat and lng, or None when the name is
+        cached as unresolvable.
+        """
+        key = normalize_place_name(name)
+        now = self.clock()
+        with self._lock:
+            self.stats['lookups'] += 1
+            entry = self._memory.get(key)
+            if entry and entry[1] > now:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+            else:
+                row = self._conn.execute("SELECT lat, lng, expires_at FROM geocodes WHERE name = ?",
+                                         (key,)).fetchone()
+                if not row or row[2] <= now:
+                    if entry or row:
+                        self.stats['expired'] += 1
+                        self._memory.pop(key, None)
+                    self.stats['misses'] += 1
+                    return None
+                lat, lng, expires_at = row
+                entry = ({'lat': lat, 'lng': lng} if lat is not None else None, expires_at)
+                self._remember(key, entry)
+                self.stats['disk_hits'] += 1
+            if entry[0] is None:
+                self.stats['negative_hits'] += 1
+            return True, entry[0] and dict(entry[0])
+
+    def put(self, name, location):
+        """Caches a geocoding result; pass None for a name that doesn't resolve."""
+        key = normalize_place_name(name)
+        expires_at = self.clock() + (self.ttl if location else self.negative_ttl)
+        location = {'lat': location['lat'], 'lng': location['lng']} if location else None
+        with self._lock:
+            self._remember(key, (location, expires_at))
+            self._conn.execute("INSERT OR REPLACE INTO geocodes (name, lat, lng, expires_at) VALUES (?, ?, ?, ?)",
+                               (key, location and location['lat'], location and location['lng'], expires_at))
+            self._conn.commit()
+
+    def lookup(self, name, resolve):
+        """
+        Returns the cached location for a name, calling `resolve(name)` on a miss.
+
+        `resolve` returns a dict with lat and lng, or None if the name
+        doesn't exist; exceptions it raises propagate and nothing is cached.
+        """
+        cached = self.get(name)
+        if cached:
+            return cached[1]
+        location = resolve(name)
+        self.put(name, location)
+        return location
+
+    def purge_expired(self):
+        """Deletes expired entries from disk. Returns how many were removed."""
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM geocodes WHERE expires_at <= ?", (self.clock(),)).rowcount
+            self._conn.commit()
+        return removed
+
+    def hit_rate(self):
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        return hits / self.stats['lookups'] if self.stats['lookups'] else 0.0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_geocode_cache = None
+_default_geocode_cache_lock = threading.Lock()
+
+
+def get_geocode_cache():
+    """Returns the process-wide geocoding cache, opening it on first use."""
+    global _default_geocode_cache
+    with _default_geocode_cache_lock:
+        if _default_geocode_cache is None:
+            _default_geocode_cache = GeocodeCache()
+            # Keep the file from growing with names nobody asks about any more
+            _default_geocode_cache.purge_expired()
+        return _default_geocode_cache
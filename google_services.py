@@ -0,0 +1,200 @@
+import os
+import threading
+from datetime import datetime
+import google_auth_httplib2
+import httplib2
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+
+# Google Calendar API scopes
+SCOPES = ["https://www.googleapis.com/auth/calendar"]
+
+# Refresh the access token this many seconds before it expires
+REFRESH_MARGIN = 300
+
+
+class GoogleServiceFactory:
+    """
+    Process-wide source of Google API clients sharing one set of credentials.
+
+    Services are built lazily on first use from the discovery documents bundled
+    with google-api-python-client, so building needs no network round trip,
+    and each built service is cached. Every request gets its own HTTP
+    transport over the shared credentials, which makes the services safe to
+    use from background threads. A timer refreshes the token shortly before
+    it expires so requests don't stall on a refresh.
+    """
+
+    def __init__(self, token_path="token.json", credentials_path="credentials.json", scopes=SCOPES):
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.scopes = scopes
+
+        self._lock = threading.RLock()
+        self._credentials = None
+        self._services = {}
+        self._refresh_timer = None
+        self.builds = 0
+
+    def get_credentials(self):
+        """Loads, refreshes or obtains the shared credentials. Returns None if none are available."""
+        with self._lock:
+            if self._credentials and self._credentials.valid:
+                return self._credentials
+
+            creds = self._credentials
+            if not creds and os.path.exists(self.token_path):
+                creds = Credentials.from_authorized_user_file(self.token_path, self.scopes)
+
+            if not creds or not creds.valid:
+                if creds and creds.expired and creds.refresh_token:
+                    try:
+                        creds.refresh(Request())
+                    except RefreshError:
+                        print("Token has expired or been revoked. Re-authenticating...")
+                        creds = self._authenticate()
+                else:
+                    creds = self._authenticate()
+                if creds:
+                    self._save(creds)
+
+            self._credentials = creds
+            if creds:
+                self._schedule_refresh()
+            return creds
+
+    def has_credentials(self):
+        """Whether credentials are loaded or a saved token exists; never builds, refreshes or prompts."""
+        return self._credentials is not None or os.path.exists(self.token_path)
+
+    def _authenticate(self):
+        """Runs the installed-app OAuth flow if client secrets are available."""
+        if threading.current_thread() is not threading.main_thread():
+            # The flow opens a browser and blocks on it; that must not start from a background worker
+            print("Google authorisation is needed; it will be requested when the calendar is next used.")
+            return None
+        if not os.path.exists(self.credentials_path):
+            print(f"WARNING: {self.credentials_path} not found. Calendar integration disabled.")
+            return None
+        flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, self.scopes)
+        return flow.run_local_server(port=0)
+
+    def _save(self, creds):
+        with open(self.token_path, "w") as token:
+            token.write(creds.to_json())
+
+    def _schedule_refresh(self):
+        if self._refresh_timer or not self._credentials.expiry or not self._credentials.refresh_token:
+            return
+        # Credentials.expiry is a naive UTC datetime
+        delay = (self._credentials.expiry - datetime.utcnow()).total_seconds() - REFRESH_MARGIN
+        self._refresh_timer = threading.Timer(max(delay, 30), self._background_refresh)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _background_refresh(self):
+        with self._lock:
+            self._refresh_timer = None
+            try:
+                self._credentials.refresh(Request())
+                self._save(self._credentials)
+            except Exception as e:
+                # Requests will retry the refresh themselves if this one failed
+                print(f"Background token refresh failed: {e}")
+            self._schedule_refresh()
+
+    def get_service(self, name="calendar", version="v3"):
+        """Returns the cached client for an API, building it on first use. None if unauthorised."""
+        key = (name, version)
+        service = self._services.get(key)
+        if service:
+            return service
+
+        with self._lock:
+            service = self._services.get(key)
+            if service:
+                return service
+
+            creds = self.get_credentials()
+            if not creds:
+                return None
+
+            def build_request(http, *args, **kwargs):
+                # httplib2 isn't thread-safe, so give every request its own transport
+                new_http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+                return HttpRequest(new_http, *args, **kwargs)
+
+            try:
+                authorized_http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+                service = build(name, version, http=authorized_http, requestBuilder=build_request,
+                                static_discovery=True)
+            except Exception as e:
+                print(f"Failed to build {name} service: {e}")
+                return None
+
+            self.builds += 1
+            self._services[key] = service
+            return service
+
+    def shutdown(self):
+        """Stops the background refresh timer."""
+        with self._lock:
+            if self._refresh_timer:
+                self._refresh_timer.cancel()
+                self._refresh_timer = None
+
+
+class LazyService:
+    """
+    Stand-in for a Google API client that is only built when first used.
+
+    Attribute access is forwarded to the real service. Truth-testing the
+    proxy also builds it and reports whether the service is available;
+    background workers should use `service_available` instead, which
+    doesn't build anything.
+    """
+
+    def __init__(self, factory, name="calendar", version="v3"):
+        self._factory = factory
+        self._name = name
+        self._version = version
+
+    def _resolve(self):
+        return self._factory.get_service(self._name, self._version)
+
+    def available(self):
+        """Whether the service can probably be built, without building it."""
+        return self._factory.has_credentials()
+
+    def __bool__(self):
+        return self._resolve() is not None
+
+    def __getattr__(self, attr):
+        service = self._resolve()
+        if service is None:
+            raise RuntimeError(f"Google {self._name} service is not available")
+        return getattr(service, attr)
+
+
+_default_factory = GoogleServiceFactory()
+
+
+def get_service_factory():
+    """Returns the process-wide service factory."""
+    return _default_factory
+
+
+def service_available(service):
+    """Whether a service (lazy proxy or real client) is usable, without building a lazy one."""
+    if isinstance(service, LazyService):
+        return service.available()
+    return service is not None
+
+
+def lazy_calendar_service():
+    """Returns a lazily-built proxy for the shared Calendar v3 client."""
+    return LazyService(_default_factory, "calendar", "v3")
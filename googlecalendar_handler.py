@@ -1,46 +1,128 @@
-import os
 import re
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, time as dt_time, timedelta, timezone
 from dateparser import parse
-from google.auth.exceptions import RefreshError
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from agenda import group_by_day, resolve_range, spoken_summary
+from calendar_batch import execute_in_batches
+from calendar_mirror import CalendarMirror, parse_event_time
+from calendar_outbox import new_event_id
+from event_search import EventSearchIndex
+from interval_index import IntervalIndex
+from google_services import lazy_calendar_service
+from group_availability import find_group_availability
 
-# Google Calendar API scopes
-SCOPES = ["https://www.googleapis.com/auth/calendar"]
+# Partial response mask for list calls: only the fields read when describing events
+EVENT_LIST_FIELDS = "nextPageToken,items(id,summary,location,start,end)"
+
+# Mirror searches without a start date still reach back this far, for events already under way
+SEARCH_PAST_SLACK = timedelta(days=1)
 
 class GoogleCalendarHandler:
-    def __init__(self):
-        """Initializes the Google Calendar handler."""
-        self.service = self.initialize_google_calendar()
-
-    def initialize_google_calendar(self):
-        """Initializes the Google Calendar API service."""
-        creds = None
-        if os.path.exists("token.json"):
-            creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                try:
-                    creds.refresh(Request())
-                except RefreshError:
-                    print("Token has expired or been revoked. Re-authenticating...")
-                    creds = self.authenticate()
-            else:
-                creds = self.authenticate()
-        return build("calendar", "v3", credentials=creds)
-
-    def authenticate(self):
-        """Authenticate the user and save the credentials."""
-        flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-        creds = flow.run_local_server(port=0)
-        with open("token.json", "w") as token:
-            token.write(creds.to_json())
-        print("Saved new credentials to token.json")
-        return creds
+    def __init__(self, max_staleness=60, service=None, reminder_scheduler=None):
+        """
+        Initializes the Google Calendar handler, optionally with an existing (or fake) service.
+
+        A reminder_scheduler is kept current with every change the mirror sees.
+        """
+        # The shared Calendar client is only built on first use
+        self.service = service if service is not None else lazy_calendar_service()
+        # Local mirror that answers reads without a live events().list call;
+        # a max_staleness of None disables it and every read goes to the API
+        self.mirror = CalendarMirror(self.service, max_staleness=max_staleness) if max_staleness is not None else None
+        self._index_cache = {}  # include_all_day -> (mirror version, IntervalIndex)
+        # Full-text index over mirrored events, kept current by the mirror
+        self.search_index = EventSearchIndex()
+        if self.mirror:
+            self.mirror.add_listener(self.search_index.on_change)
+            if reminder_scheduler:
+                self.mirror.add_listener(reminder_scheduler.on_calendar_change)
+        # Round trips spent on edits, to measure the cost of each change
+        self.edit_stats = {'edits': 0, 'round_trips': 0, 'precondition_failures': 0}
+
+    def _list_events(self, time_min, time_max, query_text=None):
+        """Returns events overlapping the given range, answered from the local mirror when enabled."""
+        if isinstance(time_min, str):
+            time_min = parse_event_time(time_min)
+        if isinstance(time_max, str):
+            time_max = parse_event_time(time_max)
+
+        if not self.mirror:
+            return list(self.iter_events(time_min, time_max, query_text=query_text))
+
+        events = self.mirror.events_between(time_min, time_max)
+        if query_text:
+            needle = query_text.lower()
+            events = [
+                event for event in events
+                if any(needle in (event.get(key) or '').lower() for key in ('summary', 'location', 'description'))
+            ]
+        return events
+
+    def _mirror_apply(self, event):
+        """Records an event written through this handler in the mirror, if enabled."""
+        if self.mirror and event:
+            self.mirror.apply(event)
+
+    def _mirror_remove(self, event_id):
+        """Drops an event deleted through this handler from the mirror, if enabled."""
+        if self.mirror:
+            self.mirror.remove(event_id)
+
+    def iter_events(self, time_min, time_max, query_text=None, fields=EVENT_LIST_FIELDS, page_size=250):
+        """
+        Lazily yields live events between time_min and time_max, in start order.
+
+        Pages are fetched only as the caller consumes them, so breaking out of
+        the loop early skips the remaining requests. Only the requested
+        `fields` are returned by the API.
+        """
+        if isinstance(time_min, datetime):
+            time_min = time_min.isoformat()
+        if isinstance(time_max, datetime):
+            time_max = time_max.isoformat()
+
+        params = {
+            'calendarId': 'primary',
+            'timeMin': time_min,
+            'timeMax': time_max,
+            'singleEvents': True,
+            'orderBy': 'startTime',
+            'maxResults': page_size,
+            'fields': fields,
+        }
+        if query_text:
+            params['q'] = query_text
+
+        while True:
+            events_result = self.service.events().list(**params).execute()
+            for event in events_result.get('items', []):
+                yield event
+
+            page_token = events_result.get('nextPageToken')
+            if not page_token:
+                return
+            params['pageToken'] = page_token
+
+    def _get_interval_index(self, time_min, time_max, include_all_day=True):
+        """
+        Returns an interval index covering at least [time_min, time_max).
+
+        With the mirror enabled the index spans the whole mirror and is only
+        rebuilt when it changes; otherwise it's built from a live read of the range.
+        """
+        if not self.mirror:
+            return IntervalIndex.from_events(self.iter_events(time_min, time_max), include_all_day=include_all_day)
+
+        self.mirror.ensure_fresh()
+        cached = self._index_cache.get(include_all_day)
+        if cached and cached[0] == self.mirror.version:
+            return cached[1]
+        with self.mirror.lock:
+            version = self.mirror.version
+            events = [event for _, _, event in self.mirror.events.values()]
+        index = IntervalIndex.from_events(events, include_all_day=include_all_day)
+        self._index_cache[include_all_day] = (version, index)
+        return index
 
     def get_events(self, date):
         """Fetches events from Google Calendar for a specific date."""
@@ -52,19 +134,8 @@ class GoogleCalendarHandler:
         start_of_day = datetime.combine(date, datetime.min.time()).replace(tzinfo=timezone.utc)
         end_of_day = datetime.combine(date + timedelta(days=1), datetime.min.time()).replace(tzinfo=timezone.utc)
 
-        start_of_day_iso = start_of_day.isoformat()
-        end_of_day_iso = end_of_day.isoformat()
-
         try:
-            events_result = self.service.events().list(
-                calendarId='primary',
-                timeMin=start_of_day_iso,
-                timeMax=end_of_day_iso,
-                maxResults=10,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            events = events_result.get('items', [])
+            events = self._list_events(start_of_day, end_of_day)
 
             if not events:
                 return "You have no events scheduled for this date."
@@ -92,102 +163,130 @@ class GoogleCalendarHandler:
             print(f"Error details: {error.content}")  # Log the full error response
             return "Sorry, I couldn't fetch your events. Please try again later."
 
-    def insert_event(self, event_name, event_date, event_time, location, details, reminder):
-        """Inserts an event into Google Calendar."""
+    def get_agenda(self, range_text="today", tz_name="Europe/London", now=None, max_events=8):
+        """
+        Describes the events in a relative range such as "this week" or "next 3 days".
+
+        The whole range is read in one go (from the mirror, or one paginated
+        list request) and grouped by local day in the user's timezone.
+        """
+        resolved = resolve_range(range_text, now=now, tz_name=tz_name)
+        if not resolved:
+            return "Sorry, I didn't catch which days you meant."
+        range_start, range_end, label = resolved
+
         try:
-            # Parse the reminder string to extract the number of minutes
-            reminder_minutes = 10  # Default value
-            if reminder:
-                # Try to extract the number from strings like "10 minutes before"
-                match = re.search(r'(\d+)\s*minutes?', reminder)
-                if match:
-                    reminder_minutes = int(match.group(1))
-
-            # Format date and time properly
-            if not event_date or not event_time:
-                print("Warning: Missing date or time for event")
-                event_date = datetime.now().strftime("%Y-%m-%d")
-                event_time = "12:00"
-
-            # Ensure we have a valid date format (YYYY-MM-DD)
-            try:
-                if isinstance(event_date, str) and not re.match(r'\d{4}-\d{2}-\d{2}', event_date):
-                    # Try to parse and convert to YYYY-MM-DD
-                    try:
-                        parsed_date = parse(event_date)
-                        if parsed_date:
-                            event_date = parsed_date.strftime("%Y-%m-%d")
-                        else:
-                            raise ValueError("Date parsing failed")
-                    except (ValueError, TypeError):
-                        # If parsing fails, use tomorrow as fallback
-                        event_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
-            except Exception as e:
-                print(f"Error ensuring valid date format: {e}")
-                event_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
-
-            # Format time (ensure HH:MM format)
-            if isinstance(event_time, str):
-                # Try to standardize time format
-                time_match = re.search(r'(\d{1,2}):?(\d{2})?\s*(am|pm)?', event_time.lower())
-                if time_match:
-                    hour = int(time_match.group(1))
-                    minute = int(time_match.group(2) or "0")
-                    ampm = time_match.group(3)
+            events = self._list_events(range_start, range_end)
+            groups = group_by_day(events, tz_name=tz_name, range_start=range_start, range_end=range_end)
+            return spoken_summary(groups, label, now=now, tz_name=tz_name, max_events=max_events)
 
-                    # Handle 12-hour format
-                    if ampm and ampm.lower() == 'pm' and hour < 12:
-                        hour += 12
-                    if ampm and ampm.lower() == 'am' and hour == 12:
-                        hour = 0
+        except HttpError as error:
+            print(f"An error occurred while fetching the agenda: {error}")
+            return "Sorry, I couldn't fetch your events. Please try again later."
 
-                    event_time = f"{hour:02d}:{minute:02d}"
-                else:
-                    event_time = "12:00"  # Default time
+    def _build_event_body(self, event_name, event_date, event_time, location, details, reminder):
+        """Builds a Calendar event resource from loosely formatted event details."""
+        # Parse the reminder string to extract the number of minutes
+        reminder_minutes = 10  # Default value
+        if reminder:
+            # Try to extract the number from strings like "10 minutes before"
+            match = re.search(r'(\d+)\s*minutes?', reminder)
+            if match:
+                reminder_minutes = int(match.group(1))
+
+        # Format date and time properly
+        if not event_date or not event_time:
+            print("Warning: Missing date or time for event")
+            event_date = datetime.now().strftime("%Y-%m-%d")
+            event_time = "12:00"
+
+        # Ensure we have a valid date format (YYYY-MM-DD)
+        try:
+            if isinstance(event_date, str) and not re.match(r'\d{4}-\d{2}-\d{2}', event_date):
+                # Try to parse and convert to YYYY-MM-DD
+                try:
+                    parsed_date = parse(event_date)
+                    if parsed_date:
+                        event_date = parsed_date.strftime("%Y-%m-%d")
+                    else:
+                        raise ValueError("Date parsing failed")
+                except (ValueError, TypeError):
+                    # If parsing fails, use tomorrow as fallback
+                    event_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+        except Exception as e:
+            print(f"Error ensuring valid date format: {e}")
+            event_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+
+        # Format time (ensure HH:MM format)
+        if isinstance(event_time, str):
+            # Try to standardize time format
+            time_match = re.search(r'(\d{1,2}):?(\d{2})?\s*(am|pm)?', event_time.lower())
+            if time_match:
+                hour = int(time_match.group(1))
+                minute = int(time_match.group(2) or "0")
+                ampm = time_match.group(3)
+
+                # Handle 12-hour format
+                if ampm and ampm.lower() == 'pm' and hour < 12:
+                    hour += 12
+                if ampm and ampm.lower() == 'am' and hour == 12:
+                    hour = 0
+
+                event_time = f"{hour:02d}:{minute:02d}"
+            else:
+                event_time = "12:00"  # Default time
 
-            # Create datetime objects with timezone
-            try:
-                # Create start time
-                start_dt = datetime.strptime(f"{event_date}T{event_time}:00", "%Y-%m-%dT%H:%M:%S")
-                # Add timezone info
-                start_dt = start_dt.replace(tzinfo=timezone.utc)
-
-                # Calculate end time (1 hour after start by default)
-                end_dt = start_dt + timedelta(hours=1)
-
-                # Format for Google Calendar API
-                start_time_str = start_dt.isoformat()
-                end_time_str = end_dt.isoformat()
-            except ValueError as e:
-                print(f"Warning: Could not calculate proper times: {e}")
-                # Default to 1 hour from now with timezone
-                start_dt = datetime.now().replace(tzinfo=timezone.utc)
-                end_dt = start_dt + timedelta(hours=1)
-                start_time_str = start_dt.isoformat()
-                end_time_str = end_dt.isoformat()
-
-            event = {
-                'summary': event_name,
-                'location': location,
-                'description': details,
-                'start': {
-                    'dateTime': start_time_str,
-                    'timeZone': 'UTC',
-                },
-                'end': {
-                    'dateTime': end_time_str,
-                    'timeZone': 'UTC',
-                },
-                'reminders': {
-                    'useDefault': False,
-                    'overrides': [
-                        {'method': 'popup', 'minutes': reminder_minutes},
-                    ],
-                },
-            }
+        # Create datetime objects with timezone
+        try:
+            # Create start time
+            start_dt = datetime.strptime(f"{event_date}T{event_time}:00", "%Y-%m-%dT%H:%M:%S")
+            # Add timezone info
+            start_dt = start_dt.replace(tzinfo=timezone.utc)
+
+            # Calculate end time (1 hour after start by default)
+            end_dt = start_dt + timedelta(hours=1)
+
+            # Format for Google Calendar API
+            start_time_str = start_dt.isoformat()
+            end_time_str = end_dt.isoformat()
+        except ValueError as e:
+            print(f"Warning: Could not calculate proper times: {e}")
+            # Default to 1 hour from now with timezone
+            start_dt = datetime.now().replace(tzinfo=timezone.utc)
+            end_dt = start_dt + timedelta(hours=1)
+            start_time_str = start_dt.isoformat()
+            end_time_str = end_dt.isoformat()
+
+        event = {
+            'summary': event_name,
+            'location': location,
+            'description': details,
+            'start': {
+                'dateTime': start_time_str,
+                'timeZone': 'UTC',
+            },
+            'end': {
+                'dateTime': end_time_str,
+                'timeZone': 'UTC',
+            },
+            'reminders': {
+                'useDefault': False,
+                'overrides': [
+                    {'method': 'popup', 'minutes': reminder_minutes},
+                ],
+            },
+        }
+
+        return event
+
+    def insert_event(self, event_name, event_date, event_time, location, details, reminder):
+        """Inserts an event into Google Calendar."""
+        try:
+            event = self._build_event_body(event_name, event_date, event_time, location, details, reminder)
 
             # Actually insert the event
             created_event = self.service.events().insert(calendarId='primary', body=event).execute()
+            self._mirror_apply(created_event)
             print(f"Event created in Google Calendar: {created_event.get('htmlLink')}")
             return created_event
 
@@ -196,8 +295,77 @@ class GoogleCalendarHandler:
             print(f"Error details: {error.content}")  # Log the full error response
             raise Exception("Failed to insert event into Google Calendar")
 
-    def check_for_conflicts(self, date, time):
-        """Checks if there are any conflicts in the Google Calendar for the specified date and time."""
+    def bulk_insert_events(self, events):
+        """
+        Inserts many events using batched requests.
+
+        Each item is a dict with name, date, time, location, details and
+        reminder keys. Returns one result dict per item, in order.
+        Every body carries an event id chosen up front, so a retry of an
+        insert Google already carried out gets a 409 instead of creating a
+        duplicate.
+        """
+        bodies = [
+            dict(self._build_event_body(event.get('name'), event.get('date'), event.get('time'),
+                                        event.get('location'), event.get('details'), event.get('reminder')),
+                 id=new_event_id())
+            for event in events
+        ]
+        results = execute_in_batches(self.service, [
+            (lambda body=body: self.service.events().insert(calendarId='primary', body=body))
+            for body in bodies
+        ], ok_statuses=(409,))
+        for body, result in zip(bodies, results):
+            if result['ok']:
+                if result['result'] is None:
+                    # 409: an earlier attempt created it, with exactly this body
+                    result['result'] = body
+                self._mirror_apply(result['result'])
+        print(f"Bulk insert: {sum(r['ok'] for r in results)} of {len(results)} events created")
+        return results
+
+    def bulk_update_events(self, updates):
+        """
+        Applies partial updates to many events using batched patch requests.
+
+        `updates` is a list of (event_id, fields) pairs where fields is a partial
+        event resource. Returns one result dict per item, in order.
+        """
+        results = execute_in_batches(self.service, [
+            (lambda event_id=event_id, fields=fields: self.service.events().patch(
+                calendarId='primary', eventId=event_id, body=fields))
+            for event_id, fields in updates
+        ])
+        for result in results:
+            if result['ok']:
+                self._mirror_apply(result['result'])
+        print(f"Bulk update: {sum(r['ok'] for r in results)} of {len(results)} events updated")
+        return results
+
+    def bulk_cancel_events(self, event_ids):
+        """
+        Deletes many events using batched requests.
+
+        Events that are already gone count as cancelled. Returns one result dict
+        per item, in order.
+        """
+        results = execute_in_batches(self.service, [
+            (lambda event_id=event_id: self.service.events().delete(calendarId='primary', eventId=event_id))
+            for event_id in event_ids
+        ], ok_statuses=(404, 410))
+        for event_id, result in zip(event_ids, results):
+            if result['ok']:
+                self._mirror_remove(event_id)
+        print(f"Bulk cancel: {sum(r['ok'] for r in results)} of {len(results)} events cancelled")
+        return results
+
+    def check_for_conflicts(self, date, time, duration=timedelta(hours=1), buffer=timedelta(0)):
+        """
+        Checks if there are any conflicts in the Google Calendar for the specified date and time.
+
+        An event conflicts if it overlaps the requested start plus `duration`,
+        widened by `buffer` on both sides.
+        """
         try:
             # Parse the requested date
             if isinstance(date, str):
@@ -247,24 +415,12 @@ class GoogleCalendarHandler:
             # Make timezone-aware
             requested_datetime = requested_datetime.replace(tzinfo=timezone.utc)
 
-            start_check = requested_datetime - timedelta(hours=1)
-            end_check = requested_datetime + timedelta(hours=2)  # Buffer for 1-hour events
-
-            # Query Google Calendar for events in this timeframe
-            start_check_iso = start_check.isoformat()
-            end_check_iso = end_check.isoformat()
-
-            print(f"Checking conflicts between {start_check_iso} and {end_check_iso}")
+            start_check = requested_datetime - buffer
+            end_check = requested_datetime + duration + buffer
 
-            events_result = self.service.events().list(
-                calendarId='primary',
-                timeMin=start_check_iso,
-                timeMax=end_check_iso,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
+            print(f"Checking conflicts between {start_check.isoformat()} and {end_check.isoformat()}")
 
-            conflicts = events_result.get('items', [])
+            conflicts = self._get_interval_index(start_check, end_check).overlapping(start_check, end_check)
             if conflicts:
                 print(f"Found {len(conflicts)} potential conflicts")
                 return conflicts, None
@@ -279,208 +435,62 @@ class GoogleCalendarHandler:
 
     def reschedule_event(self, event_id, new_date, new_time):
         """Reschedule an existing event in Google Calendar."""
+        success, result = self.edit_event(event_id, {'date': new_date, 'time': new_time})
+        if not success:
+            return False, result
+
+        new_start_dt = parse_event_time(result['start']['dateTime'])
+        event_name = result.get('summary', 'Event')
+        formatted_time = new_start_dt.strftime("%-I:%M %p")
+        formatted_date = new_start_dt.strftime("%B %d")
+
+        return True, f"Successfully rescheduled '{event_name}' to {formatted_date} at {formatted_time}."
+
+    def find_free_slots(self, date, existing_event_time=None, num_slots=3, duration=timedelta(hours=1),
+                        granularity=timedelta(hours=1), working_hours=(dt_time(8, 0), dt_time(20, 0)),
+                        end_date=None):
+        """
+        Find available time slots on the specified date, respecting existing calendar events.
+
+        Slots are `duration` long, start on `granularity` boundaries and fall
+        within `working_hours` (None for the whole day). Pass `end_date` to
+        search every day up to and including that date.
+        """
         try:
-            # First, get the event
-            event = self.service.events().get(
-                calendarId='primary',
-                eventId=event_id
-            ).execute()
-
-            # Parse the provided date
-            if isinstance(new_date, str):
-                try:
-                    target_date = datetime.strptime(new_date, "%Y-%m-%d").date()
-                except ValueError:
-                    parsed_date = parse(new_date)
-                    if parsed_date:
-                        target_date = parsed_date.date()
-                    else:
-                        return False, "Could not parse the provided date"
-            else:
-                target_date = new_date.date()
-
-            # Parse the time
-            new_hour = 0
-            new_minute = 0
-            if isinstance(new_time, str):
-                time_match = re.search(r'(\d{1,2}):?(\d{2})?\s*(am|pm)?', new_time.lower())
-                if time_match:
-                    new_hour = int(time_match.group(1))
-                    new_minute = int(time_match.group(2) or "0")
-                    ampm = time_match.group(3)
-
-                    # Convert to 24-hour format
-                    if ampm and ampm.lower() == 'pm' and new_hour < 12:
-                        new_hour += 12
-                    if ampm and ampm.lower() == 'am' and new_hour == 12:
-                        new_hour = 0
-                else:
-                    return False, "Could not parse the provided time"
-
-            # Get the event duration
-            start_dt = datetime.fromisoformat(event['start'].get('dateTime').replace('Z', '+00:00'))
-            end_dt = datetime.fromisoformat(event['end'].get('dateTime').replace('Z', '+00:00'))
-            event_duration = end_dt - start_dt
-
-            # Create new start and end times with timezone
-            new_start_dt = datetime.combine(target_date,
-                                        datetime.strptime(f"{new_hour:02d}:{new_minute:02d}", "%H:%M").time())
-            # Make timezone-aware
-            new_start_dt = new_start_dt.replace(tzinfo=timezone.utc)
-            new_end_dt = new_start_dt + event_duration
-
-            # Update the event
-            event['start']['dateTime'] = new_start_dt.isoformat()
-            event['end']['dateTime'] = new_end_dt.isoformat()
-
-            updated_event = self.service.events().update(
-                calendarId='primary',
-                eventId=event_id,
-                body=event
-            ).execute()
-
-            event_name = updated_event.get('summary', 'Event')
-            formatted_time = new_start_dt.strftime("%-I:%M %p")
-            formatted_date = new_start_dt.strftime("%B %d")
-
-            return True, f"Successfully rescheduled '{event_name}' to {formatted_date} at {formatted_time}."
-
-        except Exception as e:
-            print(f"Error rescheduling event: {e}")
-            return False, f"Error rescheduling event: {str(e)}"
-
-    def find_free_slots(self, date, existing_event_time=None, num_slots=3):
-        """Find available time slots on the specified date, respecting existing calendar events."""
-        try:
-            # Parse the date if it's a string
-            if isinstance(date, str):
-                try:
-                    # Try standard format
-                    target_date = datetime.strptime(date, "%Y-%m-%d").date()
-                except ValueError:
-                    # Try dateparser
-                    parsed_date = parse(date)
-                    if parsed_date:
-                        target_date = parsed_date.date()
-                    else:
-                        return []
-            elif isinstance(date, datetime):
-                target_date = date.date()
-            else:
-                target_date = date
-
-            # Set up day boundaries (business hours)
-            morning_time = datetime.strptime("08:00", "%H:%M").time()
-            evening_time = datetime.strptime("20:00", "%H:%M").time()  # Extended to 8 PM
-
-            # Combine date and time
-            day_start = datetime.combine(target_date, morning_time)
-            day_end = datetime.combine(target_date, evening_time)
+            target_date = self._parse_slot_date(date)
+            if not target_date:
+                return []
+            last_date = self._parse_slot_date(end_date) if end_date else target_date
+            if not last_date:
+                return []
 
-            # Add timezone
-            day_start = day_start.replace(tzinfo=timezone.utc)
-            day_end = day_end.replace(tzinfo=timezone.utc)
+            range_start = datetime.combine(target_date, dt_time(0, 0), tzinfo=timezone.utc)
+            range_end = datetime.combine(last_date + timedelta(days=1), dt_time(0, 0), tzinfo=timezone.utc)
 
-            # Get events from Google Calendar
-            day_start_iso = day_start.isoformat()
-            day_end_iso = day_end.isoformat()
-
-            # Get all existing calendar events for the requested date
-            existing_events = []
-            try:
-                events_result = self.service.events().list(
-                    calendarId='primary',
-                    timeMin=day_start_iso,
-                    timeMax=day_end_iso,
-                    singleEvents=True,
-                    orderBy='startTime'
-                ).execute()
-
-                existing_events = events_result.get('items', [])
-                print(f"Found {len(existing_events)} existing events on {target_date}")
-
-                # Log found events for debugging
-                for event in existing_events:
-                    start = event['start'].get('dateTime', event['start'].get('date'))
-                    end = event['end'].get('dateTime', event['end'].get('date'))
-                    print(f"Existing event: {event.get('summary')} from {start} to {end}")
-            except Exception as cal_error:
-                print(f"Error querying calendar: {cal_error}")
-
-            # Define possible standard time slots (hourly slots from 8 AM to 7 PM)
-            # This creates slots like 8:00-9:00, 9:00-10:00, etc.
-            all_possible_slots = []
-            for hour in range(8, 19):  # 8 AM to 7 PM (ending at 8 PM)
-                am_pm = "AM" if hour < 12 else "PM"
-                disp_hour = hour if hour <= 12 else hour - 12
-                if disp_hour == 0:  # Handle 12 PM
-                    disp_hour = 12
-
-                start_time = f"{disp_hour}:00 {am_pm}"
-
-                next_hour = hour + 1
-                next_am_pm = "AM" if next_hour < 12 else "PM"
-                next_disp_hour = next_hour if next_hour <= 12 else next_hour - 12
-                if next_disp_hour == 0:  # Handle 12 PM
-                    next_disp_hour = 12
-
-                end_time = f"{next_disp_hour}:00 {next_am_pm}"
+            # All-day events don't block time slots
+            index = self._get_interval_index(range_start, range_end, include_all_day=False)
+            print(f"Searching {len(index)} events for free slots from {target_date} to {last_date}")
 
+            available_slots = []
+            for slot_start, slot_end in index.free_slots(range_start, range_end, duration=duration,
+                                                         granularity=granularity, working_hours=working_hours,
+                                                         limit=num_slots):
                 slot = {
-                    "start_time": start_time,
-                    "end_time": end_time,
-                    "duration_hours": 1,
-                    "start_hour": hour,
-                    "end_hour": hour + 1
+                    "start_time": slot_start.strftime("%I:%M %p").lstrip('0'),
+                    "end_time": slot_end.strftime("%I:%M %p").lstrip('0'),
+                    "duration_hours": duration.total_seconds() / 3600,
+                    "start_hour": slot_start.hour,
+                    "end_hour": slot_end.hour,
+                    "date": slot_start.date(),
+                    "start": slot_start,
+                    "end": slot_end
                 }
-                all_possible_slots.append(slot)
+                available_slots.append(slot)
+                print(f"Available slot found: {slot['start_time']} to {slot['end_time']} on {slot['date']}")
 
-            # Filter out slots that conflict with existing events
-            available_slots = []
-            for slot in all_possible_slots:
-                has_conflict = False
-
-                # Convert slot times to datetime objects for comparison
-                slot_start_hour = slot["start_hour"]
-                slot_end_hour = slot["end_hour"]
-
-                slot_start = datetime.combine(target_date, datetime.strptime(f"{slot_start_hour}:00", "%H:%M").time())
-                slot_end = datetime.combine(target_date, datetime.strptime(f"{slot_end_hour}:00", "%H:%M").time())
-
-                # Add timezone
-                slot_start = slot_start.replace(tzinfo=timezone.utc)
-                slot_end = slot_end.replace(tzinfo=timezone.utc)
-
-                # Check for conflicts with existing events
-                for event in existing_events:
-                    event_start = event['start'].get('dateTime', event['start'].get('date'))
-                    event_end = event['end'].get('dateTime', event['end'].get('date'))
-
-                    # Skip all-day events or events without proper datetime
-                    if 'T' not in event_start or 'T' not in event_end:
-                        continue
-
-                    # Convert to datetime objects
-                    event_start_dt = datetime.fromisoformat(event_start.replace('Z', '+00:00'))
-                    event_end_dt = datetime.fromisoformat(event_end.replace('Z', '+00:00'))
-
-                    # Check if event overlaps with this slot
-                    # Overlap occurs when event starts before slot ends AND event ends after slot starts
-                    if event_start_dt < slot_end and event_end_dt > slot_start:
-                        has_conflict = True
-                        print(f"Conflict found: {slot['start_time']} conflicts with event '{event.get('summary')}'")
-                        break
-
-                if not has_conflict:
-                    available_slots.append(slot)
-                    print(f"Available slot found: {slot['start_time']} to {slot['end_time']}")
-
-            # Return the available slots (up to num_slots)
-            if available_slots:
-                return available_slots[:num_slots]
-            else:
+            if not available_slots:
                 print("No available slots found after checking conflicts")
-                return []
+            return available_slots
 
         except Exception as e:
             print(f"ERROR in find_free_slots: {e}")
@@ -489,6 +499,68 @@ class GoogleCalendarHandler:
             # Return empty list instead of fake data when there's an error
             return []
 
+    def _parse_slot_date(self, date):
+        """Parse a date argument given as a string, datetime or date."""
+        if isinstance(date, str):
+            try:
+                return datetime.strptime(date, "%Y-%m-%d").date()
+            except ValueError:
+                parsed_date = parse(date)
+                return parsed_date.date() if parsed_date else None
+        if isinstance(date, datetime):
+            return date.date()
+        return date
+
+    def find_group_free_slots(self, calendar_ids, start_date, end_date=None, duration_minutes=60,
+                              working_hours=(8, 20), weekdays_only=False, include_primary=True, num_slots=5,
+                              skip_unreadable=False):
+        """
+        Find windows when everyone in calendar_ids (and by default the user) is free.
+
+        Busy times for all calendars are fetched with one freebusy query and
+        intersected on a per-minute grid. Returns a list of slot dictionaries.
+        If some calendars can't be read no slots are returned, unless
+        `skip_unreadable` is set; each slot then lists the calendars it
+        wasn't checked against under "unchecked_calendars".
+        """
+        try:
+            first_date = self._parse_slot_date(start_date)
+            last_date = self._parse_slot_date(end_date) if end_date else first_date + timedelta(days=6)
+            if not first_date or not last_date:
+                return []
+
+            calendar_ids = list(calendar_ids)
+            if include_primary and 'primary' not in calendar_ids:
+                calendar_ids.insert(0, 'primary')
+
+            range_start = datetime.combine(first_date, dt_time(0, 0), tzinfo=timezone.utc)
+            range_end = datetime.combine(last_date + timedelta(days=1), dt_time(0, 0), tzinfo=timezone.utc)
+
+            windows, errors = find_group_availability(
+                self.service, calendar_ids, range_start, range_end,
+                duration_minutes=duration_minutes, working_hours=working_hours,
+                weekdays_only=weekdays_only, limit=num_slots, skip_unreadable=skip_unreadable
+            )
+            for calendar_id, reason in errors.items():
+                print(f"Could not read availability for {calendar_id}: {reason}")
+
+            return [
+                {
+                    "date": window_start.date(),
+                    "start_time": window_start.strftime("%I:%M %p").lstrip('0'),
+                    "end_time": window_end.strftime("%I:%M %p").lstrip('0'),
+                    "duration_minutes": int((window_end - window_start).total_seconds() // 60),
+                    "start": window_start,
+                    "end": window_end,
+                    "unchecked_calendars": sorted(errors)
+                }
+                for window_start, window_end in windows
+            ]
+
+        except Exception as e:
+            print(f"Error finding group availability: {e}")
+            return []
+
     def cancel_event(self, event_id):
         """Cancel an event in Google Calendar."""
         try:
@@ -505,6 +577,7 @@ class GoogleCalendarHandler:
                 calendarId='primary',
                 eventId=event_id
             ).execute()
+            self._mirror_remove(event_id)
 
             return True, f"Successfully canceled '{event_name}'."
 
@@ -512,31 +585,37 @@ class GoogleCalendarHandler:
             print(f"Error canceling event: {e}")
             return False, f"Error canceling event: {str(e)}"
 
-    def find_events_by_query(self, query_text, start_date=None, end_date=None):
-        """Finds events matching a query in Google Calendar."""
+    def find_events_by_query(self, query_text, start_date=None, end_date=None, limit=10):
+        """
+        Finds events matching a spoken query, best match first.
+
+        With the mirror enabled this searches the local full-text index, which
+        tolerates partial words and small mishearings and ranks nearer events
+        higher. Without a start date it covers events from a day ago on, so
+        past events don't crowd out upcoming ones. Otherwise the API's q=
+        search is used over the next month.
+        """
         try:
+            if isinstance(start_date, str):
+                start_date = parse_event_time(start_date)
+            if isinstance(end_date, str):
+                end_date = parse_event_time(end_date)
+
+            if self.mirror:
+                self.mirror.ensure_fresh()
+                if not start_date:
+                    start_date = datetime.now(timezone.utc) - SEARCH_PAST_SLACK
+                results = self.search_index.search(query_text, limit=limit, start=start_date, end=end_date)
+                return [event for _, event in results]
+
             # If no dates provided, search within the next month
             if not start_date:
                 start_date = datetime.now().replace(tzinfo=timezone.utc)
             if not end_date:
                 end_date = (start_date + timedelta(days=30)).replace(tzinfo=timezone.utc)
 
-            # Ensure dates are properly formatted
-            start_date_iso = start_date.isoformat() if isinstance(start_date, datetime) else start_date
-            end_date_iso = end_date.isoformat() if isinstance(end_date, datetime) else end_date
-
-            # Execute the search
-            events_result = self.service.events().list(
-                calendarId='primary',
-                timeMin=start_date_iso,
-                timeMax=end_date_iso,
-                q=query_text,  # This is the search query
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-
-            events = events_result.get('items', [])
-            return events
+            events = self._list_events(start_date, end_date, query_text=query_text)
+            return events[:limit]
 
         except Exception as e:
             print(f"Error searching for events: {e}")
@@ -544,113 +623,156 @@ class GoogleCalendarHandler:
 
     def update_event_field(self, event_id, field, value):
         """Update a specific field of an event."""
+        success, result = self.edit_event(event_id, {field: value})
+        if not success:
+            return False, result
+        return True, f"Successfully updated the {field} of the event."
+
+    def edit_event(self, event_id, changes, max_retries=2):
+        """
+        Apply several field changes to an event with a single conditional PATCH.
+
+        `changes` maps field names (name, location, details, date, time,
+        reminder) to new values. The patch carries the event's ETag in
+        If-Match, so a concurrent edit makes it fail with 412; the event is
+        then refetched and the patch rebuilt and retried. The current event
+        comes from the mirror when possible, so a typical edit costs one
+        round trip. Returns (True, updated_event) or (False, error message).
+        """
+        self.edit_stats['edits'] += 1
         try:
-            # First, get the event
-            event = self.service.events().get(
-                calendarId='primary',
-                eventId=event_id
-            ).execute()
+            event = self._cached_event(event_id)
+            if not event:
+                event = self._fetch_event(event_id)
 
-            # Update the appropriate field
+            for attempt in range(max_retries + 1):
+                patch, error = self._build_patch(event, changes)
+                if error:
+                    return False, error
+
+                request = self.service.events().patch(
+                    calendarId='primary',
+                    eventId=event_id,
+                    body=patch
+                )
+                if event.get('etag'):
+                    request.headers['If-Match'] = event['etag']
+
+                try:
+                    self.edit_stats['round_trips'] += 1
+                    updated_event = request.execute()
+                except HttpError as error:
+                    if error.resp.status != 412 or attempt == max_retries:
+                        raise
+                    # Someone else changed the event since we read it
+                    self.edit_stats['precondition_failures'] += 1
+                    print(f"Event {event_id} changed remotely, refetching before retrying the edit")
+                    event = self._fetch_event(event_id)
+                    continue
+
+                self._mirror_apply(updated_event)
+                return True, updated_event
+
+        except Exception as e:
+            print(f"Error updating event: {e}")
+            return False, f"Error updating event: {str(e)}"
+
+    def _cached_event(self, event_id):
+        """Returns the mirrored copy of an event if it carries an ETag to edit against."""
+        if not self.mirror:
+            return None
+        with self.mirror.lock:
+            entry = self.mirror.events.get(event_id)
+        if entry and entry[2].get('etag'):
+            return entry[2]
+        return None
+
+    def _fetch_event(self, event_id):
+        """Fetches the current version of an event from the API."""
+        self.edit_stats['round_trips'] += 1
+        event = self.service.events().get(
+            calendarId='primary',
+            eventId=event_id
+        ).execute()
+        self._mirror_apply(event)
+        return event
+
+    def _build_patch(self, event, changes):
+        """Builds a partial event resource for the requested changes. Returns (patch, error)."""
+        patch = {}
+        new_date = None
+        new_time = None
+
+        for field, value in changes.items():
             if field == "name" or field == "summary":
-                event['summary'] = value
+                patch['summary'] = value
             elif field == "location":
-                event['location'] = value
+                patch['location'] = value
             elif field == "details" or field == "description":
-                event['description'] = value
+                patch['description'] = value
             elif field == "date":
-                # Parse the new date
-                if isinstance(value, str):
-                    try:
-                        new_date = datetime.strptime(value, "%Y-%m-%d").date()
-                    except ValueError:
-                        parsed_date = parse(value)
-                        if parsed_date:
-                            new_date = parsed_date.date()
-                        else:
-                            return False, "Could not parse the new date"
-                else:
-                    new_date = value.date()
-
-                # Keep the same time, just change the date
-                start_dt = datetime.fromisoformat(event['start'].get('dateTime').replace('Z', '+00:00'))
-                end_dt = datetime.fromisoformat(event['end'].get('dateTime').replace('Z', '+00:00'))
-
-                # Create new datetime objects with the new date
-                new_start_dt = datetime.combine(new_date, start_dt.time())
-                new_start_dt = new_start_dt.replace(tzinfo=timezone.utc)
-
-                # Calculate the duration and apply it to the end time
-                duration = end_dt - start_dt
-                new_end_dt = new_start_dt + duration
-
-                # Update the event times
-                event['start']['dateTime'] = new_start_dt.isoformat()
-                event['end']['dateTime'] = new_end_dt.isoformat()
-
+                new_date = self._parse_slot_date(value)
+                if not new_date:
+                    return None, "Could not parse the new date"
             elif field == "time":
-                # Parse the new time
-                time_match = re.search(r'(\d{1,2}):?(\d{2})?\s*(am|pm)?', value.lower())
-                if time_match:
-                    hour = int(time_match.group(1))
-                    minute = int(time_match.group(2) or "0")
-                    ampm = time_match.group(3)
-
-                    # Convert to 24-hour format
-                    if ampm and ampm.lower() == 'pm' and hour < 12:
-                        hour += 12
-                    if ampm and ampm.lower() == 'am' and hour == 12:
-                        hour = 0
-                else:
-                    return False, "Could not parse the new time"
-
-                # Get current start and end times
-                start_dt = datetime.fromisoformat(event['start'].get('dateTime').replace('Z', '+00:00'))
-                end_dt = datetime.fromisoformat(event['end'].get('dateTime').replace('Z', '+00:00'))
-
-                # Calculate event duration
-                duration = end_dt - start_dt
-
-                # Create new start time with the same date
-                new_time = datetime.strptime(f"{hour:02d}:{minute:02d}", "%H:%M").time()
-                new_start_dt = datetime.combine(start_dt.date(), new_time)
-                new_start_dt = new_start_dt.replace(tzinfo=timezone.utc)
-
-                # Apply the same duration to get the new end time
-                new_end_dt = new_start_dt + duration
-
-                # Update the event times
-                event['start']['dateTime'] = new_start_dt.isoformat()
-                event['end']['dateTime'] = new_end_dt.isoformat()
-
+                new_time = self._parse_time_value(value)
+                if not new_time:
+                    return None, "Could not parse the new time"
             elif field == "reminder":
                 # Parse the reminder value
                 reminder_minutes = 10  # Default
                 if value:
-                    # Try to extract the minutes
-                    reminder_match = re.search(r'(\d+)\s*minutes?', value)
+                    reminder_match = re.search(r'(\d+)\s*minutes?', str(value))
                     if reminder_match:
                         reminder_minutes = int(reminder_match.group(1))
-                    elif value.isdigit():
+                    elif str(value).isdigit():
                         reminder_minutes = int(value)
 
-                # Update the reminders
-                event['reminders'] = {
+                patch['reminders'] = {
                     'useDefault': False,
                     'overrides': [
                         {'method': 'popup', 'minutes': reminder_minutes},
                     ],
                 }
-
-            # Update the event
-            updated_event = self.service.events().update(
-                calendarId='primary',
-                eventId=event_id,
-                body=event
-            ).execute()
-
-            return True, f"Successfully updated the {field} of the event."
-
-        except Exception as e:
-            print(f"Error updating event field: {e}")
-            return False, f"Error updating event: {str(e)}"
\ No newline at end of file
+            else:
+                return None, f"Unknown event field '{field}'"
+
+        if new_date or new_time:
+            start_value = event['start'].get('dateTime')
+            end_value = event['end'].get('dateTime')
+            if not start_value or not end_value:
+                return None, "All-day events can't be moved to a specific time"
+
+            start_dt = parse_event_time(start_value)
+            end_dt = parse_event_time(end_value)
+            duration = end_dt - start_dt
+
+            # Keep whichever of the date and time isn't changing
+            new_start_dt = datetime.combine(new_date or start_dt.date(), new_time or start_dt.timetz())
+            if new_time:
+                new_start_dt = new_start_dt.replace(tzinfo=start_dt.tzinfo)
+            new_end_dt = new_start_dt + duration
+
+            patch['start'] = dict(event['start'], dateTime=new_start_dt.isoformat())
+            patch['end'] = dict(event['end'], dateTime=new_end_dt.isoformat())
+
+        return patch, None
+
+    def _parse_time_value(self, value):
+        """Parse a spoken or typed time like '3pm' or '15:30' into a time object."""
+        time_match = re.search(r'(\d{1,2}):?(\d{2})?\s*(am|pm)?', str(value).lower())
+        if not time_match:
+            return None
+
+        hour = int(time_match.group(1))
+        minute = int(time_match.group(2) or "0")
+        ampm = time_match.group(3)
+
+        # Convert to 24-hour format
+        if ampm and ampm.lower() == 'pm' and hour < 12:
+            hour += 12
+        if ampm and ampm.lower() == 'am' and hour == 12:
+            hour = 0
+        if hour > 23 or minute > 59:
+            return None
+        return dt_time(hour, minute)
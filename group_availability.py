@@ -0,0 +1,144 @@
+from datetime import timedelta, timezone
+import numpy as np
+from calendar_mirror import parse_event_time
+
+# The freebusy endpoint accepts at most 50 calendars per query
+FREEBUSY_MAX_CALENDARS = 50
+MINUTES_PER_DAY = 24 * 60
+
+
+def fetch_busy_intervals(service, calendar_ids, range_start, range_end):
+    """
+    Fetches busy intervals for several calendars with freebusy().query.
+
+    Returns (busy, errors) where busy maps each calendar id to a list of
+    (start, end) datetimes and errors maps calendar ids Google couldn't read
+    to the reported reason.
+    """
+    busy = {}
+    errors = {}
+    for offset in range(0, len(calendar_ids), FREEBUSY_MAX_CALENDARS):
+        chunk = calendar_ids[offset:offset + FREEBUSY_MAX_CALENDARS]
+        body = {
+            'timeMin': range_start.isoformat(),
+            'timeMax': range_end.isoformat(),
+            'items': [{'id': calendar_id} for calendar_id in chunk],
+        }
+        result = service.freebusy().query(body=body).execute()
+
+        for calendar_id, info in result.get('calendars', {}).items():
+            if info.get('errors'):
+                errors[calendar_id] = info['errors'][0].get('reason', 'unknown')
+            busy[calendar_id] = [
+                (parse_event_time(block['start']), parse_event_time(block['end']))
+                for block in info.get('busy', [])
+            ]
+    return busy, errors
+
+
+def rasterize_busy(busy, calendar_ids, range_start, total_minutes):
+    """
+    Builds a boolean busy-minute matrix with one row per calendar.
+
+    Busy intervals are written as +1/-1 markers into a difference array and a
+    cumulative sum along each row turns them into per-minute occupancy, so the
+    cost doesn't depend on interval length.
+    """
+    rows, starts, ends = [], [], []
+    for row, calendar_id in enumerate(calendar_ids):
+        for start, end in busy.get(calendar_id, []):
+            rows.append(row)
+            starts.append((start - range_start).total_seconds() // 60)
+            # Round partial minutes up so a busy block is never shortened
+            ends.append(-((range_start - end).total_seconds() // 60))
+
+    diff = np.zeros((len(calendar_ids), total_minutes + 1), dtype=np.int32)
+    if rows:
+        rows = np.asarray(rows, dtype=np.intp)
+        starts = np.clip(np.asarray(starts, dtype=np.int64), 0, total_minutes)
+        ends = np.clip(np.asarray(ends, dtype=np.int64), 0, total_minutes)
+        np.add.at(diff, (rows, starts), 1)
+        np.add.at(diff, (rows, ends), -1)
+    return np.cumsum(diff[:, :-1], axis=1) > 0
+
+
+def working_minutes_mask(range_start, total_minutes, working_hours=(8, 20), weekdays_only=False, tz=timezone.utc):
+    """
+    Returns a boolean mask of the minutes that fall inside working hours.
+
+    Working hours are whole local hours in `tz`. The UTC offset at the start of
+    the range is used throughout, so a DST change inside the range shifts the
+    window by an hour on the days after it.
+    """
+    local_start = range_start.astimezone(tz)
+    first_minute = local_start.hour * 60 + local_start.minute
+    minutes = np.arange(total_minutes, dtype=np.int64) + first_minute
+    minute_of_day = minutes % MINUTES_PER_DAY
+
+    mask = np.ones(total_minutes, dtype=bool)
+    if working_hours:
+        mask &= (minute_of_day >= working_hours[0] * 60) & (minute_of_day < working_hours[1] * 60)
+    if weekdays_only:
+        weekday = (local_start.weekday() + minutes // MINUTES_PER_DAY) % 7
+        mask &= weekday < 5
+    return mask
+
+
+def find_common_free_windows(busy_matrix, range_start, duration_minutes, allowed_mask=None, max_busy=0,
+                             limit=None):
+    """
+    Finds windows where at most `max_busy` calendars are busy for at least `duration_minutes`.
+
+    Returns a list of (start, end) datetimes covering each whole free run, in
+    chronological order.
+    """
+    busy_count = busy_matrix.sum(axis=0)
+    free = busy_count <= max_busy
+    if allowed_mask is not None:
+        free &= allowed_mask
+
+    # Run boundaries are where the padded free vector changes value
+    edges = np.diff(np.concatenate(([0], free.view(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    long_enough = (run_ends - run_starts) >= duration_minutes
+    run_starts = run_starts[long_enough]
+    run_ends = run_ends[long_enough]
+    if limit is not None:
+        run_starts = run_starts[:limit]
+        run_ends = run_ends[:limit]
+
+    return [
+        (range_start + timedelta(minutes=int(start)), range_start + timedelta(minutes=int(end)))
+        for start, end in zip(run_starts, run_ends)
+    ]
+
+
+def find_group_availability(service, calendar_ids, range_start, range_end, duration_minutes=60,
+                            working_hours=(8, 20), weekdays_only=False, tz=timezone.utc, max_busy=0,
+                            limit=None, skip_unreadable=False):
+    """
+    Finds common free windows across calendars using a single freebusy query per 50 calendars.
+
+    Returns (windows, errors), where windows is a list of (start, end)
+    datetimes and errors lists calendars whose availability couldn't be read.
+    An unreadable calendar would otherwise look completely free, so no
+    windows are returned when there are errors unless `skip_unreadable`
+    is set, in which case the windows only cover the readable calendars.
+    """
+    # Work on whole minutes so every column is one minute
+    range_start = range_start.replace(second=0, microsecond=0)
+    total_minutes = int((range_end - range_start).total_seconds() // 60)
+    if total_minutes <= 0:
+        return [], {}
+
+    busy, errors = fetch_busy_intervals(service, list(calendar_ids), range_start, range_end)
+    if errors and not skip_unreadable:
+        return [], errors
+    readable = [calendar_id for calendar_id in calendar_ids if calendar_id not in errors]
+    busy_matrix = rasterize_busy(busy, readable, range_start, total_minutes)
+    allowed = working_minutes_mask(range_start, total_minutes, working_hours=working_hours,
+                                   weekdays_only=weekdays_only, tz=tz)
+    windows = find_common_free_windows(busy_matrix, range_start, duration_minutes, allowed_mask=allowed,
+                                       max_busy=max_busy, limit=limit)
+    return windows, errors
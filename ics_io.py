@@ -0,0 +1,438 @@
+import re
+import sys
+from functools import lru_cache
+from datetime import datetime, time, timedelta, timezone
+import pytz
+from dateutil.rrule import rruleset, rrulestr
+from calendar_batch import execute_in_batches
+from calendar_outbox import idempotent_event_id
+from event_store import DEFAULT_DURATION, EventStore, is_all_day
+
+DEFAULT_TIMEZONE = "Europe/London"
+
+# Recurring events are expanded this far ahead of the import
+DEFAULT_HORIZON = timedelta(days=365)
+
+DURATION_PATTERN = re.compile(
+    r"^(?P<sign>[+-])?P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?"
+    r"(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$"
+)
+
+TEXT_ESCAPES = {"n": "\n", "N": "\n", "\\": "\\", ";": ";", ",": ","}
+
+
+def unfold_lines(lines):
+    """Yields logical content lines from physical ones, joining RFC 5545 folded continuations."""
+    current = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t"):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def parse_content_line(line):
+    """Splits "NAME;PARAM=VALUE:value" into (name, params, value), respecting quoted parameters."""
+    if '"' not in line:
+        # Fast path for the common case of no quoted parameter values
+        head, colon, value = line.partition(":")
+        if not colon:
+            return None
+        name, _, rest = head.partition(";")
+        params = {}
+        if rest:
+            for part in rest.split(";"):
+                key, _, param_value = part.partition("=")
+                params[key.upper()] = param_value
+        return name.upper(), params, value
+
+    in_quotes = False
+    for index, ch in enumerate(line):
+        if ch == '"':
+            in_quotes = not in_quotes
+        elif ch == ":" and not in_quotes:
+            head, value = line[:index], line[index + 1:]
+            break
+    else:
+        return None
+
+    parts = re.findall(r'(?:[^;"]|"[^"]*")+', head)
+    params = {}
+    for part in parts[1:]:
+        key, _, param_value = part.partition("=")
+        params[key.upper()] = param_value.strip('"')
+    return parts[0].upper(), params, value
+
+
+def unescape_text(value):
+    return re.sub(r"\\(.)", lambda match: TEXT_ESCAPES.get(match.group(1), match.group(1)), value)
+
+
+def escape_text(value):
+    return (value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def parse_duration(value):
+    match = DURATION_PATTERN.match(value.strip())
+    if not match:
+        return None
+    parts = {key: int(amount) for key, amount in match.groupdict().items() if key != "sign" and amount}
+    duration = timedelta(**parts)
+    return -duration if match.group("sign") == "-" else duration
+
+
+def _basic_datetime(value):
+    """Parses the basic "YYYYMMDDTHHMMSS" form; much cheaper than strptime on large files."""
+    if len(value) < 15 or value[8] != "T" or not (value[:8] + value[9:15]).isdigit():
+        raise ValueError(f"bad date-time '{value}'")
+    return datetime(int(value[0:4]), int(value[4:6]), int(value[6:8]),
+                    int(value[9:11]), int(value[11:13]), int(value[13:15]))
+
+
+@lru_cache(maxsize=None)
+def _named_zone(tzid):
+    try:
+        return pytz.timezone(tzid)
+    except pytz.UnknownTimeZoneError:
+        # Outlook writes Windows zone names; the caller falls back to the assistant's zone
+        return None
+
+
+def _zone(params, default_tz):
+    if "TZID" not in params:
+        return default_tz
+    return _named_zone(params["TZID"]) or default_tz
+
+
+def parse_ics_datetime(value, params, default_tz):
+    """
+    Parses a DTSTART/DTEND style value into (naive local datetime, tz, is_all_day).
+
+    Recurrence rules are expanded on naive local times so occurrences keep
+    their wall-clock time across DST changes.
+    """
+    value = value.strip()
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return datetime.combine(datetime.strptime(value[:8], "%Y%m%d").date(), time(0, 0)), default_tz, True
+    if value.endswith("Z"):
+        utc_value = _basic_datetime(value[:-1]).replace(tzinfo=timezone.utc)
+        return utc_value.astimezone(default_tz).replace(tzinfo=None), default_tz, False
+    return _basic_datetime(value), _zone(params, default_tz), False
+
+
+@lru_cache(maxsize=4096)
+def _day_offset(tz, day):
+    """The pytz offset in force all day, or None on a day the clocks change."""
+    first = tz.localize(datetime.combine(day, time.min)).tzinfo
+    last = tz.localize(datetime.combine(day, time.max)).tzinfo
+    return first if first is last else None
+
+
+def _localize(tz, naive):
+    # pytz localize is slow enough to dominate large imports, so reuse the day's offset where it can't change
+    if not hasattr(tz, "localize"):
+        return naive.replace(tzinfo=tz)
+    offset = _day_offset(tz, naive.date())
+    return naive.replace(tzinfo=offset) if offset else tz.localize(naive)
+
+
+def iter_vevents(lines):
+    """
+    Streams VEVENT components from an iCalendar file as {NAME: [(params, value), ...]} dicts.
+
+    Alarms are folded into the event as VALARM_TRIGGER entries; other nested
+    components and VTIMEZONE definitions are skipped.
+    """
+    depth = []
+    event = None
+    for line in unfold_lines(lines):
+        parsed = parse_content_line(line)
+        if not parsed:
+            continue
+        name, params, value = parsed
+        if name == "BEGIN":
+            depth.append(value.upper())
+            if depth == ["VCALENDAR", "VEVENT"] or depth == ["VEVENT"]:
+                event = {}
+            continue
+        if name == "END":
+            if depth and depth[-1] == "VEVENT" and event is not None:
+                yield event
+                event = None
+            if depth:
+                depth.pop()
+            continue
+        if event is None:
+            continue
+        if depth[-1] == "VALARM":
+            if name == "TRIGGER":
+                event.setdefault("VALARM_TRIGGER", []).append((params, value))
+        elif depth[-1] == "VEVENT":
+            event.setdefault(name, []).append((params, value))
+
+
+def _first(event, name, default=None):
+    values = event.get(name)
+    return values[0] if values else (None, default)
+
+
+def _localise_until(rule, tz):
+    """Rewrites a UTC UNTIL as local wall time, since occurrences are expanded on naive local times."""
+    def convert(match):
+        until = datetime.strptime(match.group(1), "%Y%m%dT%H%M%S").replace(tzinfo=timezone.utc)
+        return "UNTIL=" + until.astimezone(tz).strftime("%Y%m%dT%H%M%S")
+    return re.sub(r"UNTIL=(\d{8}T\d{6})Z", convert, rule)
+
+
+class IcsImporter:
+    """
+    Streaming iCalendar importer into the event store, optionally pushing to Google.
+
+    The file is read line by line and events are written in executemany
+    batches, so memory stays flat on large files. One-off events stream
+    straight through. Recurring events are held until the end of the file
+    so that modified occurrences (RECURRENCE-ID) can replace the generated
+    ones, then expanded up to the horizon. Each occurrence gets a stable
+    external id, so importing the same file twice adds nothing new, and a
+    deterministic Google event id, so re-pushing only gets 409s.
+    """
+
+    def __init__(self, event_store=None, calendar_service=None, tz_name=DEFAULT_TIMEZONE,
+                 horizon=DEFAULT_HORIZON, batch_size=1000, now=None):
+        self.event_store = event_store or EventStore()
+        self.storage = self.event_store.storage
+        self.calendar_service = calendar_service
+        self.tz = pytz.timezone(tz_name)
+        self.horizon_end = (now or datetime.now(self.tz)).astimezone(self.tz).replace(tzinfo=None) + horizon
+        self.batch_size = batch_size
+
+        self.pending = []
+        self.imported = 0
+        self.pushed = 0
+        self.push_failures = 0
+        self.skipped = 0
+
+    def import_file(self, path):
+        """Imports every event in an .ics file. Returns the number of occurrences written."""
+        with open(path, encoding="utf-8", errors="replace", newline="") as lines:
+            return self.import_lines(lines)
+
+    def import_lines(self, lines):
+        self.storage.ensure_schema()
+        masters = []
+        overridden = {}  # uid -> set of naive local starts replaced by a RECURRENCE-ID event
+
+        for vevent in iter_vevents(lines):
+            try:
+                if "RRULE" in vevent or "RDATE" in vevent:
+                    masters.append(vevent)
+                    continue
+                occurrence = self._occurrence(vevent)
+                params, recurrence_id = _first(vevent, "RECURRENCE-ID")
+                if recurrence_id:
+                    original, _, _ = parse_ics_datetime(recurrence_id, params, self.tz)
+                    overridden.setdefault(occurrence['uid'], set()).add(original)
+                    occurrence['external_id'] = f"{occurrence['uid']}/{original:%Y%m%dT%H%M%S}"
+                self._queue(occurrence)
+            except (ValueError, KeyError) as e:
+                print(f"Skipping unreadable event: {e}")
+                self.skipped += 1
+
+        for vevent in masters:
+            try:
+                for occurrence in self._expand(vevent, overridden):
+                    self._queue(occurrence)
+            except (ValueError, KeyError) as e:
+                print(f"Skipping unreadable recurring event: {e}")
+                self.skipped += 1
+        self._flush()
+        return self.imported
+
+    def _occurrence(self, vevent, start=None):
+        """Builds an event store record for a VEVENT, optionally at a specific (naive local) start."""
+        start_params, start_value = _first(vevent, "DTSTART")
+        if not start_value:
+            raise ValueError("event has no DTSTART")
+        dtstart, tz, all_day = parse_ics_datetime(start_value, start_params, self.tz)
+
+        end_params, end_value = _first(vevent, "DTEND")
+        if end_value:
+            dtend, _, _ = parse_ics_datetime(end_value, end_params, self.tz)
+            duration = dtend - dtstart
+        else:
+            _, duration_value = _first(vevent, "DURATION")
+            duration = parse_duration(duration_value) if duration_value else None
+            if duration is None:
+                duration = timedelta(days=1) if all_day else DEFAULT_DURATION
+
+        reminder_minutes = None
+        for params, trigger in vevent.get("VALARM_TRIGGER", []):
+            offset = parse_duration(trigger)
+            if offset is not None and offset <= timedelta(0) and params.get("RELATED", "START") == "START":
+                reminder_minutes = int(-offset.total_seconds() // 60)
+                break
+
+        uid = _first(vevent, "UID", "")[1] or f"{start_value}-{_first(vevent, 'SUMMARY', '')[1]}"
+        # Occurrences of a recurring event are keyed by their original start
+        external_id = uid if start is None else f"{uid}/{start:%Y%m%dT%H%M%S}"
+        start = start or dtstart
+        return {
+            'uid': uid,
+            'external_id': external_id,
+            'title': unescape_text(_first(vevent, "SUMMARY", "")[1]) or "Untitled event",
+            'start': _localize(tz, start),
+            'end': _localize(tz, start + duration),
+            'timezone': getattr(tz, "zone", DEFAULT_TIMEZONE),
+            'location': unescape_text(_first(vevent, "LOCATION", "")[1]) or None,
+            'details': unescape_text(_first(vevent, "DESCRIPTION", "")[1]) or None,
+            'reminder_minutes': reminder_minutes,
+            'all_day': all_day,
+        }
+
+    def _expand(self, vevent, overridden):
+        start_params, start_value = _first(vevent, "DTSTART")
+        dtstart, tz, _ = parse_ics_datetime(start_value, start_params, self.tz)
+
+        rules = rruleset()
+        for _, rule in vevent.get("RRULE", []):
+            rules.rrule(rrulestr(_localise_until(rule, tz), dtstart=dtstart))
+        for name, add in (("RDATE", rules.rdate), ("EXDATE", rules.exdate)):
+            for params, values in vevent.get(name, []):
+                for value in values.split(","):
+                    add(parse_ics_datetime(value, params, tz)[0])
+
+        uid = _first(vevent, "UID", "")[1]
+        skip = overridden.get(uid, set())
+        for start in rules.between(dtstart, self.horizon_end, inc=True):
+            if start not in skip:
+                yield self._occurrence(vevent, start)
+
+    def _queue(self, occurrence):
+        self.pending.append(occurrence)
+        if len(self.pending) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        with self.storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                inserted = self.event_store.add_many(batch, cursor)
+                conn.commit()
+            finally:
+                cursor.close()
+        self.imported += inserted
+        if self.calendar_service:
+            self._push(batch)
+
+    def _push(self, batch):
+        """Creates the batch in Google Calendar with batched requests; 409 means already pushed."""
+        events = self.calendar_service.events()
+        results = execute_in_batches(self.calendar_service, [
+            lambda body=self._calendar_body(occurrence): events.insert(calendarId='primary', body=body)
+            for occurrence in batch
+        ], ok_statuses=(409,))
+        for result in results:
+            if result['ok']:
+                self.pushed += 1
+            else:
+                self.push_failures += 1
+
+    @staticmethod
+    def _calendar_body(occurrence):
+        if occurrence['all_day']:
+            start = {'date': occurrence['start'].date().isoformat()}
+            end = {'date': occurrence['end'].date().isoformat()}
+        else:
+            start = {'dateTime': occurrence['start'].isoformat(), 'timeZone': occurrence['timezone']}
+            end = {'dateTime': occurrence['end'].isoformat(), 'timeZone': occurrence['timezone']}
+        body = {
+            'id': idempotent_event_id(f"ics:{occurrence['external_id']}"),
+            'summary': occurrence['title'],
+            'start': start,
+            'end': end,
+        }
+        if occurrence['location']:
+            body['location'] = occurrence['location']
+        if occurrence['details']:
+            body['description'] = occurrence['details']
+        if occurrence['reminder_minutes'] is not None:
+            body['reminders'] = {'useDefault': False, 'overrides': [
+                {'method': 'popup', 'minutes': occurrence['reminder_minutes']}]}
+        return body
+
+
+def _fold(line):
+    """Folds a content line at 75 octets, as RFC 5545 requires."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        # Don't split a multi-byte character
+        while cut and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _utc_stamp(value):
+    return value.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def export_ics(events, out, product_id="-//fyp3//Voice Assistant//EN"):
+    """
+    Streams events (event store dicts) to a writable text file as an iCalendar document.
+
+    Events are written one at a time, so exporting a large store never holds
+    the whole calendar in memory. Returns the number of events written.
+    """
+    stamp = _utc_stamp(datetime.now(timezone.utc))
+    out.write(f"BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:{product_id}\r\nCALSCALE:GREGORIAN\r\n")
+    count = 0
+    for event in events:
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:{event.get('external_id') or str(event['id']) + '@fyp3'}",
+            f"DTSTAMP:{stamp}",
+        ]
+        if is_all_day(event):
+            lines += [f"DTSTART;VALUE=DATE:{event['start']:%Y%m%d}", f"DTEND;VALUE=DATE:{event['end']:%Y%m%d}"]
+        else:
+            lines += [f"DTSTART:{_utc_stamp(event['start'])}", f"DTEND:{_utc_stamp(event['end'])}"]
+        lines.append(f"SUMMARY:{escape_text(event['title'])}")
+        if event.get('location'):
+            lines.append(f"LOCATION:{escape_text(event['location'])}")
+        if event.get('details'):
+            lines.append(f"DESCRIPTION:{escape_text(event['details'])}")
+        if event.get('reminder_minutes') is not None:
+            lines += ["BEGIN:VALARM", "ACTION:DISPLAY", f"DESCRIPTION:{escape_text(event['title'])}",
+                      f"TRIGGER:-PT{event['reminder_minutes']}M", "END:VALARM"]
+        lines.append("END:VEVENT")
+        out.write("".join(_fold(line) for line in lines))
+        count += 1
+    out.write("END:VCALENDAR\r\n")
+    return count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "import":
+        print(f"Imported {IcsImporter().import_file(sys.argv[2])} events")
+    elif len(sys.argv) == 3 and sys.argv[1] == "export":
+        with open(sys.argv[2], "w", encoding="utf-8", newline="") as output:
+            print(f"Exported {export_ics(EventStore().iter_events(), output)} events")
+    else:
+        print("Usage: python ics_io.py import <file.ics> | export <file.ics>")
+        sys.exit(1)
@@ -0,0 +1,159 @@
+from bisect import bisect_right
+from datetime import datetime, time, timedelta, timezone
+from calendar_mirror import parse_event_time
+
+
+def event_interval(event, tz=None):
+    """
+    Returns (start, end, is_all_day) for a Calendar event resource, or None if it has no times.
+
+    All-day dates start at local midnight in `tz` (see parse_event_time).
+    """
+    start = event.get('start', {})
+    end = event.get('end', {})
+    start_value = start.get('dateTime', start.get('date'))
+    end_value = end.get('dateTime', end.get('date'))
+    if not start_value or not end_value:
+        return None
+    is_all_day = 'T' not in start_value or 'T' not in end_value
+    return parse_event_time(start_value, tz), parse_event_time(end_value, tz), is_all_day
+
+
+def _local_datetime(day, clock_time, tz):
+    """Combines a date and time in tz, handling both pytz and standard tzinfo objects."""
+    if hasattr(tz, 'localize'):
+        return tz.localize(datetime.combine(day, clock_time))
+    return datetime.combine(day, clock_time, tzinfo=tz)
+
+
+class IntervalIndex:
+    """
+    Static augmented interval tree over event intervals.
+
+    Intervals are sorted by start and laid out as an implicit balanced tree
+    over the sorted array, where each node also records the maximum end time
+    in its subtree. Overlap queries cost O(log n + k). Overlapping intervals
+    are also merged into disjoint busy blocks so free gaps can be enumerated
+    with a binary search.
+    """
+
+    def __init__(self, intervals=()):
+        items = sorted(intervals, key=lambda item: (item[0], item[1]))
+        self.starts = [item[0] for item in items]
+        self.ends = [item[1] for item in items]
+        self.payloads = [item[2] if len(item) > 2 else None for item in items]
+        self.max_end = list(self.ends)
+        if items:
+            self._build(0, len(items))
+
+        # Disjoint busy blocks, sorted by start
+        self.block_starts = []
+        self.block_ends = []
+        for start, end in zip(self.starts, self.ends):
+            if self.block_ends and start <= self.block_ends[-1]:
+                if end > self.block_ends[-1]:
+                    self.block_ends[-1] = end
+            else:
+                self.block_starts.append(start)
+                self.block_ends.append(end)
+
+    @classmethod
+    def from_events(cls, events, include_all_day=True, tz=None):
+        """Builds an index from Calendar event resources, parsing each timestamp once."""
+        intervals = []
+        for event in events:
+            parsed = event_interval(event, tz)
+            if not parsed:
+                continue
+            start, end, is_all_day = parsed
+            if is_all_day and not include_all_day:
+                continue
+            intervals.append((start, end, event))
+        return cls(intervals)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _build(self, lo, hi):
+        mid = (lo + hi) // 2
+        best = self.ends[mid]
+        if lo < mid:
+            best = max(best, self._build(lo, mid))
+        if mid + 1 < hi:
+            best = max(best, self._build(mid + 1, hi))
+        self.max_end[mid] = best
+        return best
+
+    def overlapping(self, start, end):
+        """Returns the payloads of intervals overlapping [start, end), ordered by start."""
+        results = []
+        self._collect(0, len(self.starts), start, end, results)
+        return results
+
+    def _collect(self, lo, hi, start, end, results):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        # Nothing in this subtree ends after the query starts
+        if self.max_end[mid] <= start:
+            return
+        self._collect(lo, mid, start, end, results)
+        if self.starts[mid] < end:
+            if self.ends[mid] > start:
+                results.append(self.payloads[mid])
+            # Right subtree starts no earlier than this node
+            self._collect(mid + 1, hi, start, end, results)
+
+    def has_overlap(self, start, end):
+        """Returns True if any interval overlaps [start, end)."""
+        index = bisect_right(self.block_ends, start)
+        return index < len(self.block_starts) and self.block_starts[index] < end
+
+    def gaps(self, start, end):
+        """Yields (gap_start, gap_end) free periods inside [start, end)."""
+        cursor = start
+        index = bisect_right(self.block_ends, start)
+        while index < len(self.block_starts) and self.block_starts[index] < end:
+            if self.block_starts[index] > cursor:
+                yield cursor, self.block_starts[index]
+            cursor = max(cursor, self.block_ends[index])
+            index += 1
+        if cursor < end:
+            yield cursor, end
+
+    def free_slots(self, range_start, range_end, duration=timedelta(hours=1),
+                   granularity=timedelta(hours=1), working_hours=(time(8, 0), time(20, 0)),
+                   tz=timezone.utc, limit=None):
+        """
+        Yields (slot_start, slot_end) free slots of the given duration.
+
+        Slot starts are aligned to multiples of `granularity` from local midnight
+        and only fall inside working hours (pass None to use whole days). The
+        range may cover several days.
+        """
+        found = 0
+        day = range_start.astimezone(tz).date()
+        last_day = range_end.astimezone(tz).date()
+        while day <= last_day:
+            midnight = _local_datetime(day, time(0, 0), tz)
+            if working_hours:
+                window_start = _local_datetime(day, working_hours[0], tz)
+                window_end = _local_datetime(day, working_hours[1], tz)
+            else:
+                window_start = midnight
+                window_end = _local_datetime(day + timedelta(days=1), time(0, 0), tz)
+            window_start = max(window_start, range_start)
+            window_end = min(window_end, range_end)
+
+            if window_start < window_end:
+                for gap_start, gap_end in self.gaps(window_start, window_end):
+                    # Round up to the next granularity boundary
+                    steps = -((midnight - gap_start) // granularity)
+                    slot_start = midnight + steps * granularity
+                    while slot_start + duration <= gap_end:
+                        yield slot_start, slot_start + duration
+                        found += 1
+                        if limit is not None and found >= limit:
+                            return
+                        slot_start += granularity
+            day += timedelta(days=1)
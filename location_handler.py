@@ -1,7 +1,18 @@
 import os
 import requests
 import re
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from dotenv import load_dotenv
+from geo import place_distances_km
+from gazetteer import get_gazetteer
+from geocode_cache import get_geocode_cache
+from osm_pois import open_osm_poi_index
+from places_cache import RANKED_PAGE_SIZE, PlacesCache
+
+# Search radii (metres) for nearby queries; the smallest one with results is used
+NEARBY_RADII = [2000, 5000, 10000, 20000]
+PLACES_TIMEOUT = 10
 
 class LocationHandler:
     def __init__(self):
@@ -18,6 +29,17 @@ class LocationHandler:
         self.default_lng = -3.3203
         self.default_location_name = "Heriot-Watt University"
 
+        # Place names are geocoded once and then answered locally
+        self.geocode_cache = get_geocode_cache()
+        # Known place names are resolved locally when a gazetteer file has been built
+        self.gazetteer = get_gazetteer()
+        # Runs the nearby searches for different radii side by side
+        self.search_executor = ThreadPoolExecutor(max_workers=len(NEARBY_RADII), thread_name_prefix="places-search")
+        # Nearby results by area, so repeat searches from around here skip the API
+        self.places_cache = PlacesCache()
+        # Optional offline places from an OpenStreetMap extract (see osm_pois.py); None if none was ingested
+        self.offline_pois = open_osm_poi_index()
+
         # Test API connection on initialization
         is_working, message = self.test_api_connection()
         if not is_working:
@@ -100,11 +122,10 @@ class LocationHandler:
             return "I encountered an error while searching. Please try again."
 
     def _handle_nearby_query(self, query):
-        """Handle 'nearest' or 'closest' type queries with progressive radius expansion"""
+        """Handle 'nearest' or 'closest' type queries, answering from the smallest radius with results"""
         try:
             # Extract the place type
             place_type = None
-            radius = 2000  # Start with 2km radius
 
             # Common types that might be in the query
             type_patterns = {
@@ -206,8 +227,6 @@ class LocationHandler:
             else:
                 lat, lng = self.default_lat, self.default_lng
                 location_name = self.default_location_name
-            results = []
-
             # Build base parameters
             base_params = {
                 'key': self.google_api_key,
@@ -225,65 +244,14 @@ class LocationHandler:
             else:
                 base_params['keyword'] = place_type
 
-            # Try increasingly larger radii until we find results
-            for radius in [2000, 5000, 10000, 20000]:  # 2km, 5km, 10km, 20km
-                try:
-                    params = base_params.copy()
-                    params['radius'] = radius
-
-                    response = requests.get(self.nearby_url, params=params)
-                    response.raise_for_status()
-                    data = response.json()
-
-
-                    if data['status'] == 'OK' and data.get('results'):
-                        results = data['results']
-                        break
-
-                    if data['status'] == 'INVALID_REQUEST':
-                        print("Invalid request, trying textSearch instead of nearbySearch")
-                        # Fall back to text search
-                        text_params = {
-                            'key': self.google_api_key,
-                            'query': f"{place_type} near {location_name}",
-                            'language': 'en'
-                        }
-                        text_response = requests.get(self.places_url, params=text_params)
-                        text_data = text_response.json()
-
-                        if text_data['status'] == 'OK' and text_data.get('results'):
-                            results = text_data['results']
-                            print(f"Text search found {len(results)} results")
-                            break
-
-                except Exception as radius_error:
-                    print(f"Error with radius {radius}m: {radius_error}")
-                    continue
-
+            results = self._search_nearby(base_params, place_type, location_name, lat, lng)
             if not results:
-                if place_type:
-                    # Try one last fallback using textSearch
-                    try:
-                        fallback_params = {
-                            'key': self.google_api_key,
-                            'query': f"{place_type} near {location_name}",
-                            'language': 'en'
-                        }
-                        fallback_response = requests.get(self.places_url, params=fallback_params)
-                        fallback_data = fallback_response.json()
-
-                        if fallback_data['status'] == 'OK' and fallback_data.get('results'):
-                            results = fallback_data['results']
-                            print(f"Fallback search found {len(results)} results")
-                    except Exception as fallback_error:
-                        print(f"Error in fallback search: {fallback_error}")
-
-                if not results:
-                    type_str = place_type if place_type else "places"
-                    return f"I couldn't find any {type_str} nearby {location_name}."
+                type_str = place_type if place_type else "places"
+                return f"I couldn't find any {type_str} nearby {location_name}."
 
             # Special filter for grocery stores to remove hotels and other irrelevant results
             if place_type == "grocery_store":
+                preferred = []
                 filtered_results = []
                 for place in results:
                     # Check if name or vicinity contains grocery-related terms
@@ -294,18 +262,20 @@ class LocationHandler:
                     if any(term in name for term in ['hotel', 'apartment', 'accommodation']):
                         continue
 
-                    # Prioritize places that contain grocery keywords
+                    # Prioritize places that contain grocery keywords, keeping the distance order within each group
                     if any(term in name for term in ['grocery', 'supermarket', 'food', 'market', 'store']):
-                        filtered_results.insert(0, place)  # Add to beginning
+                        preferred.append(place)
                     else:
-                        filtered_results.append(place)  # Add to end
+                        filtered_results.append(place)
 
                 # Use filtered results if we found any
-                if filtered_results:
-                    results = filtered_results
+                if preferred or filtered_results:
+                    results = preferred + filtered_results
 
             # Format results
             results = results[:3]  # Limit to top 3 for voice response
+            # Cached results only hold static data; bring open/closed up to date for the ones we read out
+            results = self.places_cache.apply_open_now(results, self._fetch_opening_hours, self.search_executor)
 
             type_display = place_type if place_type else "places"
             response_text = f"Here are the results"
@@ -316,6 +286,8 @@ class LocationHandler:
                 rating = place.get('rating', None)
 
                 response_text += f"{i}. {name} - {vicinity}. "
+                if place.get('distance_km') is not None:
+                    response_text += f"About {place['distance_km']:.1f} km away. "
                 if rating:
                     response_text += f"Rated {rating}/5. "
 
@@ -334,6 +306,152 @@ class LocationHandler:
             traceback.print_exc()
             return "I encountered an error while searching for nearby places. Please try again."
 
+    def _search_nearby(self, base_params, place_type, location_name, lat, lng):
+        """
+        Finds places near a point, nearest first, limited to the smallest search radius that has any.
+
+        With a type or keyword, one request ranked by distance answers every
+        radius at once. Without one the API can't rank by distance, so all
+        radii are requested concurrently instead of one after another. A
+        text search is the fallback when nothing is found within 20 km.
+        When an offline POI store is available it is asked first, and the
+        API is only used if it has nothing within 20 km.
+        """
+        if self.offline_pois:
+            results = self._search_offline(base_params, lat, lng)
+            if results:
+                return results
+
+        query_key = f"{base_params.get('type') or ''}|{base_params.get('keyword') or ''}"
+        results = self.places_cache.nearby(query_key, lat, lng, NEARBY_RADII)
+        if results is None:
+            if base_params.get('type') or base_params.get('keyword'):
+                candidates = [dict(base_params, rankby='distance')]
+            else:
+                candidates = [dict(base_params, radius=radius) for radius in NEARBY_RADII]
+            searched, results = self._first_with_results(candidates)
+            # Fresh results carry open/closed status even when the search itself can't be cached
+            self.places_cache.record_open_now(results)
+            if searched:
+                radius = searched.get('radius')
+                self.places_cache.store(query_key, lat, lng, results, radius_km=radius / 1000 if radius else None)
+            if results:
+                results = self._rank_by_distance(results, lat, lng, radii=NEARBY_RADII)
+
+        if not results and place_type:
+            try:
+                fallback_params = {
+                    'key': self.google_api_key,
+                    'query': f"{place_type} near {location_name}",
+                    'language': 'en'
+                }
+                fallback_response = requests.get(self.places_url, params=fallback_params, timeout=PLACES_TIMEOUT)
+                fallback_data = fallback_response.json()
+
+                if fallback_data['status'] == 'OK' and fallback_data.get('results'):
+                    self.places_cache.record_open_now(fallback_data['results'])
+                    results = self._rank_by_distance(fallback_data['results'], lat, lng)
+                    print(f"Fallback search found {len(results)} results")
+            except Exception as fallback_error:
+                print(f"Error in fallback search: {fallback_error}")
+        return results
+
+    def _search_offline(self, base_params, lat, lng):
+        """Answers a nearby search from the offline POI store, or returns [] if it has nothing in range."""
+        try:
+            place_type = base_params.get('type')
+            # Typed searches match on the OSM tag mapping; the grocery keyword is only there for the API
+            keyword = None if place_type else base_params.get('keyword')
+            results = self.offline_pois.nearest(lat, lng, k=RANKED_PAGE_SIZE, place_type=place_type, keyword=keyword,
+                                                max_km=NEARBY_RADII[-1] / 1000)
+            return self._rank_by_distance(results, lat, lng, radii=NEARBY_RADII) if results else []
+        except Exception as offline_error:
+            print(f"Error in offline place search: {offline_error}")
+            return []
+
+    def _nearby_request(self, params):
+        """Runs one Nearby Search. Returns its results (possibly none), or raises if the search failed."""
+        response = requests.get(self.nearby_url, params=params, timeout=PLACES_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        if data['status'] == 'OK':
+            return data.get('results', [])
+        if data['status'] == 'ZERO_RESULTS':
+            return []
+        raise RuntimeError(f"{data['status']} - {data.get('error_message', 'No error message')}")
+
+    def _first_with_results(self, candidates):
+        """
+        Sends the candidate searches concurrently and returns the first, in order, that has results.
+
+        Returns (params, results) for that search. When none has results,
+        params is the last search if they all completed, or None if any
+        failed. Searches still queued once the answer is known are
+        cancelled; ones already in flight finish in the background and
+        are ignored.
+        """
+        futures = [self.search_executor.submit(self._nearby_request, params) for params in candidates]
+        failed = False
+        try:
+            for future, params in zip(futures, candidates):
+                try:
+                    results = future.result()
+                except Exception as search_error:
+                    print(f"Error with radius {params.get('radius', 'ranked')}: {search_error}")
+                    failed = True
+                    continue
+                if results:
+                    return params, results
+            return (None if failed else candidates[-1]), []
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _fetch_opening_hours(self, place_id):
+        """Fetches a place's opening hours and UTC offset from Place Details, or None on error."""
+        try:
+            params = {
+                'key': self.google_api_key,
+                'place_id': place_id,
+                'fields': 'opening_hours,utc_offset'
+            }
+            response = requests.get(self.details_url, params=params, timeout=PLACES_TIMEOUT)
+            response.raise_for_status()
+            data = response.json()
+            if data['status'] == 'OK':
+                return data.get('result')
+            print(f"Place details error: {data['status']}")
+        except Exception as details_error:
+            print(f"Error fetching opening hours for {place_id}: {details_error}")
+        return None
+
+    @staticmethod
+    def _rank_by_distance(places, lat, lng, radii=None):
+        """
+        Sorts places by straight-line distance, adding distance_km to each.
+
+        With `radii` (metres), only places inside the smallest radius that
+        contains any are kept.
+        """
+        distances = place_distances_km(lat, lng, places)
+        keep = np.ones(len(places), dtype=bool)
+        if radii:
+            for radius in radii:
+                inside = distances <= radius / 1000
+                if inside.any():
+                    keep = inside
+                    break
+            else:
+                return []
+        ranked = []
+        for i in np.argsort(distances, kind="stable"):
+            if not keep[i]:
+                continue
+            place = dict(places[i])
+            place['distance_km'] = float(distances[i]) if np.isfinite(distances[i]) else None
+            ranked.append(place)
+        return ranked
+
     def _handle_directions_query(self, query):
         """Handle directions queries"""
         try:
@@ -432,6 +550,16 @@ class LocationHandler:
                 'name': self.default_location_name
             }
 
+        # Known place names are spotted and resolved without a network call
+        if self.gazetteer:
+            place = self.gazetteer.resolve(query)
+            if place:
+                return {
+                    'lat': place['lat'],
+                    'lng': place['lng'],
+                    'name': place['name']
+                }
+
         # Check for specific location mentioned (e.g., "in New York", "near London")
         location_match = re.search(r'(?:in|near|around|at) ([A-Za-z\s]+)(?:\s|$|\.|\?)', query)
         if location_match:
@@ -446,21 +574,10 @@ class LocationHandler:
                     'name': self.default_location_name
                 }
 
-            # For a real app, you would geocode this location name
-            # For now, we'll just return the default location with the extracted name
-            # In a full implementation, you'd call the Geocoding API here
-
             try:
-                # Try to geocode the location name
-                geocode_params = {
-                    'key': self.google_api_key,
-                    'address': location_name
-                }
-                geocode_response = requests.get(self.geocode_url, params=geocode_params)
-                geocode_data = geocode_response.json()
-
-                if geocode_data['status'] == 'OK' and geocode_data.get('results'):
-                    location = geocode_data['results'][0]['geometry']['location']
+                # Try to geocode the location name, from the cache when we've seen it before
+                location = self.geocode_cache.lookup(location_name, self._geocode)
+                if location:
                     return {
                         'lat': location['lat'],
                         'lng': location['lng'],
@@ -479,6 +596,23 @@ class LocationHandler:
         # No location specified, use default
         return None
 
+    def _geocode(self, location_name):
+        """Calls the Geocoding API. Returns lat/lng, None if the name doesn't resolve, or raises on errors."""
+        geocode_params = {
+            'key': self.google_api_key,
+            'address': location_name
+        }
+        geocode_response = requests.get(self.geocode_url, params=geocode_params)
+        geocode_response.raise_for_status()
+        geocode_data = geocode_response.json()
+
+        if geocode_data['status'] == 'OK' and geocode_data.get('results'):
+            return geocode_data['results'][0]['geometry']['location']
+        if geocode_data['status'] == 'ZERO_RESULTS':
+            return None
+        # Quota and auth errors are temporary, so they mustn't be cached as "no such place"
+        raise RuntimeError(f"{geocode_data['status']} - {geocode_data.get('error_message', 'No error message')}")
+
     def test_api_connection(self):
         """Test if the Google Places API connection is working."""
         try:
@@ -0,0 +1,306 @@
+import bz2
+import gzip
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+import numpy as np
+from geo import haversine_km
+
+# OSM tags mapped to the place types LocationHandler's nearby search uses
+OSM_TYPE_MAP = {
+    ('amenity', 'restaurant'): 'restaurant',
+    ('amenity', 'fast_food'): 'restaurant',
+    ('amenity', 'food_court'): 'restaurant',
+    ('amenity', 'cafe'): 'cafe',
+    ('shop', 'coffee'): 'cafe',
+    ('amenity', 'fuel'): 'gas_station',
+    ('shop', 'supermarket'): 'grocery_store',
+    ('shop', 'convenience'): 'grocery_store',
+    ('shop', 'greengrocer'): 'grocery_store',
+    ('amenity', 'marketplace'): 'grocery_store',
+    ('amenity', 'pharmacy'): 'pharmacy',
+    ('shop', 'chemist'): 'pharmacy',
+    ('amenity', 'hospital'): 'hospital',
+    ('amenity', 'clinic'): 'hospital',
+    ('amenity', 'atm'): 'atm',
+    ('amenity', 'bank'): 'bank',
+    ('tourism', 'hotel'): 'lodging',
+    ('tourism', 'motel'): 'lodging',
+    ('tourism', 'guest_house'): 'lodging',
+    ('tourism', 'hostel'): 'lodging',
+    ('amenity', 'school'): 'school',
+    ('amenity', 'university'): 'university',
+    ('amenity', 'college'): 'university',
+    ('leisure', 'park'): 'park',
+    ('leisure', 'playground'): 'park',
+    ('leisure', 'garden'): 'park',
+    ('amenity', 'parking'): 'parking',
+    ('amenity', 'post_office'): 'post_office',
+    ('amenity', 'cinema'): 'movie_theater',
+    ('amenity', 'theatre'): 'movie_theater',
+    ('shop', 'mall'): 'shopping_mall',
+    ('shop', 'department_store'): 'shopping_mall',
+    ('amenity', 'library'): 'library',
+    ('shop', 'books'): 'book_store',
+    ('tourism', 'museum'): 'museum',
+    ('tourism', 'gallery'): 'museum',
+    ('amenity', 'bar'): 'bar',
+    ('amenity', 'pub'): 'bar',
+    ('amenity', 'nightclub'): 'night_club',
+}
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS pois (
+        id INTEGER PRIMARY KEY,
+        osm_id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        name TEXT NOT NULL,
+        vicinity TEXT,
+        cuisine TEXT,
+        lat REAL NOT NULL,
+        lng REAL NOT NULL
+    )
+    """,
+    "CREATE VIRTUAL TABLE IF NOT EXISTS poi_index USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS pois_osm_type ON pois (osm_id, type)",
+]
+
+# Stores ingested before the unique index could hold the same POI several times; keep the first copy
+DEDUPLICATE = [
+    "DELETE FROM poi_index WHERE id IN (SELECT id FROM pois WHERE id NOT IN "
+    "(SELECT MIN(id) FROM pois GROUP BY osm_id, type))",
+    "DELETE FROM pois WHERE id NOT IN (SELECT MIN(id) FROM pois GROUP BY osm_id, type)",
+]
+
+INSERT_BATCH = 10000
+
+# Nearest-k searches start with a box this wide and double it until k places are in range
+INITIAL_SEARCH_KM = 0.5
+MAX_SEARCH_KM = 50.0
+KM_PER_DEGREE_LAT = 111.32
+
+
+def place_types(tags):
+    """Returns the nearby-search place types an OSM element's tags map to."""
+    types = []
+    for key in ('amenity', 'shop', 'tourism', 'leisure'):
+        value = tags.get(key)
+        if not value:
+            continue
+        place_type = OSM_TYPE_MAP.get((key, value))
+        if place_type is None and key == 'shop':
+            place_type = 'store'
+        if place_type and place_type not in types:
+            types.append(place_type)
+    if 'bank' in types and tags.get('atm') == 'yes':
+        types.append('atm')
+    return types
+
+
+def _vicinity(tags):
+    street = " ".join(part for part in (tags.get('addr:housenumber'), tags.get('addr:street')) if part)
+    return ", ".join(part for part in (street, tags.get('addr:city')) if part) or None
+
+
+def _open_extract(path):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _iter_elements(path, wanted):
+    """Streams (element, tags) for OSM elements whose tag is in `wanted`, clearing the tree as it goes."""
+    with _open_extract(path) as source:
+        context = ET.iterparse(source, events=("start", "end"))
+        _, root = next(context)
+        for event, element in context:
+            if event != "end" or element.tag not in ('node', 'way', 'relation'):
+                continue
+            if element.tag in wanted:
+                tags = {child.get('k'): child.get('v') for child in element if child.tag == 'tag'}
+                yield element, tags
+            # Without this the whole document would build up in memory
+            root.clear()
+
+
+class OsmPoiIndex:
+    """
+    Offline points of interest from an OpenStreetMap extract, in SQLite with an R-tree index.
+
+    `ingest` streams an .osm (optionally .gz/.bz2) file into the store, so
+    even large regional extracts are read in constant memory. Tagged nodes
+    become points; tagged ways (supermarkets, parks, ...) are placed at the
+    centroid of their nodes, which takes a second pass over the file.
+    Nearby queries then run locally: within-radius reads the R-tree for the
+    bounding box and filters by haversine distance, and nearest-k grows the
+    box until k places are in range. Results are shaped like Places API
+    results, so LocationHandler can read them out the same way.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('OSM_POI_DB', "osm_pois.db")
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        for statement in SCHEMA:
+            try:
+                self.conn.execute(statement)
+            except sqlite3.IntegrityError:
+                for cleanup in DEDUPLICATE:
+                    self.conn.execute(cleanup)
+                self.conn.execute(statement)
+        self.conn.commit()
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM pois").fetchone()[0]
+
+    def ingest(self, extract_path, include_ways=True):
+        """
+        Loads every mappable POI from an OSM XML extract. Returns (elements read, POI rows written).
+
+        POIs already in the store (same OSM element and type) are replaced,
+        so re-ingesting an extract, or one that overlaps it, adds no duplicates.
+        """
+        way_pois = []  # (osm id, types, tags, node refs)
+        needed_nodes = set()
+        if include_ways:
+            for element, tags in _iter_elements(extract_path, ('way',)):
+                types = place_types(tags)
+                if types:
+                    refs = [int(nd.get('ref')) for nd in element if nd.tag == 'nd']
+                    way_pois.append((f"way/{element.get('id')}", types, tags, refs))
+                    needed_nodes.update(refs)
+
+        rows = []
+        written = read = 0
+        coords = {}
+        next_id = (self.conn.execute("SELECT MAX(id) FROM pois").fetchone()[0] or 0) + 1
+        for element, tags in _iter_elements(extract_path, ('node',)):
+            read += 1
+            node_id = int(element.get('id'))
+            lat, lng = float(element.get('lat')), float(element.get('lon'))
+            if node_id in needed_nodes:
+                coords[node_id] = (lat, lng)
+            if not tags:
+                continue
+            for place_type in place_types(tags):
+                rows.append(self._row(next_id, f"node/{node_id}", place_type, tags, lat, lng))
+                next_id += 1
+            if len(rows) >= INSERT_BATCH:
+                written += self._write(rows)
+                rows = []
+
+        for osm_id, types, tags, refs in way_pois:
+            points = [coords[ref] for ref in refs if ref in coords]
+            if not points:
+                continue
+            lat = sum(point[0] for point in points) / len(points)
+            lng = sum(point[1] for point in points) / len(points)
+            for place_type in types:
+                rows.append(self._row(next_id, osm_id, place_type, tags, lat, lng))
+                next_id += 1
+        written += self._write(rows)
+        self.conn.commit()
+        return read + len(way_pois), written
+
+    @staticmethod
+    def _row(row_id, osm_id, place_type, tags, lat, lng):
+        name = tags.get('name') or tags.get('brand') or tags.get('operator') or place_type.replace('_', ' ').title()
+        return row_id, osm_id, place_type, name, _vicinity(tags), tags.get('cuisine'), lat, lng
+
+    def _write(self, rows):
+        if not rows:
+            return 0
+        # Drop earlier copies first so the R-tree never points at a replaced row
+        keys = [(row[1], row[2]) for row in rows]
+        self.conn.executemany("DELETE FROM poi_index WHERE id = (SELECT id FROM pois WHERE osm_id = ? AND type = ?)",
+                              keys)
+        self.conn.executemany("DELETE FROM pois WHERE osm_id = ? AND type = ?", keys)
+        self.conn.executemany("INSERT INTO pois (id, osm_id, type, name, vicinity, cuisine, lat, lng) "
+                              "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self.conn.executemany("INSERT INTO poi_index (id, min_lat, max_lat, min_lng, max_lng) VALUES (?, ?, ?, ?, ?)",
+                              [(row[0], row[6], row[6], row[7], row[7]) for row in rows])
+        return len(rows)
+
+    def _candidates(self, lat, lng, radius_km, place_type=None, keyword=None):
+        """Places in the bounding box of a radius around (lat, lng), with their distances."""
+        d_lat = radius_km / KM_PER_DEGREE_LAT
+        d_lng = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+        sql = ("SELECT p.osm_id, p.type, p.name, p.vicinity, p.lat, p.lng FROM poi_index i JOIN pois p ON p.id = i.id "
+               "WHERE i.min_lat >= ? AND i.max_lat <= ? AND i.min_lng >= ? AND i.max_lng <= ?")
+        params = [lat - d_lat, lat + d_lat, lng - d_lng, lng + d_lng]
+        if place_type:
+            sql += " AND p.type = ?"
+            params.append(place_type)
+        if keyword:
+            sql += " AND (p.name LIKE ? OR p.cuisine LIKE ?)"
+            params.extend([f"%{keyword}%", f"%{keyword}%"])
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        if not rows:
+            return rows, np.empty(0)
+        distances = haversine_km(lat, lng, [row[4] for row in rows], [row[5] for row in rows])
+        return rows, distances
+
+    @staticmethod
+    def _results(rows, distances, order):
+        return [{
+            # No place_id: these aren't Google places, so there are no details to fetch
+            'osm_id': rows[i][0],
+            'name': rows[i][2],
+            'types': [rows[i][1]],
+            'vicinity': rows[i][3] or "Address not available",
+            'geometry': {'location': {'lat': rows[i][4], 'lng': rows[i][5]}},
+            'distance_km': float(distances[i]),
+        } for i in order]
+
+    def within_radius(self, lat, lng, radius_m, place_type=None, keyword=None, limit=None):
+        """Places within `radius_m` metres, nearest first, as Places-style result dicts."""
+        rows, distances = self._candidates(lat, lng, radius_m / 1000, place_type, keyword)
+        order = [i for i in np.argsort(distances, kind="stable") if distances[i] <= radius_m / 1000]
+        return self._results(rows, distances, order[:limit] if limit else order)
+
+    def nearest(self, lat, lng, k=3, place_type=None, keyword=None, max_km=MAX_SEARCH_KM):
+        """The k places nearest to (lat, lng) within `max_km`, nearest first."""
+        radius_km = INITIAL_SEARCH_KM
+        while True:
+            rows, distances = self._candidates(lat, lng, radius_km, place_type, keyword)
+            # Only places inside the circle are certain to beat anything outside the box
+            inside = np.flatnonzero(distances <= radius_km)
+            if len(inside) >= k or radius_km >= max_km:
+                order = inside[np.argsort(distances[inside], kind="stable")][:k]
+                return self._results(rows, distances, order)
+            radius_km = min(radius_km * 2, max_km)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def open_osm_poi_index(path=None):
+    """Opens the offline POI store if one has been ingested, else returns None."""
+    path = path or os.getenv('OSM_POI_DB', "osm_pois.db")
+    if not os.path.exists(path):
+        return None
+    index = OsmPoiIndex(path)
+    return index if index.count() else None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "ingest":
+        index = OsmPoiIndex(sys.argv[3] if len(sys.argv) > 3 else None)
+        started = time.perf_counter()
+        read, written = index.ingest(sys.argv[2])
+        print(f"Read {read} elements, stored {written} places in {time.perf_counter() - started:.1f} s")
+    elif len(sys.argv) == 5 and sys.argv[1] == "nearest":
+        for place in OsmPoiIndex().nearest(float(sys.argv[2]), float(sys.argv[3]), place_type=sys.argv[4]):
+            print(f"{place['distance_km']:6.2f} km  {place['name']} - {place['vicinity']}")
+    else:
+        print("Usage: python osm_pois.py ingest <extract.osm[.bz2|.gz]> [db] | nearest <lat> <lng> <type>")
+        sys.exit(1)
@@ -0,0 +1,243 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from geo import geohash_encode, geohash_neighbours, haversine_km, place_distances_km
+
+CELL_PRECISION = 6
+
+# Static place data (names, addresses, locations) changes slowly; open/closed doesn't
+PLACES_TTL = 24 * 60 * 60
+OPEN_NOW_TTL = 15 * 60
+# Opening hours are kept longer, so open/closed can be worked out without a call
+OPENING_HOURS_TTL = 7 * 24 * 60 * 60
+
+MAX_CELLS = 512
+
+# Ranked nearby searches stop at 20 results; the API reaches out to 50 km
+RANKED_PAGE_SIZE = 20
+MAX_SEARCH_KM = 50.0
+
+MINUTES_PER_WEEK = 7 * 24 * 60
+
+
+def _minute_of_week(day, hhmm):
+    return day * 24 * 60 + int(hhmm[:2]) * 60 + int(hhmm[2:])
+
+
+def open_now_from_hours(opening_hours, utc_offset_minutes, now=None):
+    """
+    Works out whether a place is open from its weekly opening periods.
+
+    Returns None when the periods don't say (no periods given).
+    """
+    periods = (opening_hours or {}).get('periods')
+    if not periods or utc_offset_minutes is None:
+        return None
+    local = (now or datetime.now(timezone.utc)) + timedelta(minutes=utc_offset_minutes)
+    # Places days run from Sunday (0) to Saturday (6)
+    minute = _minute_of_week((local.weekday() + 1) % 7, local.strftime("%H%M"))
+    for period in periods:
+        opens = period.get('open')
+        closes = period.get('close')
+        if opens and not closes:
+            return True  # open around the clock
+        start = _minute_of_week(opens['day'], opens['time'])
+        end = _minute_of_week(closes['day'], closes['time'])
+        if end <= start:
+            end += MINUTES_PER_WEEK
+        if start <= minute < end or start <= minute + MINUTES_PER_WEEK < end:
+            return True
+    return False
+
+
+class PlacesCache:
+    """
+    Spatial cache of nearby search results, bucketed by geohash cell.
+
+    Each stored search records its centre and how far out its results are
+    complete: a ranked search that came back short of a full page knows
+    every match within 50 km, a full page only up to its farthest result,
+    and a radius search up to that radius. A later query is answered from
+    the entries in its own and the eight surrounding cells for the same
+    type or keyword, as long as the disk it needs fits inside one of their
+    covered disks; the places are then filtered by distance from the new
+    point. Static place data is kept for a day. Open/closed status is kept
+    separately for 15 minutes, and refreshed from cached opening hours
+    where possible, so it stays current without re-running the search.
+    """
+
+    def __init__(self, ttl=None, open_now_ttl=OPEN_NOW_TTL, max_cells=MAX_CELLS, clock=time.time):
+        self.ttl = ttl or int(os.getenv('PLACES_CACHE_TTL', PLACES_TTL))
+        self.open_now_ttl = open_now_ttl
+        self.max_cells = max_cells
+        self.clock = clock
+
+        self._cells = OrderedDict()  # (query key, cell) -> [entry dicts]
+        self._open_now = {}  # place_id -> (open_now, checked_at)
+        self._hours = {}  # place_id -> (opening_hours, utc_offset, fetched_at)
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'lookups': 0,
+            'hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'open_now_cached': 0,
+            'open_now_computed': 0,
+            'open_now_fetched': 0,
+        }
+
+    def store(self, query_key, lat, lng, places, radius_km=None):
+        """
+        Caches the results of a search centred on (lat, lng).
+
+        Pass `radius_km` for a radius search, or leave it None for a search
+        ranked by distance. Open/closed status in the results is recorded
+        separately and stripped from the cached place data.
+        """
+        if radius_km is not None:
+            if len(places) >= RANKED_PAGE_SIZE:
+                return  # a full page of prominence-ordered results says nothing about completeness
+            coverage = radius_km
+        elif len(places) < RANKED_PAGE_SIZE:
+            coverage = MAX_SEARCH_KM
+        else:
+            coverage = float(place_distances_km(lat, lng, places).max())
+
+        now = self.clock()
+        static = []
+        for place in places:
+            place = {key: value for key, value in place.items() if key not in ('opening_hours', 'distance_km')}
+            static.append(place)
+        entry = {'lat': lat, 'lng': lng, 'coverage_km': coverage, 'stored_at': now, 'places': static}
+
+        key = (query_key, geohash_encode(lat, lng, CELL_PRECISION))
+        with self._lock:
+            entries = [e for e in self._cells.get(key, []) if now - e['stored_at'] < self.ttl]
+            entries.append(entry)
+            self._cells[key] = entries
+            self._cells.move_to_end(key)
+            while len(self._cells) > self.max_cells:
+                self._cells.popitem(last=False)
+            for place in places:
+                if place.get('place_id'):
+                    # None for places without hours, so they aren't looked up again straight away
+                    self._open_now[place['place_id']] = ((place.get('opening_hours') or {}).get('open_now'), now)
+            self.stats['stores'] += 1
+
+    def nearby(self, query_key, lat, lng, radii):
+        """
+        Answers a nearby search from the cache.
+
+        Returns the places within the smallest radius (metres) that has any,
+        nearest first with distance_km set, [] if the cache knows there are
+        none within the largest radius, or None on a miss.
+        """
+        now = self.clock()
+        with self._lock:
+            self.stats['lookups'] += 1
+            entries = []
+            for cell in geohash_neighbours(geohash_encode(lat, lng, CELL_PRECISION)):
+                key = (query_key, cell)
+                for entry in self._cells.get(key, []):
+                    if now - entry['stored_at'] < self.ttl:
+                        entries.append(entry)
+                if key in self._cells:
+                    self._cells.move_to_end(key)
+        if not entries:
+            self.stats['misses'] += 1
+            return None
+
+        offsets = haversine_km(lat, lng, [e['lat'] for e in entries], [e['lng'] for e in entries])
+        for radius in radii:
+            radius_km = radius / 1000
+            # Any entry whose covered disk contains this query's disk knows every place in it
+            covering = [e for e, offset in zip(entries, offsets) if offset + radius_km <= e['coverage_km']]
+            if not covering:
+                self.stats['misses'] += 1
+                return None
+            places = max(covering, key=lambda e: e['stored_at'])['places']
+            distances = place_distances_km(lat, lng, places)
+            inside = [(distances[i], i) for i in range(len(places)) if distances[i] <= radius_km]
+            if inside:
+                self.stats['hits'] += 1
+                return [dict(places[i], distance_km=float(distance)) for distance, i in sorted(inside)]
+        self.stats['hits'] += 1
+        return []
+
+    def record_open_now(self, places):
+        """
+        Records the open/closed status carried by fresh API results.
+
+        Call it for every fresh search, including ones `store` skips (a full
+        radius page, a failed candidate, a text search), so reading the
+        results out needs no Place Details calls.
+        """
+        now = self.clock()
+        with self._lock:
+            for place in places:
+                open_now = (place.get('opening_hours') or {}).get('open_now')
+                if place.get('place_id') and open_now is not None:
+                    self._open_now[place['place_id']] = (open_now, now)
+
+    def apply_open_now(self, places, fetch_hours, executor=None):
+        """
+        Sets current opening_hours.open_now on places answered from the cache.
+
+        Uses the status seen in the last 15 minutes, else cached opening
+        hours, else `fetch_hours(place_id)` (returning a Places result with
+        opening_hours and utc_offset). Those lookups run concurrently on
+        `executor` when one is given. Places with no known hours are left
+        without opening_hours.
+        """
+        now = self.clock()
+        fresh, known, to_fetch = {}, {}, []
+        with self._lock:
+            for place in places:
+                place_id = place.get('place_id')
+                if not place_id:
+                    continue
+                status = self._open_now.get(place_id)
+                hours = self._hours.get(place_id)
+                if status and now - status[1] < self.open_now_ttl:
+                    fresh[place_id] = status[0]
+                elif hours and now - hours[2] < OPENING_HOURS_TTL:
+                    known[place_id] = hours
+                elif place_id not in to_fetch:
+                    to_fetch.append(place_id)
+
+        fetched = executor.map(fetch_hours, to_fetch) if executor else map(fetch_hours, to_fetch)
+        for place_id, details in zip(to_fetch, fetched):
+            details = details or {}
+            known[place_id] = (details.get('opening_hours'), details.get('utc_offset'), now)
+            with self._lock:
+                self._hours[place_id] = known[place_id]
+            self.stats['open_now_fetched'] += 1
+
+        updated = []
+        for place in places:
+            place = dict(place)
+            place_id = place.get('place_id')
+            open_now = None
+            if place_id in fresh:
+                open_now = fresh[place_id]
+                self.stats['open_now_cached'] += 1
+            elif place_id in known:
+                hours = known[place_id]
+                if place_id not in to_fetch:
+                    self.stats['open_now_computed'] += 1
+                open_now = open_now_from_hours(hours[0], hours[1])
+                if open_now is None:
+                    open_now = (hours[0] or {}).get('open_now') if place_id in to_fetch else None
+                if open_now is not None:
+                    with self._lock:
+                        self._open_now[place_id] = (open_now, now)
+            if open_now is not None:
+                place['opening_hours'] = {'open_now': open_now}
+            updated.append(place)
+        return updated
+
+    def hit_rate(self):
+        return self.stats['hits'] / self.stats['lookups'] if self.stats['lookups'] else 0.0
@@ -0,0 +1,253 @@
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta
+from calendar_mirror import parse_event_time
+
+# Reminders whose time passed more than this many seconds ago are dropped, not spoken late
+MISSED_GRACE_SECONDS = 120
+
+# Popup reminder used for calendar events that rely on the calendar's defaults
+DEFAULT_REMINDER_MINUTES = 10
+
+
+def reminder_key(name, start, minutes_before):
+    """
+    Identifies one reminder of an event across the database and the calendar, so each is only spoken once.
+
+    The lead time is part of the key, so an event with several reminders
+    (a day before and 10 minutes before) keeps all of them.
+    """
+    return (name or '').strip().lower(), int(start.timestamp()), minutes_before
+
+
+def reminder_message(name, minutes):
+    if minutes >= 1440 and minutes % 1440 == 0:
+        lead = f"{minutes // 1440} day{'s' if minutes != 1440 else ''}"
+    elif minutes >= 60 and minutes % 60 == 0:
+        lead = f"{minutes // 60} hour{'s' if minutes != 60 else ''}"
+    else:
+        lead = f"{minutes} minute{'s' if minutes != 1 else ''}"
+    return f"Reminder: {name} starts in {lead}."
+
+
+class ReminderScheduler:
+    """
+    In-process scheduler that speaks event reminders when they fall due.
+
+    Pending reminders live in a binary heap ordered by fire time, so
+    scheduling costs O(log n) and cancelling is O(1): a cancelled or
+    rescheduled entry is simply skipped when it reaches the top. A single
+    worker thread sleeps on a condition variable until the earliest reminder
+    is due or the schedule changes, so nothing polls while idle.
+
+    Reminders scheduled for an event reference (("event", id) for the event
+    store, ("calendar", id) for Google) are tracked per reference, so moving
+    or deleting the event replaces or cancels them. The same event seen
+    through both sources shares one reminder, which is only cancelled once
+    neither still wants it.
+    """
+
+    def __init__(self, speak, clock=time.time):
+        self.speak = speak
+        self.clock = clock
+        self._heap = []  # (fire_at, sequence, key)
+        self._pending = {}  # key -> (fire_at, sequence, message)
+        self._refs = {}  # event reference -> set of keys scheduled for it
+        self._owners = {}  # key -> set of event references that want it
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+        self.fired = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def schedule(self, key, fire_at, message):
+        """Schedules (or reschedules) the reminder identified by key. fire_at is a datetime or timestamp."""
+        if isinstance(fire_at, datetime):
+            fire_at = fire_at.timestamp()
+        if fire_at < self.clock() - MISSED_GRACE_SECONDS:
+            return False
+
+        with self._condition:
+            sequence = next(self._sequence)
+            self._pending[key] = (fire_at, sequence, message)
+            heapq.heappush(self._heap, (fire_at, sequence, key))
+            # Skipped entries pile up when many reminders are rescheduled
+            if len(self._heap) > 2 * len(self._pending) + 64:
+                self._compact()
+            # Wake the worker if this is now the earliest reminder
+            if self._heap[0][1] == sequence:
+                self._condition.notify()
+        return True
+
+    def cancel(self, key):
+        """Cancels a pending reminder. Returns True if one was pending."""
+        with self._condition:
+            return self._pending.pop(key, None) is not None
+
+    def schedule_event(self, name, start, minutes_before):
+        """Schedules a reminder `minutes_before` an event starting at `start`."""
+        if minutes_before is None:
+            return False
+        fire_at = start - timedelta(minutes=minutes_before)
+        return self.schedule(reminder_key(name, start, minutes_before), fire_at, reminder_message(name, minutes_before))
+
+    def schedule_for(self, ref, name, start, minutes_list):
+        """
+        Makes `ref`'s reminders exactly those for an event `name` starting at `start`.
+
+        Reminders it had for an earlier name or time are cancelled. Returns
+        the number of reminders scheduled.
+        """
+        keys = {reminder_key(name, start, minutes): minutes for minutes in minutes_list if minutes is not None}
+        scheduled = 0
+        with self._condition:
+            for key in self._refs.get(ref, set()) - set(keys):
+                self._release(ref, key)
+            for key, minutes in keys.items():
+                if self.schedule(key, start - timedelta(minutes=minutes), reminder_message(name, minutes)):
+                    scheduled += 1
+                    self._refs.setdefault(ref, set()).add(key)
+                    self._owners.setdefault(key, set()).add(ref)
+        return scheduled
+
+    def cancel_for(self, ref):
+        """Cancels the reminders scheduled for an event reference that nothing else shares."""
+        with self._condition:
+            for key in list(self._refs.get(ref, ())):
+                self._release(ref, key)
+
+    def retain(self, kind, refs):
+        """Cancels the reminders of every `kind` reference not in `refs`, after a full reload of that source."""
+        with self._condition:
+            for ref in [ref for ref in self._refs if ref[0] == kind and ref not in refs]:
+                self.cancel_for(ref)
+
+    def _release(self, ref, key):
+        keys = self._refs.get(ref)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._refs[ref]
+        owners = self._owners.get(key)
+        if owners is not None:
+            owners.discard(ref)
+            if owners:
+                return
+            del self._owners[key]
+        self.cancel(key)
+
+    def on_event_change(self, event_id, event):
+        """Listener for event store changes: event is an event store dict, or None when it was deleted."""
+        if event is None:
+            self.cancel_for(("event", event_id))
+        else:
+            self.schedule_for(("event", event_id), event['title'], event['start'], [event.get('reminder_minutes')])
+
+    def on_calendar_change(self, event_id, event):
+        """Listener for Calendar event resources, as CalendarMirror sends them; None when removed."""
+        start_value = (event or {}).get('start', {}).get('dateTime')
+        if not start_value or event.get('status') == 'cancelled':
+            # Removed, or all-day: no reminders either way
+            self.cancel_for(("calendar", event_id))
+            return 0
+        return self.schedule_for(("calendar", event_id), event.get('summary', 'Your event'),
+                                 parse_event_time(start_value), _popup_minutes(event))
+
+    def _compact(self):
+        self._heap = [(fire_at, sequence, key) for key, (fire_at, sequence, _) in self._pending.items()]
+        heapq.heapify(self._heap)
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                message = None
+                while self._running and message is None:
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    fire_at, sequence, key = self._heap[0]
+                    entry = self._pending.get(key)
+                    if not entry or entry[1] != sequence:
+                        # Cancelled or rescheduled since it was pushed
+                        heapq.heappop(self._heap)
+                        continue
+                    delay = fire_at - self.clock()
+                    if delay > 0:
+                        self._condition.wait(timeout=delay)
+                        continue
+                    heapq.heappop(self._heap)
+                    del self._pending[key]
+                    for ref in self._owners.pop(key, ()):
+                        keys = self._refs.get(ref)
+                        if keys is not None:
+                            keys.discard(key)
+                            if not keys:
+                                del self._refs[ref]
+                    if -delay <= MISSED_GRACE_SECONDS:
+                        message = entry[2]
+                if not self._running:
+                    return
+
+            # Speak outside the lock so scheduling never waits on TTS
+            try:
+                self.speak(message)
+                self.fired += 1
+            except Exception as e:
+                print(f"Error speaking reminder: {e}")
+
+    def load_from_store(self, events):
+        """
+        Schedules reminders for typed events from the local event store.
+
+        `events` is the full set of upcoming events, so reminders of store
+        events missing from it (deleted or moved away) are cancelled.
+        """
+        scheduled = 0
+        seen = set()
+        for event in events:
+            seen.add(("event", event['id']))
+            scheduled += self.schedule_for(("event", event['id']), event['title'], event['start'],
+                                           [event['reminder_minutes']])
+        self.retain("event", seen)
+        print(f"Scheduled {scheduled} reminders from the event store")
+        return scheduled
+
+    def load_from_calendar(self, events):
+        """Schedules popup reminders for all upcoming Calendar event resources, like load_from_store."""
+        scheduled = 0
+        seen = set()
+        for event in events:
+            seen.add(("calendar", event['id']))
+            scheduled += self.on_calendar_change(event['id'], event)
+        self.retain("calendar", seen)
+        print(f"Scheduled {scheduled} reminders from Google Calendar")
+        return scheduled
+
+
+def _popup_minutes(event):
+    """The popup reminder lead times of a Calendar event resource."""
+    reminders = event.get('reminders', {})
+    if reminders.get('useDefault', True):
+        return [DEFAULT_REMINDER_MINUTES]
+    return [r['minutes'] for r in reminders.get('overrides', []) if r.get('method') == 'popup']
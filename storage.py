@@ -0,0 +1,344 @@
+import atexit
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+import mysql.connector
+from dotenv import load_dotenv
+from db_pool import ConnectionPool, get_db_pool
+
+# Errors raised by either backend; catch this instead of a driver-specific error
+DB_ERRORS = (mysql.connector.Error, sqlite3.Error)
+
+MYSQL_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS my_table (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        event_name VARCHAR(255),
+        event_date VARCHAR(32),
+        event_time VARCHAR(32),
+        location VARCHAR(255),
+        details TEXT,
+        reminder VARCHAR(64),
+        INDEX idx_my_table_date (event_date)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS conversations (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        user_input TEXT,
+        assistant_response TEXT,
+        timestamp DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS calendar_outbox (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        event_row_id BIGINT NOT NULL,
+        google_event_id VARCHAR(64) NOT NULL,
+        payload TEXT NOT NULL,
+        status VARCHAR(16) NOT NULL DEFAULT 'pending',
+        attempts INT NOT NULL DEFAULT 0,
+        next_attempt_at DATETIME NOT NULL,
+        last_error TEXT,
+        created_at DATETIME NOT NULL,
+        INDEX idx_outbox_due (status, next_attempt_at)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS events (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        legacy_id INT NULL UNIQUE,
+        external_id VARCHAR(255) NULL UNIQUE,
+        owner VARCHAR(64) NOT NULL,
+        title VARCHAR(255) NOT NULL,
+        start_at DATETIME NOT NULL,
+        end_at DATETIME NOT NULL,
+        timezone VARCHAR(64) NOT NULL,
+        location VARCHAR(255),
+        details TEXT,
+        reminder_minutes INT NULL,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        INDEX idx_events_owner_start (owner, start_at),
+        INDEX idx_events_start (start_at),
+        INDEX idx_events_updated (updated_at)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS calendar_sync (
+        event_id BIGINT PRIMARY KEY,
+        google_event_id VARCHAR(255) NOT NULL UNIQUE,
+        local_hash CHAR(40),
+        remote_hash CHAR(40),
+        synced_at DATETIME NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sync_state (
+        name VARCHAR(64) PRIMARY KEY,
+        value TEXT
+    )
+    """,
+]
+
+SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS my_table (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        event_name TEXT,
+        event_date TEXT,
+        event_time TEXT,
+        location TEXT,
+        details TEXT,
+        reminder TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_my_table_date ON my_table (event_date)",
+    """
+    CREATE TABLE IF NOT EXISTS conversations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_input TEXT,
+        assistant_response TEXT,
+        timestamp DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS calendar_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        event_row_id INTEGER NOT NULL,
+        google_event_id TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at DATETIME NOT NULL,
+        last_error TEXT,
+        created_at DATETIME NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_outbox_due ON calendar_outbox (status, next_attempt_at)",
+    """
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        legacy_id INTEGER UNIQUE,
+        external_id TEXT UNIQUE,
+        owner TEXT NOT NULL,
+        title TEXT NOT NULL,
+        start_at DATETIME NOT NULL,
+        end_at DATETIME NOT NULL,
+        timezone TEXT NOT NULL,
+        location TEXT,
+        details TEXT,
+        reminder_minutes INTEGER,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_events_owner_start ON events (owner, start_at)",
+    "CREATE INDEX IF NOT EXISTS idx_events_start ON events (start_at)",
+    "CREATE INDEX IF NOT EXISTS idx_events_updated ON events (updated_at)",
+    """
+    CREATE TABLE IF NOT EXISTS calendar_sync (
+        event_id INTEGER PRIMARY KEY,
+        google_event_id TEXT NOT NULL UNIQUE,
+        local_hash TEXT,
+        remote_hash TEXT,
+        synced_at DATETIME NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sync_state (
+        name TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """,
+]
+
+# Store datetimes as ISO text with a fixed layout, so they compare correctly as strings
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" ", "microseconds"))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter("DATETIME", lambda value: datetime.fromisoformat(value.decode()))
+
+
+class MySQLStorage:
+    """Storage backed by a MySQL server, using the shared connection pool."""
+
+    name = "mysql"
+    # Prefix for inserts that skip rows clashing with a unique key
+    insert_ignore = "INSERT IGNORE"
+
+    def __init__(self, pool=None):
+        self.pool = pool or get_db_pool()
+        self._schema_ready = False
+
+    @contextmanager
+    def connection(self):
+        with self.pool.connection() as conn:
+            yield conn
+
+    def ensure_schema(self):
+        """Creates any missing tables. Existing tables are left as they are."""
+        if self._schema_ready:
+            return
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                for statement in MYSQL_SCHEMA:
+                    cursor.execute(statement)
+                conn.commit()
+            finally:
+                cursor.close()
+        self._schema_ready = True
+
+    def stats(self):
+        return self.pool.stats()
+
+    def close(self):
+        self.pool.close()
+
+
+class _SQLiteCursor:
+    """Cursor wrapper that accepts the %s placeholders used throughout the assistant."""
+
+    _translated = {}
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _sql(self, query):
+        sql = self._translated.get(query)
+        if sql is None:
+            sql = self._translated[query] = query.replace("%s", "?")
+        return sql
+
+    def execute(self, query, params=()):
+        self._cursor.execute(self._sql(query), params)
+
+    def executemany(self, query, seq_of_params):
+        self._cursor.executemany(self._sql(query), seq_of_params)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class _SQLiteConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return _SQLiteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+
+class SQLiteStorage:
+    """
+    Embedded storage in a single SQLite file, for running without a MySQL server.
+
+    Each thread gets its own connection to the database, opened in WAL mode
+    so readers never block the writer. sqlite3 keeps compiled statements
+    per connection, so repeated queries skip parsing and planning. The
+    schema is created automatically on first use.
+    """
+
+    name = "sqlite"
+    insert_ignore = "INSERT OR IGNORE"
+
+    def __init__(self, path="assistant.db", statement_cache_size=256):
+        self.path = path
+        self.statement_cache_size = statement_cache_size
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, detect_types=sqlite3.PARSE_DECLTYPES,
+                                   cached_statements=self.statement_cache_size, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._connect()
+        try:
+            yield _SQLiteConnection(conn)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            # Never leave a transaction open between uses
+            if conn.in_transaction:
+                conn.rollback()
+
+    def ensure_schema(self):
+        """Creates any missing tables and indexes."""
+        if self._schema_ready:
+            return
+        conn = self._connect()
+        for statement in SQLITE_SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+        self._schema_ready = True
+
+    def stats(self):
+        return {'backend': self.name, 'path': self.path, 'connections': len(self._connections)}
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+def create_storage(backend=None, sqlite_path=None, db_config=None):
+    """Creates a storage backend, chosen by the STORAGE_BACKEND environment variable by default."""
+    load_dotenv()
+    backend = (backend or os.getenv('STORAGE_BACKEND', 'mysql')).lower()
+    if backend == 'sqlite':
+        return SQLiteStorage(sqlite_path or os.getenv('SQLITE_PATH', 'assistant.db'))
+    if backend == 'mysql':
+        return MySQLStorage(ConnectionPool(db_config) if db_config else None)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+_default_storage = None
+_default_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Returns the process-wide storage backend, creating it on first use."""
+    global _default_storage
+    with _default_storage_lock:
+        if _default_storage is None:
+            _default_storage = create_storage()
+            # Shared by every handler and background worker, so it is only closed at exit
+            atexit.register(_default_storage.close)
+        return _default_storage
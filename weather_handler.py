@@ -2,6 +2,7 @@ import os
 import requests
 from datetime import datetime, timedelta
 import re
+from gazetteer import get_gazetteer
 
 class WeatherHandler:
     def __init__(self):
@@ -10,12 +11,21 @@ class WeatherHandler:
         self.base_url = "https://api.openweathermap.org/data/2.5/weather"
         self.forecast_url = "https://api.openweathermap.org/data/2.5/forecast"
         self.default_location = "Edinburgh"
+        # Place names are spotted locally when a gazetteer file has been built (see gazetteer.py)
+        self.gazetteer = get_gazetteer()
+
+    def _location_params(self, location):
+        """Returns the OpenWeather query parameters and display name for a place name or a resolved place."""
+        if isinstance(location, dict):
+            return {'lat': location['lat'], 'lon': location['lng']}, location['name']
+        return {'q': location}, location
 
     def get_current_weather(self, location):
         """Get current weather for a specific location."""
+        location_params, location = self._location_params(location)
         try:
             params = {
-                'q': location,
+                **location_params,
                 'appid': self.api_key,
                 'units': 'metric'  # Use metric units for temperatures in Celsius
             }
@@ -53,6 +63,7 @@ class WeatherHandler:
 
     def get_weather_forecast(self, location, date_str=None):
         """Get weather forecast for a location and date."""
+        location_params, location = self._location_params(location)
         try:
             # If no date is provided, default to tomorrow
             if not date_str:
@@ -93,7 +104,7 @@ class WeatherHandler:
 
             # Request forecast data
             params = {
-                'q': location,
+                **location_params,
                 'appid': self.api_key,
                 'units': 'metric'  # Changed to metric for Celsius
             }
@@ -180,7 +191,18 @@ class WeatherHandler:
         return has_weather_keyword or has_weather_phrase
 
     def extract_location_from_query(self, user_input):
-        """Extract location from a weather query with improved filtering."""
+        """
+        Extract location from a weather query with improved filtering.
+
+        Returns a resolved place (name, lat, lng) when the gazetteer knows
+        the place, otherwise a place name for the weather API to look up.
+        """
+        if self.gazetteer:
+            place = self.gazetteer.resolve(user_input)
+            if place:
+                print(f"Extracted location: {place['name']} ({place['lat']:.4f}, {place['lng']:.4f})")
+                return place
+
         # First, clean up the query to handle "weather like today" pattern
         # This pattern is being incorrectly parsed as a location "like today"
         user_input = re.sub(r'weather\s+like\s+(today|tomorrow)', 'weather today', user_input, flags=re.IGNORECASE)